@@ -1,7 +1,7 @@
 import os
+import time
 
 from flask import Flask, jsonify
-from flask_smorest import Api
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 from flask_cors import CORS
@@ -9,17 +9,37 @@ from dotenv import load_dotenv
 
 from .extensions import db
 from .blocklist import BLOCKLIST
+from .utils.openapi import LazyApi
+from .utils.compression import init_compression
+from .utils.ratelimit import init_rate_limit
+from .utils.auth import init_token_cache
+from .utils.keys import init_signing_keys
+from .utils.marketplaces import init_marketplaces
+from .utils.analytics import init_analytics
+from .cli import (
+    alerts_cli, catalog_cli, changes_cli, keys_cli, marketplaces_cli)
 
 from .resources.product import blp as ProductBlueprint
 from .resources.user import blp as UserBlueprint
+from .resources.change import blp as ChangeBlueprint
+from .resources.watch import blp as WatchBlueprint
+from .resources.keys import blp as KeysBlueprint
+from .resources.analytics import blp as AnalyticsBlueprint
+from .resources.catalog import blp as CatalogBlueprint
 
 
 def create_app(db_url=None):
+    boot_start = time.perf_counter()
     app = Flask(__name__)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
     load_dotenv()
 
+    # "production" skips the schema creation (handled by `flask db upgrade`)
+    # and documents the API only when the spec is first requested.
+    app.config["APP_ENV"] = os.getenv("APP_ENV", "development")
+    production = app.config["APP_ENV"] == "production"
+
     app.config["PROPAGATE_EXCEPTIONS"] = True
     app.config["API_TITLE"] = "Tech Hunter REST API"
     app.config["API_VERSION"] = "v1"
@@ -29,22 +49,63 @@ def create_app(db_url=None):
     app.config["OPENAPI_SWAGGER_UI_URL"] = (
             "http://cdn.jsdelivr.net/npm/swagger-ui-dist/"
         )
+    app.config["OPENAPI_LAZY"] = production
+    app.config["OPENAPI_CACHE_PATH"] = os.getenv("OPENAPI_CACHE_PATH")
     app.config["SQLALCHEMY_DATABASE_URI"] = db_url or os.getenv(
         "DATABASE_URL", "sqlite:///data.db"
     )
 
+    app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["DB_CREATE_ALL"] = os.getenv(
+        "DB_CREATE_ALL", "false" if production else "true"
+    ).lower() == "true"
+    app.config["DB_WARMUP_CONNECTIONS"] = int(
+        os.getenv("DB_WARMUP_CONNECTIONS", "1")
+    )
+    app.config["RATELIMIT_ENABLED"] = os.getenv(
+        "RATELIMIT_ENABLED", "true"
+    ).lower() == "true"
+    app.config["RATELIMIT_STORAGE_URL"] = os.getenv(
+        "RATELIMIT_STORAGE_URL", "memory://"
+    )
+    app.config["CHANGES_POLL_INTERVAL"] = float(
+        os.getenv("CHANGES_POLL_INTERVAL", "1.0")
+    )
+    # Comma separated sources of the catalog, e.g. "amazon,mercadolibre".
+    app.config["MARKETPLACES"] = os.getenv("MARKETPLACES", "amazon")
+    init_marketplaces(app)
     db.init_app(app)
 
     migrate = Migrate(app = app, db = db)
 
-    with app.app_context():
-        db.create_all()
-
-    api = Api(app)
-
-    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET", "224804603518500294277282450094052445950")
+    init_compression(app)
+    init_rate_limit(app)
+    init_analytics(app)
+
+    if app.config["DB_CREATE_ALL"]:
+        with app.app_context():
+            db.create_all()
+            if db.engine.dialect.name == "postgresql":
+                app.logger.warning(
+                    "DB_CREATE_ALL does not partition the products table "
+                    "by marketplace, run `flask db upgrade` instead.")
+
+    api = LazyApi(app)
+
+    # HS256 signs with JWT_SECRET, RS256 and EdDSA with the keys of
+    # JWT_KEYS_DIR (see app/utils/keys.py).
+    app.config["JWT_ALGORITHM"] = os.getenv("JWT_ALGORITHM", "HS256")
+    app.config["JWT_KEYS_DIR"] = os.getenv("JWT_KEYS_DIR")
+    app.config["JWT_ACTIVE_KID"] = os.getenv("JWT_ACTIVE_KID")
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET")
+    if app.config["JWT_SECRET_KEY"] is None:
+        if production and app.config["JWT_ALGORITHM"].startswith("HS"):
+            raise RuntimeError("JWT_SECRET must be set in production.")
+        app.config["JWT_SECRET_KEY"] = "224804603518500294277282450094052445950"
     jwt = JWTManager(app)
+    init_signing_keys(app, jwt)
+    init_token_cache(app)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blocklist(jwt_header, jwt_payload):
@@ -91,5 +152,19 @@ def create_app(db_url=None):
 
     api.register_blueprint(ProductBlueprint)
     api.register_blueprint(UserBlueprint)
+    api.register_blueprint(ChangeBlueprint)
+    api.register_blueprint(WatchBlueprint)
+    api.register_blueprint(KeysBlueprint)
+    api.register_blueprint(AnalyticsBlueprint)
+    api.register_blueprint(CatalogBlueprint)
+
+    app.cli.add_command(alerts_cli)
+    app.cli.add_command(keys_cli)
+    app.cli.add_command(marketplaces_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(changes_cli)
+
+    app.config["BOOT_TIME_MS"] = (time.perf_counter() - boot_start) * 1000
+    app.logger.debug("App created in %.1f ms.", app.config["BOOT_TIME_MS"])
 
     return app
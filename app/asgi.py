@@ -0,0 +1,288 @@
+"""
+ASGI entry point.
+The product read endpoints are answered with async SQLAlchemy, so a
+slow query does not pin a worker. Every other request, and any read
+the async path cannot answer as is (validation errors, misses, auth
+failures), goes to the Flask app, which keeps its responses.
+
+Run it with: uvicorn --factory app.asgi:create_asgi_app
+"""
+
+import json
+import math
+import re
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+from flask_jwt_extended import decode_token
+from marshmallow import EXCLUDE, ValidationError, fields
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from webargs.fields import DelimitedList
+
+from .app import create_app
+from .blocklist import BLOCKLIST
+from .models.product import ProductModel
+from .schemas import (
+    PaginationProductsSchema,
+    ProductOutputSchema,
+    ProductsColumns,
+)
+from .utils.compression import negotiate
+from .utils.concurrency import etag, etag_versions
+from .utils.ratelimit import already_limited
+from .utils.queries import (
+    products_list_select,
+    brands_select,
+    product_read_options,
+)
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(db_url: str):
+    """Return `db_url` with the async driver of its database."""
+    url = make_url(db_url)
+    return url.set(
+        drivername=f"{url.get_backend_name()}+"
+                   f"{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+
+def query_args(scope: dict, schema) -> dict:
+    """Parse the query string, keeping lists only for List fields."""
+    args = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    by_key = {
+        field.data_key or name: field for name, field in schema.fields.items()
+    }
+    return {
+        key: values if isinstance(by_key.get(key), fields.List)
+        and not isinstance(by_key.get(key), DelimitedList)
+        else values[-1]
+        for key, values in args.items()
+    }
+
+
+class AsyncReadApp:
+    """ASGI app serving the product reads and delegating to Flask."""
+
+    def __init__(self, flask_app: Flask, db_url: str = None):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = create_async_engine(async_database_url(
+            db_url or flask_app.config["SQLALCHEMY_DATABASE_URI"]))
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.compressor = flask_app.extensions["compressor"]
+        self.limiter = flask_app.extensions["rate_limiter"]
+        self.pagination_schema = PaginationProductsSchema()
+        self.product_schema = ProductOutputSchema()
+        self.columns_schema = ProductsColumns()
+        self.routes = [
+            (re.compile(r"/api/products/(?P<marketplace>[^/]+)"),
+             "products.ProductsList", self.products_list),
+            (re.compile(r"/api/product/(?P<marketplace>[^/]+)/(?P<asin>[^/]+)"),
+             "products.ProductOperations", self.product),
+            (re.compile(r"/api/brands/(?P<marketplace>[^/]+)"),
+             "products.ProductBrandsList", self.brands),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            for pattern, endpoint, handler in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match:
+                    wait = self.rate_limit(scope, endpoint)
+                    if wait:
+                        return await self.send_json(
+                            scope, send,
+                            {"code": 429,
+                             "status": HTTPStatus(429).phrase,
+                             "message": "Too many requests."},
+                            status=429,
+                            headers=[(b"retry-after",
+                                      str(math.ceil(wait)).encode())])
+                    # Flask must not count this request a second time.
+                    token = already_limited.set(True)
+                    try:
+                        result = await handler(scope, **match.groupdict())
+                        if result is None:
+                            return await self.wsgi(scope, receive, send)
+                        if isinstance(result, tuple):
+                            body, status, headers = result
+                            return await self.send_json(
+                                scope, send, body, status=status,
+                                headers=headers)
+                        return await self.send_json(scope, send, result)
+                    finally:
+                        already_limited.reset(token)
+
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Dispose the async engine when the server shuts down."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def send_json(self, scope, send, body, status: int = 200,
+                        headers: list = None):
+        """Send `body` encoded and compressed the way the Flask app does.
+
+        A `body` of None sends no body, for a 304."""
+        headers = [
+            (b"access-control-allow-origin", b"*"),
+            (b"vary", b"Accept-Encoding"),
+            *(headers or []),
+        ]
+        if body is None:
+            payload = b""
+        else:
+            payload = (json.dumps(body, sort_keys=True, separators=(",", ":"))
+                       + "\n").encode()
+            headers.insert(0, (b"content-type", b"application/json"))
+
+        encoding = negotiate(
+            dict(scope["headers"]).get(b"accept-encoding", b"").decode(),
+            self.compressor.encodings)
+        if encoding and payload and len(payload) >= self.compressor.min_size:
+            payload = self.compressor.compress_body(payload, encoding)
+            headers.append((b"content-encoding", encoding.encode()))
+            # The compressed body is not the bytes of the version.
+            headers = [
+                (name, b"W/" + value if name == b"etag"
+                 and not value.startswith(b"W/") else value)
+                for name, value in headers
+            ]
+        headers.append((b"content-length", str(len(payload)).encode()))
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers,
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    def known_marketplace(self, marketplace: str) -> bool:
+        """Unknown marketplaces are answered (404) by Flask."""
+        return marketplace in self.flask_app.config["MARKETPLACES"]
+
+    async def products_list(self, scope, marketplace):
+        """Async version of ProductsList.get."""
+        if not self.known_marketplace(marketplace):
+            return None
+        try:
+            products_query = self.pagination_schema.load(
+                query_args(scope, self.pagination_schema), unknown=EXCLUDE)
+        except ValidationError:
+            return None
+
+        page = products_query["page"]
+        per_page = products_query["per_page"]
+        if page < 1 or per_page < 0:
+            return None
+
+        product_fields = tuple(sorted(set(
+            products_query.get("product_fields") or [])))
+
+        query = products_list_select(marketplace, products_query)
+        async with self.session() as session:
+            total = await session.scalar(
+                select(func.count()).select_from(
+                    query.order_by(None).subquery()))
+            products = (await session.scalars(
+                query.options(*product_read_options(product_fields))
+                .limit(per_page).offset((page - 1) * per_page)
+            )).all()
+            if not products and page != 1:
+                return None
+            brands = (await session.scalars(brands_select(marketplace))).all()
+
+        pages = math.ceil(total / per_page) if total and per_page else 0
+        schema = PaginationProductsSchema.with_product_fields(product_fields)
+        return schema.dump({
+            "products": products,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": pages,
+            "has_next": page < pages,
+            "has_prev": page > 1,
+            "brands": brands,
+        })
+
+    async def product(self, scope, marketplace, asin):
+        """Async version of ProductOperations.get.
+
+        Returns (body, status, headers), for the ETag and the 304 of an
+        If-None-Match listing the version."""
+        if not self.known_marketplace(marketplace):
+            return None
+        async with self.session() as session:
+            product = await session.scalar(
+                select(ProductModel).filter_by(marketplace=marketplace, asin=asin)
+                .options(*product_read_options()))
+        if product is None:
+            return None
+
+        headers = [(b"etag", etag(product.version).encode())]
+        versions = etag_versions(
+            dict(scope["headers"]).get(b"if-none-match", b"").decode())
+        if versions and product.version in versions:
+            return None, 304, headers
+        return self.product_schema.dump(product), 200, headers
+
+    async def brands(self, scope, marketplace):
+        """Async version of ProductBrandsList.get, admins only."""
+        claims = self.admin_claims(scope)
+        if claims is None or not self.known_marketplace(marketplace):
+            return None
+        async with self.session() as session:
+            brands = (await session.scalars(brands_select(marketplace))).all()
+        return self.columns_schema.dump({"brands": brands})
+
+    def rate_limit(self, scope, endpoint: str) -> float:
+        """Take a rate limit token, returns the seconds to wait or 0."""
+        if not self.flask_app.config["RATELIMIT_ENABLED"]:
+            return 0.0
+        rule = self.limiter.rule_for(endpoint, scope["method"])
+        if rule is None:
+            return 0.0
+        client = scope.get("client") or ("", 0)
+        return self.limiter.hit(rule, client[0], self.token_claims(scope))
+
+    def admin_claims(self, scope):
+        """Return the claims of a valid admin access token, or None."""
+        claims = self.token_claims(scope)
+        if claims is None or claims.get("role") != "admin":
+            return None
+        return claims
+
+    def token_claims(self, scope):
+        """Return the claims of a valid access token, or None."""
+        authorization = dict(scope["headers"]).get(b"authorization", b"")
+        scheme, _, token = authorization.decode("latin-1").partition(" ")
+        if scheme != "Bearer" or not token:
+            return None
+        with self.flask_app.app_context():
+            try:
+                claims = decode_token(token)
+            except Exception:
+                return None
+        if claims.get("type") != "access" or claims["jti"] in BLOCKLIST:
+            return None
+        return claims
+
+
+def create_asgi_app(db_url: str = None) -> AsyncReadApp:
+    """Create the Flask app and wrap it in the async read app."""
+    return AsyncReadApp(create_app(db_url=db_url), db_url=db_url)
@@ -0,0 +1,262 @@
+"""
+Command line interface of the app.
+The commands are registered on the `flask` command by create_app.
+"""
+
+import datetime
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .extensions import db
+from .models.change import purge_changes
+from .models.product import DEFAULT_MARKETPLACE, ProductModel
+from .utils.alerts import drain_outbox
+from .utils.catalog import (
+    BATCH_SIZE, CHUNK_SIZE, LOAD_FORMATS, REINDEX_TABLES, count_products,
+    delete_all_orphan_groups, delete_orphan_images, load_products,
+    purge_filter, purge_products, recompute_content_hashes,
+    recompute_primary_images, reindex_tables)
+from .utils.keys import ALGORITHMS, generate_private_key, new_kid, write_private_key
+from .utils.marketplaces import create_partition
+
+alerts_cli = AppGroup("alerts", help="Price alerts commands.")
+keys_cli = AppGroup("keys", help="JWT signing keys commands.")
+marketplaces_cli = AppGroup("marketplaces", help="Catalog marketplaces commands.")
+catalog_cli = AppGroup("catalog", help="Offline catalog maintenance commands.")
+changes_cli = AppGroup("changes", help="Change feed commands.")
+
+# Formats of `flask catalog export` and `import`, the default first.
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+@alerts_cli.command("drain")
+@click.option("--batch-size", default=100, show_default=True)
+@click.option("--interval", default=5.0, show_default=True,
+              help="Seconds to sleep when the outbox is empty.")
+@click.option("--once", is_flag=True, help="Drain the outbox and exit.")
+def drain_alerts(batch_size, interval, once):
+    """Deliver the pending alerts of the outbox."""
+    while True:
+        sent = drain_outbox(batch_size=batch_size)
+        if sent:
+            click.echo(f"{sent} alerts sent.")
+        elif once:
+            return
+        else:
+            time.sleep(interval)
+
+
+@changes_cli.command("purge")
+@click.option("--older-than", "days", type=click.IntRange(min=1),
+              required=True, help="Days of changes to keep.")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def purge_change_feed(days, batch_size):
+    """Delete the changes older than `--older-than` days, but the last
+    one. Consumers behind them re-read the catalog."""
+    before = (datetime.datetime.now(datetime.timezone.utc)
+              - datetime.timedelta(days=days))
+    deleted = purge_changes(before, batch_size)
+    click.echo(f"{deleted} changes deleted.")
+
+
+@keys_cli.command("generate")
+@click.option("--algorithm", type=click.Choice(ALGORITHMS), default="EdDSA",
+              show_default=True)
+@click.option("--dir", "directory", required=True,
+              type=click.Path(file_okay=False),
+              help="The JWT_KEYS_DIR of the app.")
+def generate_key(algorithm, directory):
+    """Add a signing key, active once the app is restarted."""
+    os.makedirs(directory, exist_ok=True)
+    kid = new_kid()
+    write_private_key(
+        generate_private_key(algorithm), os.path.join(directory, f"{kid}.pem"))
+    click.echo(kid)
+
+
+@marketplaces_cli.command("partition")
+def partition_marketplaces():
+    """Create the Postgres partitions of the configured marketplaces."""
+    if db.engine.dialect.name != "postgresql":
+        click.echo("Only the Postgres products table is partitioned.")
+        return
+    for marketplace in current_app.config["MARKETPLACES"]:
+        with db.engine.begin() as connection:
+            if create_partition(connection, marketplace):
+                click.echo(f"Partition of {marketplace} created.")
+
+
+def file_format(path: str, file_format: str, formats: tuple) -> str:
+    """Return `file_format`, or the format of the extension of `path`,
+    the first of `formats` when it is none of them."""
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return extension if extension in formats else formats[0]
+
+
+def check_marketplace_option(marketplace: str) -> str:
+    if marketplace not in current_app.config["MARKETPLACES"]:
+        raise click.BadParameter(
+            f"{marketplace!r} is not in MARKETPLACES.",
+            param_hint="--marketplace")
+    return marketplace
+
+
+marketplace_option = click.option(
+    "--marketplace", default=DEFAULT_MARKETPLACE, show_default=True)
+
+
+@catalog_cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@marketplace_option
+@click.option("--format", "format_", type=click.Choice(COLUMNAR_FORMATS),
+              help="Defaults to the extension of PATH.")
+@click.option("--batch-size", default=5000, show_default=True)
+def export_catalog(path, marketplace, format_, batch_size):
+    """Write the products of a marketplace to a Parquet or Arrow file."""
+    from .utils.columnar import export_batches, write_stream
+
+    check_marketplace_option(marketplace)
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += batch.num_rows
+            yield batch
+
+    with open(path, "wb") as file:
+        for chunk in write_stream(
+                counted(export_batches(marketplace, batch_size)),
+                file_format(path, format_, COLUMNAR_FORMATS)):
+            file.write(chunk)
+    click.echo(f"{rows} products exported.")
+
+
+@catalog_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@marketplace_option
+@click.option("--format", "format_", type=click.Choice(COLUMNAR_FORMATS),
+              help="Defaults to the extension of PATH.")
+@click.option("--batch-size", default=5000, show_default=True)
+def import_catalog(path, marketplace, format_, batch_size):
+    """Insert the products of a Parquet or Arrow file in a marketplace."""
+    from .utils.columnar import import_batches, read_batches
+
+    check_marketplace_option(marketplace)
+    with open(path, "rb") as file:
+        try:
+            result = import_batches(marketplace, read_batches(
+                file, file_format(path, format_, COLUMNAR_FORMATS),
+                batch_size))
+        except ValueError as error:
+            raise click.ClickException(str(error))
+    click.echo(f"{result['created']} products imported, "
+               f"{result['repeated']} already there.")
+
+
+@catalog_cli.command("load")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@marketplace_option
+@click.option("--format", "format_", type=click.Choice(LOAD_FORMATS),
+              help="Defaults to the extension of PATH, else ndjson.")
+@click.option("--workers", default=os.cpu_count() or 1,
+              show_default="CPU count",
+              help="Processes parsing and validating the file.")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True,
+              help="Records inserted per transaction.")
+def load_catalog(path, marketplace, format_, workers, chunk_size):
+    """Load the products of an NDJSON or CSV file into a marketplace.
+
+    NDJSON files have a product payload per line. CSV files have a
+    product per row, with the images as space separated URLs and the
+    twister as a JSON list. Existing ASINs and invalid records are
+    skipped."""
+    check_marketplace_option(marketplace)
+    with open(path, "rb") as file, click.progressbar(
+            length=os.path.getsize(path),
+            label=f"Loading {marketplace}") as progress:
+        result = load_products(
+            marketplace, file, file_format(path, format_, LOAD_FORMATS),
+            workers=workers, chunk_size=chunk_size, progress=progress.update)
+
+    for number, message in result["errors"]:
+        click.echo(f"Record {number}: {message}", err=True)
+    click.echo(f"{result['created']} products loaded, "
+               f"{result['repeated']} already there, "
+               f"{result['invalid']} invalid.")
+
+
+@catalog_cli.command("purge")
+@marketplace_option
+@click.option("--brand", "brands", multiple=True)
+@click.option("--asin", "asins", multiple=True)
+@click.option("--price-below", type=float)
+@click.option("--price-above", type=float)
+@click.option("--unpriced", is_flag=True,
+              help="Products without a price or with price 0.")
+@click.option("--all", "purge_all", is_flag=True,
+              help="Purge the whole marketplace, without filters.")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Only count the products.")
+def purge_catalog(marketplace, brands, asins, price_below, price_above,
+                  unpriced, purge_all, batch_size, dry_run):
+    """Delete the products of a marketplace matching all the filters."""
+    check_marketplace_option(marketplace)
+    filters = (brands, asins, price_below is not None,
+               price_above is not None, unpriced)
+    if not any(filters) and not purge_all:
+        raise click.UsageError("Pass a filter, or --all.")
+
+    clauses = purge_filter(
+        marketplace, brands, asins, price_below, price_above, unpriced)
+    total = count_products(clauses)
+    if dry_run:
+        click.echo(f"{total} products would be deleted.")
+        return
+
+    with click.progressbar(
+            length=total, label=f"Purging {marketplace}") as progress:
+        deleted = purge_products(
+            marketplace, clauses, batch_size, progress=progress.update)
+    click.echo(f"{deleted} products deleted.")
+
+
+@catalog_cli.command("reindex")
+@click.option("--table", "tables", multiple=True,
+              type=click.Choice(REINDEX_TABLES),
+              help="Defaults to every catalog table.")
+def reindex_catalog(tables):
+    """Rebuild the indexes of the catalog tables and refresh their
+    statistics, concurrently on Postgres."""
+    reindex_tables(
+        tables or REINDEX_TABLES,
+        progress=lambda table: click.echo(f"{table} reindexed."))
+
+
+@catalog_cli.command("recompute")
+@marketplace_option
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def recompute_catalog(marketplace, batch_size):
+    """Rebuild the data derived from the products: their content hashes
+    and primary image URLs, and delete the variant groups and images
+    left without products."""
+    check_marketplace_option(marketplace)
+    total = count_products([ProductModel.marketplace == marketplace])
+    with click.progressbar(
+            length=total, label=f"Hashing {marketplace}") as progress:
+        changed = recompute_content_hashes(
+            marketplace, batch_size, progress=progress.update)
+    click.echo(f"{changed} content hashes changed.")
+    with click.progressbar(
+            length=total, label=f"Primary images of {marketplace}") as progress:
+        changed = recompute_primary_images(
+            marketplace, batch_size, progress=progress.update)
+    click.echo(f"{changed} primary image URLs changed.")
+    click.echo(f"{delete_all_orphan_groups()} orphan variant groups deleted.")
+    click.echo(f"{delete_orphan_images()} orphan images deleted.")
@@ -2,3 +2,6 @@
 
 from .user import *
 from .product import *
+from .change import *
+from .watch import *
+from .migration import *
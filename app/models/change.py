@@ -0,0 +1,131 @@
+"""Change log model."""
+import datetime
+
+from sqlalchemy import delete, event, func, insert, select, text
+
+from ..extensions import db
+from ..utils.changes import change_notifier
+from .product import DEFAULT_MARKETPLACE, ProductModel
+
+# Held until commit on Postgres, so the seq order is the commit order
+# and a consumer never skips a seq committed after a higher one.
+CHANGES_LOCK_KEY = 7_250_001
+
+
+class ChangeModel(db.Model):
+    """Change of a product, written in the transaction of the change."""
+    __tablename__ = "changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = db.Column(db.Integer, primary_key=True)
+    marketplace = db.Column(
+        db.String(20), nullable=False, default=DEFAULT_MARKETPLACE,
+        server_default=DEFAULT_MARKETPLACE)
+    asin = db.Column(db.String(20), nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # "upsert" or "delete"
+    created_at = db.Column(
+        db.DateTime, nullable=False,
+        default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+def key_of(product: ProductModel) -> tuple:
+    return product.marketplace or DEFAULT_MARKETPLACE, product.asin
+
+
+@event.listens_for(db.session, "before_flush")
+def record_product_changes(session, flush_context, instances):
+    """Add a change record for each product written by the flush."""
+    changes = {}
+    for product in session.new:
+        if isinstance(product, ProductModel):
+            changes[key_of(product)] = "upsert"
+    for product in session.dirty:
+        if isinstance(product, ProductModel) and session.is_modified(product):
+            changes[key_of(product)] = "upsert"
+    for product in session.deleted:
+        if isinstance(product, ProductModel):
+            changes[key_of(product)] = "delete"
+
+    # Written already by record_changes, such as the claimed products.
+    recorded = session.info.get("recorded_changes", ())
+    changes = {
+        key: op for key, op in changes.items()
+        if op != "upsert" or key not in recorded
+    }
+    if changes:
+        lock_changes(session)
+        session.add_all(
+            ChangeModel(marketplace=marketplace, asin=asin, op=op)
+            for (marketplace, asin), op in changes.items())
+        session.info["changes_written"] = True
+
+
+def lock_changes(session) -> None:
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"),
+            {"key": CHANGES_LOCK_KEY})
+
+
+def record_changes(session, marketplace: str, asins: list, op: str) -> None:
+    """Write the changes of products written without the ORM flush, such
+    as the bulk inserts and the version claims, in the transaction of
+    `session`. The flush does not record them again."""
+    if not asins:
+        return
+    lock_changes(session)
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    # A Core executemany, the ORM bulk insert costs more than the
+    # statement for the large batches.
+    session.execute(insert(ChangeModel.__table__), [
+        {"marketplace": marketplace, "asin": asin, "op": op,
+         "created_at": created_at}
+        for asin in asins
+    ])
+    session.info.setdefault("recorded_changes", set()).update(
+        (marketplace, asin) for asin in asins)
+    session.info["changes_written"] = True
+
+
+def purge_changes(before: datetime.datetime, batch_size: int = 1000,
+                  progress=None) -> int:
+    """Delete the changes created before `before`, one batch per
+    transaction, and return how many were deleted.
+
+    The newest change is kept, so the last seq the feed and the
+    analytics cache compare (max(seq)) does not go back."""
+    last_seq = db.session.execute(select(func.max(ChangeModel.seq))).scalar()
+    if last_seq is None:
+        return 0
+    deleted = 0
+    while True:
+        seqs = db.session.execute(
+            select(ChangeModel.seq)
+            .filter(ChangeModel.created_at < before,
+                    ChangeModel.seq < last_seq)
+            .order_by(ChangeModel.seq)
+            .limit(batch_size)).scalars().all()
+        if not seqs:
+            db.session.commit()
+            return deleted
+
+        db.session.execute(
+            delete(ChangeModel).filter(ChangeModel.seq.in_(seqs)))
+        db.session.commit()
+
+        deleted += len(seqs)
+        if progress:
+            progress(len(seqs))
+
+
+@event.listens_for(db.session, "after_commit")
+def notify_changes(session):
+    session.info.pop("recorded_changes", None)
+    if session.info.pop("changes_written", False):
+        change_notifier.notify()
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_changes(session):
+    session.info.pop("recorded_changes", None)
+    session.info.pop("changes_written", None)
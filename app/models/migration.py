@@ -0,0 +1,18 @@
+"""Online migrations model."""
+import datetime
+
+from ..extensions import db
+
+
+class OnlineMigrationModel(db.Model):
+    """Progress of an online migration, run after the Alembic transaction."""
+    __tablename__ = "online_migrations"
+
+    name = db.Column(db.String(100), primary_key=True)
+    operation = db.Column(db.JSON, nullable=False)  # kind and parameters
+    status = db.Column(db.String(10), nullable=False, default="pending")  # "pending" or "done"
+    last_key = db.Column(db.BigInteger, nullable=True)  # checkpoint of a backfill
+    rows = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime, nullable=False,
+        default=lambda: datetime.datetime.now(datetime.timezone.utc))
@@ -1,41 +1,400 @@
 """Product model."""
+import hashlib
+import json
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.orderinglist import ordering_list
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import flag_dirty, set_committed_value
+
 from ..extensions import db
 
+DEFAULT_MARKETPLACE = "amazon"
+
+
 class ProductModel(db.Model):
     __tablename__ = "products"
+    __table_args__ = (
+        # On Postgres the table is partitioned by marketplace (migration
+        # 0007), so these are per-partition indexes there. Its primary
+        # key is (id, marketplace) there and product_images has no
+        # foreign key to it; db.create_all() builds the table below,
+        # not partitioned, so run the migrations on Postgres.
+        db.UniqueConstraint("marketplace", "asin"),
+        db.Index("ix_products_marketplace_price", "marketplace", "price"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    asin = db.Column(db.String(20), unique=True, nullable=False)
+    marketplace = db.Column(
+        db.String(20), nullable=False, default=DEFAULT_MARKETPLACE,
+        server_default=DEFAULT_MARKETPLACE)
+    asin = db.Column(db.String(20), nullable=False)
     price = db.Column(db.Float, nullable=True)
     url = db.Column(db.String(500), nullable=False)
     title = db.Column(db.Text, nullable=False)
-    brand = db.Column(db.String(100), nullable=True)
+    brand = db.Column(db.String(100), nullable=True, index=True)
     model = db.Column(db.String(100), nullable=True)
     saving_percentage = db.Column(db.Integer, nullable=True)
     basis_price = db.Column(db.Float, nullable=True)
     custumers_opinion = db.Column(db.String(50), nullable=True)
     ranking = db.Column(db.Integer, nullable=True)
+    variant_group_id = db.Column(db.Integer, db.ForeignKey("variant_groups.id"), nullable=True, index=True)
+    content_hash = db.Column(db.String(64), nullable=True)  # sha256 of the last PUT payload
+    primary_image_url = db.Column(db.String(500), nullable=True)  # url of images[0]
+    # Bumped by every update, see utils.concurrency.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
-    images = db.relationship("ProductImage", backref="product", lazy=True, cascade="all, delete-orphan")
-    twister = db.relationship("Twister", backref="product", lazy=True, cascade="all, delete-orphan")
+    images = db.relationship(
+        "ProductImage", backref="product", lazy=True,
+        order_by="ProductImage.position",
+        collection_class=ordering_list("position"),
+        cascade="all, delete-orphan")
+    variant_group = db.relationship("VariantGroup", lazy=True)
+    variant_members = db.relationship(
+        "VariantGroupMember",
+        primaryjoin="ProductModel.variant_group_id == foreign(VariantGroupMember.group_id)",
+        order_by="VariantGroupMember.position",
+        viewonly=True,
+    )
 
+    # Columns not sent by the scraper.
+    INTERNAL_COLUMNS = (
+        "id", "marketplace", "variant_group_id", "content_hash",
+        "primary_image_url", "version")
 
-class ProductImage(db.Model):
-    __tablename__ = "product_images"
+    @classmethod
+    def hash_for(cls, data: dict) -> str:
+        """Return the content hash of a loaded `ProductPutSchema` payload.
+
+        Missing columns count as None and missing images as unchanged,
+        the same way the PUT endpoints apply the payload.
+        """
+        normalized = {
+            column: data.get(column)
+            for column in cls.__table__.columns.keys()
+            if column not in cls.INTERNAL_COLUMNS
+        }
+        normalized["images"] = [
+            image["url"] for image in data.get("images") or []] or None
+        normalized["twister"] = [
+            [entry["type"], entry["name"], entry["asin"]]
+            for entry in data.get("twister") or []]
+        payload = json.dumps(
+            normalized, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def set_image_urls(self, urls: list) -> None:
+        """Point the images of the product to `urls`, in order, changing
+        only the positions whose URL changed."""
+        images = self.images
+        for image, url in zip(images, urls):
+            if image.url != url:
+                image.url = url
+        del images[len(urls):]
+        for url in urls[len(images):]:
+            images.append(ProductImage(url=url))
+        self.primary_image_url = urls[0] if urls else None
+
+    @property
+    def twister(self) -> list:
+        """Variations of the product, shared with its variant group."""
+        pending = self.__dict__.get("_pending_twister")
+        if pending is not None:
+            return pending
+        return self.variant_members
+
+    @twister.setter
+    def twister(self, entries):
+        """Set the variations, the variant group is resolved on flush."""
+        self._pending_twister = [
+            entry if isinstance(entry, VariantGroupMember)
+            else VariantGroupMember(**entry)
+            for entry in entries or []
+        ]
+        flag_dirty(self)
+
+
+class Image(db.Model):
+    """Image URL, stored once for all the products that show it."""
+    __tablename__ = "images"
 
     id = db.Column(db.Integer, primary_key=True)
+    url_hash = db.Column(db.LargeBinary(32), unique=True, nullable=False)  # sha256 digest of the url
     url = db.Column(db.String(500), nullable=False)
+
+    @staticmethod
+    def hash_for(url: str) -> bytes:
+        return hashlib.sha256(url.encode()).digest()
+
+
+class ProductImage(db.Model):
+    """Image of a product, at its position among the product images."""
+    __tablename__ = "product_images"
+    __table_args__ = (
+        # The image of a position is read from the primary key index
+        # alone: it includes image_id on Postgres, and on SQLite the
+        # table is stored in it.
+        db.PrimaryKeyConstraint(
+            "product_id", "position", postgresql_include=["image_id"]),
+        {"sqlite_with_rowid": False},
+    )
+
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    image_id = db.Column(db.Integer, db.ForeignKey("images.id"), nullable=False)
+
+    image = db.relationship("Image", lazy="joined")
+
+    @property
+    def url(self) -> str:
+        """URL of the image, the image is resolved on flush."""
+        url = self.__dict__.get("_url")
+        if url is not None:
+            return url
+        return self.image.url
+
+    @url.setter
+    def url(self, url: str):
+        self._url = url
+        self._url_unresolved = True
+        flag_dirty(self)
+
+
+def intern_images(session, urls) -> dict:
+    """Return the image id of each of `urls`, inserting the URLs that
+    are not stored yet. A URL inserted by a concurrent transaction is
+    reused instead of failing on the unique hash."""
+    urls_by_hash = {Image.hash_for(url): url for url in set(urls)}
+
+    def lookup(hashes):
+        ids = {}
+        for start in range(0, len(hashes), 500):
+            ids.update(session.execute(
+                db.select(Image.url_hash, Image.id)
+                .filter(Image.url_hash.in_(hashes[start:start + 500]))).all())
+        return ids
+
+    ids = lookup(list(urls_by_hash))
+    missing = [url_hash for url_hash in urls_by_hash if url_hash not in ids]
+    if missing:
+        dialect = session.get_bind().dialect.name
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert
+        session.execute(
+            insert(Image).on_conflict_do_nothing(index_elements=["url_hash"]),
+            [{"url_hash": url_hash, "url": urls_by_hash[url_hash]}
+             for url_hash in missing])
+        ids.update(lookup(missing))
+    return {url: ids[url_hash] for url_hash, url in urls_by_hash.items()}
+
+
+class VariantGroup(db.Model):
+    """Variant group shared by the products with the same variations."""
+    __tablename__ = "variant_groups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of the members and marketplace
 
+    members = db.relationship(
+        "VariantGroupMember", backref="group", lazy=True,
+        order_by="VariantGroupMember.position", cascade="all, delete-orphan")
 
-class Twister(db.Model):
-    """Twister model for product variations."""
-    __tablename__ = "twister"
+    @staticmethod
+    def key_for(marketplace: str, rows: list) -> str:
+        """Return the key of the group of (type, name, asin) `rows`, in
+        order, of the products of `marketplace`."""
+        payload = json.dumps(
+            [marketplace, [list(row) for row in rows]], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class VariantGroupMember(db.Model):
+    """Variation of a variant group, the twister of its products."""
+    __tablename__ = "variant_group_members"
 
     id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey("variant_groups.id"), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    marketplace = db.Column(
+        db.String(20), nullable=False, default=DEFAULT_MARKETPLACE,
+        server_default=DEFAULT_MARKETPLACE)
     type = db.Column(db.String(50), nullable=False)   # "style_name", "color_name", "size_name"
     name = db.Column(db.String(100), nullable=False)  # e.g. "Cosmic Black"
     asin = db.Column(db.String(20), nullable=False)   # e.g. "B082XY6YYZ"
-    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
 
+    # Product of the variation, looked up by its marketplace and asin.
+    variant = db.relationship(
+        "ProductModel",
+        primaryjoin="and_("
+                    "foreign(VariantGroupMember.marketplace) == ProductModel.marketplace, "
+                    "foreign(VariantGroupMember.asin) == ProductModel.asin)",
+        viewonly=True,
+        uselist=False,
+    )
+
+
+def intern_groups(session, rows_by_key: dict) -> dict:
+    """Return the variant group id of each key of `rows_by_key`, whose
+    values are the (marketplace, (type, name, asin) rows) of the group,
+    inserting the groups that are not stored yet with their members.
+
+    A group inserted by a concurrent transaction is reused instead of
+    failing on the unique key. On Postgres the groups found are locked
+    FOR KEY SHARE until the commit, so delete_orphan_groups cannot
+    delete a group a product is being pointed to.
+    """
+    if not rows_by_key:
+        return {}
+
+    def lookup(keys):
+        return dict(session.execute(
+            db.select(VariantGroup.key, VariantGroup.id)
+            .filter(VariantGroup.key.in_(keys))
+            .with_for_update(read=True, key_share=True)).all())
+
+    ids = lookup(list(rows_by_key))
+    missing = [key for key in rows_by_key if key not in ids]
+    if missing:
+        dialect = session.get_bind().dialect.name
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert
+        inserted = dict(session.execute(
+            insert(VariantGroup)
+            .on_conflict_do_nothing(index_elements=["key"])
+            .returning(VariantGroup.key, VariantGroup.id),
+            [{"key": key} for key in missing]).all())
+        if inserted:
+            session.execute(db.insert(VariantGroupMember), [
+                {"group_id": group_id, "position": position,
+                 "marketplace": rows_by_key[key][0], "type": tw_type,
+                 "name": name, "asin": asin}
+                for key, group_id in inserted.items()
+                for position, (tw_type, name, asin)
+                in enumerate(rows_by_key[key][1])
+            ])
+        ids.update(inserted)
+        # Inserted meanwhile by a concurrent transaction.
+        ids.update(lookup([key for key in missing if key not in inserted]))
+    return ids
+
+
+@event.listens_for(db.session, "before_flush")
+def resolve_variant_groups(session, flush_context, instances):
+    """Point the products with new variations to their variant group.
+
+    Products with the same variations share one group, so updating a
+    family only repoints its products. Groups left without products
+    are deleted.
+    """
+    pending = []
+    rows_by_key = {}
+    released = set()
+
+    for product in list(session.new) + list(session.dirty):
+        if not isinstance(product, ProductModel):
+            continue
+        entries = product.__dict__.pop("_pending_twister", None)
+        if entries is None:
+            continue
+
+        key = None
+        if entries:
+            marketplace = product.marketplace or DEFAULT_MARKETPLACE
+            rows = [(entry.type, entry.name, entry.asin) for entry in entries]
+            key = VariantGroup.key_for(marketplace, rows)
+            rows_by_key[key] = (marketplace, rows)
+        pending.append((product, key))
+
+    with session.no_autoflush:
+        group_ids = intern_groups(session, rows_by_key)
+        groups = {
+            group.id: group for group in session.execute(
+                db.select(VariantGroup)
+                .filter(VariantGroup.id.in_(list(group_ids.values())))
+                .options(selectinload(VariantGroup.members))
+            ).scalars()
+        } if group_ids else {}
+
+    for product, key in pending:
+        group = groups[group_ids[key]] if key is not None else None
+        with session.no_autoflush:
+            set_committed_value(
+                product, "variant_members",
+                list(group.members) if group is not None else [])
+
+        if product.variant_group_id is not None and (
+                group is None or group.id != product.variant_group_id):
+            released.add(product.variant_group_id)
+        product.variant_group = group
+
+    for product in session.deleted:
+        if isinstance(product, ProductModel) and product.variant_group_id:
+            released.add(product.variant_group_id)
+
+    if released:
+        session.info.setdefault("released_variant_groups", set()).update(released)
+
+
+@event.listens_for(db.session, "before_flush")
+def sync_primary_images(session, flush_context, instances):
+    """Copy the URL of the first image of the written products to their
+    primary_image_url, when their images are loaded."""
+    for product in list(session.new) + list(session.dirty):
+        if isinstance(product, ProductModel) and "images" in product.__dict__:
+            images = product.images
+            url = images[0].url if images else None
+            if product.primary_image_url != url:
+                product.primary_image_url = url
+
+
+@event.listens_for(db.session, "before_flush")
+def resolve_images(session, flush_context, instances):
+    """Point the product images with a new URL to its stored image."""
+    links = [
+        link for link in list(session.new) + list(session.dirty)
+        if isinstance(link, ProductImage)
+        and link.__dict__.pop("_url_unresolved", False)
+    ]
+    if not links:
+        return
+
+    with session.no_autoflush:
+        image_ids = intern_images(session, [link.url for link in links])
+    for link in links:
+        link.image_id = image_ids[link.url]
+
+
+@event.listens_for(db.session, "after_flush_postexec")
+def delete_released_variant_groups(session, flush_context):
+    """Delete the released variant groups no product points to anymore."""
+    released = session.info.pop("released_variant_groups", None)
+    if released:
+        delete_orphan_groups(session, released)
+
+
+def delete_orphan_groups(session, group_ids) -> None:
+    """Delete the variant groups of `group_ids` no product points to.
+
+    On Postgres the groups are locked FOR UPDATE first: a transaction
+    pointing a product to one of them (intern_groups locks it FOR KEY
+    SHARE) commits before they are checked, and is then seen pointing
+    to it."""
+    if not group_ids:
+        return
+
+    session.execute(
+        db.select(VariantGroup.id)
+        .filter(VariantGroup.id.in_(list(group_ids)))
+        .with_for_update())
+    orphans = db.select(VariantGroup.id).filter(
+        VariantGroup.id.in_(list(group_ids)),
+        ~db.select(ProductModel.id)
+        .filter(ProductModel.variant_group_id == VariantGroup.id)
+        .exists(),
+    )
+    orphan_ids = session.execute(orphans).scalars().all()
+    if orphan_ids:
+        session.execute(db.delete(VariantGroupMember).filter(
+            VariantGroupMember.group_id.in_(orphan_ids)))
+        session.execute(db.delete(VariantGroup).filter(
+            VariantGroup.id.in_(orphan_ids)))
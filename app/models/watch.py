@@ -0,0 +1,56 @@
+"""Watchlist models."""
+import datetime
+
+from ..extensions import db
+from .product import DEFAULT_MARKETPLACE
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class WatchModel(db.Model):
+    """Product watched by a user, with the price to be alerted at."""
+    __tablename__ = "watches"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "marketplace", "asin"),
+        # Watches of an ASIN sorted by target price, for the alert matcher.
+        db.Index(
+            "ix_watches_marketplace_asin_target_price",
+            "marketplace", "asin", "target_price"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    marketplace = db.Column(
+        db.String(20), nullable=False, default=DEFAULT_MARKETPLACE,
+        server_default=DEFAULT_MARKETPLACE)
+    asin = db.Column(db.String(20), nullable=False)
+    target_price = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    user = db.relationship(
+        "UserModel",
+        backref=db.backref("watches", lazy=True, cascade="all, delete-orphan"))
+
+
+class AlertModel(db.Model):
+    """Price alert waiting in the outbox to be delivered."""
+    __tablename__ = "alert_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    watch_id = db.Column(db.Integer, db.ForeignKey("watches.id", ondelete="SET NULL"), nullable=True)
+    marketplace = db.Column(
+        db.String(20), nullable=False, default=DEFAULT_MARKETPLACE,
+        server_default=DEFAULT_MARKETPLACE)
+    asin = db.Column(db.String(20), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    target_price = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    user = db.relationship(
+        "UserModel",
+        backref=db.backref("alerts", lazy=True, cascade="all, delete-orphan"))
@@ -0,0 +1,38 @@
+"""
+Resource to handle the catalog analytics endpoint.
+It works with:
+flask_smorest to create blueprints, routes,
+arguments and responses (the last two based on schemas).
+"""
+
+from flask import current_app
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from ..schemas import AnalyticsQuerySchema, AnalyticsSchema
+from ..utils.auth import role_filter
+from ..utils.marketplaces import check_marketplace
+
+blp = Blueprint(
+    "analytics", __name__,
+    description="Statistics of the catalog.",
+    url_prefix="/api"
+)
+
+
+@blp.route("/analytics/<string:marketplace>")
+class CatalogAnalytics(MethodView):
+    """Class to get the statistics of the catalog"""
+
+    @blp.arguments(AnalyticsQuerySchema, location="query")
+    @blp.response(200, AnalyticsSchema)
+    @role_filter(["admin"])
+    def get(self, analytics_query, marketplace):
+        """Endpoint to get the price distribution, discounts, ranking and
+        per-brand statistics of a marketplace.
+
+        The result is cached until the next product write."""
+
+        check_marketplace(marketplace)
+        return current_app.extensions["analytics_cache"].get(
+            marketplace, analytics_query["bins"])
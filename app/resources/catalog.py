@@ -0,0 +1,90 @@
+"""
+Resource to handle the catalog export and import endpoints.
+It works with:
+flask_smorest to create blueprints, routes,
+arguments and responses (the last two based on schemas).
+"""
+
+import shutil
+import tempfile
+
+from flask import Response, request, stream_with_context
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from ..schemas import CatalogFileQuerySchema, CatalogImportResultSchema
+from ..utils.auth import role_filter
+from ..utils.marketplaces import check_marketplace
+
+blp = Blueprint(
+    "catalog", __name__,
+    description="Columnar export and import of the catalog.",
+    url_prefix="/api"
+)
+
+# Uploads are spooled to disk past this size (Parquet must be seekable).
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+
+@blp.route("/catalog/<string:marketplace>/export")
+class CatalogExport(MethodView):
+    """Class to export the catalog of a marketplace"""
+
+    @blp.arguments(CatalogFileQuerySchema, location="query")
+    @blp.response(200)
+    @role_filter(["admin"])
+    def get(self, file_query, marketplace):
+        """Endpoint to download the products, images and twister of a
+        marketplace as a Parquet file or an Arrow IPC stream.
+
+        The file is streamed as the products are read, in batches."""
+
+        # pyarrow is imported on first use, it adds ~100 ms to the boot.
+        from ..utils.columnar import FORMATS, export_batches, write_stream
+
+        check_marketplace(marketplace)
+        file_format = file_query["format"]
+        return Response(
+            stream_with_context(
+                write_stream(export_batches(marketplace), file_format)),
+            mimetype=FORMATS[file_format],
+            headers={"Content-Disposition":
+                     f"attachment; filename={marketplace}.{file_format}"})
+
+
+@blp.route("/catalog/<string:marketplace>/import")
+class CatalogImport(MethodView):
+    """Class to import a catalog file into a marketplace"""
+
+    @blp.arguments(CatalogFileQuerySchema, location="query")
+    @blp.response(201, CatalogImportResultSchema)
+    @role_filter(["admin"])
+    def post(self, file_query, marketplace):
+        """Endpoint to upload a file of the export endpoint, as the raw
+        body. Its products are inserted in batches, the ASINs already in
+        the marketplace are skipped. An invalid file is refused before
+        its first batch, an invalid batch stops the import after the
+        batches before it.
+
+        Use `flask catalog import` for the catalogs that take longer to
+        load than the request timeout."""
+
+        from ..utils.columnar import import_batches, read_batches
+
+        check_marketplace(marketplace)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+            if file_query["format"] == "parquet":
+                shutil.copyfileobj(request.stream, body)
+                body.seek(0)
+                source = body
+            else:
+                source = request.stream
+            try:
+                result = import_batches(
+                    marketplace, read_batches(source, file_query["format"]))
+            except ValueError as error:
+                abort(422, message=str(error))
+
+        return dict(
+            result,
+            message=f"{result['created']} products have been imported.")
@@ -0,0 +1,66 @@
+"""
+Resource to handle the change feed endpoint.
+It works with:
+flask_smorest to create blueprints, routes,
+arguments and responses (the last two based on schemas).
+"""
+
+import time
+
+from flask import current_app
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from ..extensions import db
+from ..models.change import ChangeModel
+from ..schemas import ChangesQuerySchema, ChangesSchema
+from ..utils.auth import role_filter
+from ..utils.changes import change_notifier
+
+blp = Blueprint(
+    "changes", __name__,
+    description="Feed of the product changes.",
+    url_prefix="/api"
+)
+
+
+@blp.route("/changes")
+class ChangesList(MethodView):
+    """Class to get the product changes"""
+
+    @blp.arguments(ChangesQuerySchema, location="query")
+    @blp.response(200, ChangesSchema)
+    @role_filter(["admin"])
+    def get(self, changes_query):
+        """Endpoint to get the changes after the `since` sequence number.
+
+        With `wait`, the request is held until a change is committed or
+        `wait` seconds have passed."""
+
+        since = changes_query["since"]
+        limit = changes_query["limit"]
+        deadline = time.monotonic() + changes_query["wait"]
+        poll_interval = current_app.config["CHANGES_POLL_INTERVAL"]
+
+        while True:
+            generation = change_notifier.generation
+            changes = db.session.execute(
+                db.select(ChangeModel)
+                .filter(ChangeModel.seq > since)
+                .order_by(ChangeModel.seq)
+                .limit(limit + 1)
+            ).scalars().all()
+
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+
+            # Give the connection back to the pool while waiting.
+            db.session.close()
+            change_notifier.wait(generation, min(remaining, poll_interval))
+
+        return {
+            "changes": changes[:limit],
+            "last_seq": changes[:limit][-1].seq if changes else since,
+            "has_more": len(changes) > limit,
+        }
@@ -0,0 +1,31 @@
+"""
+Resource to publish the public keys of the JWT signing.
+It works with:
+flask_smorest to create blueprints, routes,
+arguments and responses (the last two based on schemas).
+"""
+
+from flask import current_app
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+blp = Blueprint(
+    "keys", __name__,
+    description="Public keys of the JWT signing."
+)
+
+JWKS_MAX_AGE = 300
+
+
+@blp.route("/.well-known/jwks.json")
+class Jwks(MethodView):
+    """Class to get the public keys"""
+
+    @blp.response(200)
+    def get(self):
+        """Endpoint to get the public keys verifying the tokens, by kid.
+
+        Empty when the tokens are signed with a shared secret (HS256)."""
+        key_set = current_app.extensions.get("jwt_keys")
+        jwks = key_set.jwks() if key_set else {"keys": []}
+        return jwks, 200, {"Cache-Control": f"public, max-age={JWKS_MAX_AGE}"}
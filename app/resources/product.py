@@ -7,6 +7,7 @@ arguments and responses (the last two based on schemas).
 
 import sys
 
+from flask import Response, jsonify, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from ..schemas import (
@@ -14,15 +15,25 @@ from ..schemas import (
     ProductInputSchema,
     PaginationProductsSchema,
     ProductPutSchema,
-    ProductsColumns)
-from sqlalchemy import asc, desc
+    ProductPatchSchema,
+    ProductsPatchSchema,
+    ProductsColumns,
+    ProductsLookupSchema,
+    ProductsLookupResultSchema)
 from sqlalchemy.exc import SQLAlchemyError
-
-from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy.orm import selectinload
 
 from ..extensions import db
-from ..models.product import ProductModel, ProductImage, Twister
+from ..models.product import ProductModel
+from ..utils.alerts import match_price_drops
 from ..utils.auth import role_filter
+from ..utils.concurrency import claim_products, etag, etag_versions
+from ..utils.marketplaces import check_marketplace
+from ..utils.prices import PRICE_COLUMNS, parse_price_rows, update_prices
+from ..utils.queries import (
+    products_list_select,
+    brands_select,
+    product_read_options)
 
 blp = Blueprint(
     "products", __name__,
@@ -31,18 +42,86 @@ blp = Blueprint(
 )
 
 
-@blp.route("/product/amazon")
+def update_product(product: ProductModel, data: dict, content_hash: str):
+    """Apply a loaded `ProductPutSchema` payload to `product`."""
+
+    for column in ProductModel.__table__.columns.keys():
+        if column in ProductModel.INTERNAL_COLUMNS:
+            continue
+        setattr(product, column, data.get(column))
+
+    if data.get("images"):
+        product.set_image_urls([image["url"] for image in data["images"]])
+
+    product.twister = data.get("twister")
+    product.content_hash = content_hash
+
+
+def patch_changes(product: ProductModel, data: dict) -> dict:
+    """Return the fields of a loaded `ProductPatchSchema` payload whose
+    value differs from `product`."""
+
+    changes = {
+        column: value for column, value in data.items()
+        if column in ProductModel.__table__.columns
+        and column not in ProductModel.INTERNAL_COLUMNS + ("asin",)
+        and getattr(product, column) != value
+    }
+    if "images" in data and [image.url for image in product.images] != [
+            image["url"] for image in data["images"] or []]:
+        changes["images"] = data["images"] or []
+    if "twister" in data and [
+            (member.type, member.name, member.asin)
+            for member in product.twister] != [
+            (entry.get("type"), entry.get("name"), entry.get("asin"))
+            for entry in data["twister"] or []]:
+        changes["twister"] = data["twister"] or []
+    return changes
+
+
+def patch_product(product: ProductModel, changes: dict):
+    """Apply the `patch_changes` of a payload to `product`.
+
+    The content hash is cleared, the next PUT of the product is applied
+    whatever its payload."""
+
+    for column, value in changes.items():
+        if column == "images":
+            product.set_image_urls([image["url"] for image in value])
+        elif column == "twister":
+            product.twister = value
+        else:
+            setattr(product, column, value)
+    product.content_hash = None
+
+
+def check_version(product: ProductModel, data: dict):
+    """Abort unless the If-Match header and the version of `data`, when
+    given, match the version of `product`."""
+
+    versions = etag_versions(request.headers.get("If-Match"))
+    if versions is not None and product.version not in versions:
+        abort(412, message="The product has another version.",
+              headers={"ETag": etag(product.version)})
+    if data.get("version") not in (None, product.version):
+        abort(409, message="The product has another version.")
+
+
+@blp.route("/product/<string:marketplace>")
 class Product(MethodView):
 
     @blp.arguments(ProductInputSchema)
     @blp.response(201, ProductOutputSchema)
     @role_filter(["admin"])
-    def post(self, product_data: ProductModel):
+    def post(self, product_data: ProductModel, marketplace):
         """Endpoint to post one product."""
 
-        if ProductModel.query.filter_by(asin=product_data.asin).first():
+        check_marketplace(marketplace)
+        if ProductModel.query.filter_by(
+                marketplace=marketplace, asin=product_data.asin).first():
             abort(409, message="A product with that ASIN already exists.")
         try:
+            product_data.marketplace = marketplace
             db.session.add(product_data)
             db.session.commit()
         except Exception as e:
@@ -52,56 +131,108 @@ class Product(MethodView):
         return product_data
 
 
-@blp.route("/product/amazon/<string:asin>")
+@blp.route("/product/<string:marketplace>/<string:asin>")
 class ProductOperations(MethodView):
     """Class to get specific products"""
 
     @blp.response(200, ProductOutputSchema)
-    def get(self, asin):
-        """Endpoint to get a product by its asin, with optional filters."""
-        product = ProductModel.query.filter_by(asin=asin).first_or_404()
-
-        return product
+    @blp.alt_response(304, description="The If-None-Match header matches.")
+    def get(self, marketplace, asin):
+        """Endpoint to get a product by its asin, with optional filters.
+
+        A request whose If-None-Match lists the version of the product
+        gets a 304 without a body."""
+        check_marketplace(marketplace)
+        product = ProductModel.query.filter_by(
+            marketplace=marketplace, asin=asin).first_or_404()
+
+        versions = etag_versions(request.headers.get("If-None-Match"))
+        if versions and product.version in versions:
+            return Response(
+                status=304, headers={"ETag": etag(product.version)})
+        return product, {"ETag": etag(product.version)}
 
     @blp.arguments(ProductPutSchema)
     @blp.response(200, ProductOutputSchema)
+    @blp.alt_response(409, description="The product has another version.")
+    @blp.alt_response(412, description="The If-Match header does not match.")
     @role_filter(["admin"])
-    def put(self, product_data, asin):
-        """Endpoint to update a product using the asin."""
+    def put(self, product_data, marketplace, asin):
+        """Endpoint to update a product using the asin.
+
+        The update is based on the version of the If-Match header, or
+        of the payload, when given, else on the version it reads."""
 
+        check_marketplace(marketplace)
         with db.session.no_autoflush:
             product = ProductModel.query.filter_by(
-                asin=asin).first()
+                marketplace=marketplace, asin=asin).first()
 
             if not product:
                 abort(404, message="Product not found")
 
-            for column in ProductModel.__table__.columns.keys():
-                if column == "id":
-                    continue
-                if column in product_data:
-                    setattr(product, column, product_data[column])
-                else:
-                    setattr(product, column, None)
-
-            if product_data.get("images"):
-                product.images.clear()
-                for image in product_data["images"]:
-                    product.images.append(ProductImage(**image))
-
-            product.twister.clear()
-            if product_data.get("twister"):
-                for twister in product_data["twister"]:
-                    product.twister.append(Twister(**twister))
-                    db.session.commit()
-        return product_data
+            check_version(product, product_data)
+            if not claim_products(marketplace, [product]):
+                db.session.rollback()
+                abort(409, message="The product has another version.")
+
+            price_changes = {asin: (product.price, product_data.get("price"))}
+            update_product(
+                product, product_data, ProductModel.hash_for(product_data))
+            match_price_drops(price_changes, marketplace)
+            db.session.commit()
+
+        product_data["version"] = product.version
+        # The twister dump looks its products up in the marketplace.
+        for entry in product_data.get("twister") or []:
+            entry["marketplace"] = marketplace
+        return product_data, {"ETag": etag(product.version)}
+
+    @blp.arguments(ProductPatchSchema)
+    @blp.response(200, ProductOutputSchema)
+    @blp.alt_response(409, description="The product has another version.")
+    @blp.alt_response(412, description="The If-Match header does not match.")
+    @role_filter(["admin"])
+    def patch(self, product_data, marketplace, asin):
+        """Endpoint to update the fields sent of a product using the asin.
+
+        The versions are checked like for the PUT. A payload which
+        changes nothing does not update the product."""
+
+        check_marketplace(marketplace)
+        if product_data.get("asin", asin) != asin:
+            abort(422, errors={"json": {
+                "asin": ["Not the ASIN of the URL."]}})
+        with db.session.no_autoflush:
+            product = ProductModel.query.filter_by(
+                marketplace=marketplace, asin=asin).first()
+
+            if not product:
+                abort(404, message="Product not found")
+
+            check_version(product, product_data)
+            changes = patch_changes(product, product_data)
+            if changes:
+                if not claim_products(marketplace, [product]):
+                    db.session.rollback()
+                    abort(409, message="The product has another version.")
+                price_changes = {}
+                if "price" in changes:
+                    price_changes[asin] = (product.price, changes["price"])
+                patch_product(product, changes)
+                match_price_drops(price_changes, marketplace)
+                db.session.commit()
+
+        return product, {"ETag": etag(product.version)}
 
     @blp.response(200)
     @role_filter(["admin"])
-    def delete(self, asin):
+    def delete(self, marketplace, asin):
         """Endpoint to delete a product using the asin."""
 
-        product = ProductModel.query.filter_by(asin=asin).first_or_404()
+        check_marketplace(marketplace)
+        product = ProductModel.query.filter_by(
+            marketplace=marketplace, asin=asin).first_or_404()
 
         db.session.delete(product)
         db.session.commit()
@@ -109,50 +240,33 @@ class ProductOperations(MethodView):
         return {"message": "The product has been deleted."}
 
 
-@blp.route("/products/amazon")
+@blp.route("/products/<string:marketplace>")
 class ProductsList(MethodView):
     """Class to get all the Products"""
 
     @blp.arguments(PaginationProductsSchema, location='query')
     @blp.response(200, PaginationProductsSchema)
-    def get(self, products_query):
-        """Endpoint to get all products, with optional filters."""
-
-        page = products_query.get("page")
-        per_page = products_query.get("per_page")
-        min_price = products_query.get("min_price")
-        max_price = products_query.get("max_price")
-        sort_by = products_query.get("sort_by")
-        sort_order = products_query.get("sort_order")
-        brands = products_query.get("brands")
-
-        query = ProductModel.query.filter(ProductModel.price != 0)
-
-        # Filters
-        if min_price is not None:
-            query = query.filter(ProductModel.price >= min_price)
-        if max_price is not None:
-            query = query.filter(ProductModel.price <= max_price)
-
-        # Brand
-        if len(brands):
-            query = query.filter(ProductModel.brand.in_(brands))
-
-        # Order
-        if hasattr(ProductModel, sort_by):
-            column = getattr(ProductModel, sort_by)
-            if sort_order == "desc":
-                query = query.order_by(desc(column))
-            else:
-                query = query.order_by(asc(column))
+    def get(self, products_query, marketplace):
+        """Endpoint to get all products, with optional filters.
+
+        `fields` limits the product fields returned and loaded."""
 
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=True)
+        check_marketplace(marketplace)
+
+        product_fields = tuple(sorted(set(
+            products_query.get("product_fields") or [])))
+
+        pagination = db.paginate(
+            products_list_select(marketplace, products_query).options(
+                *product_read_options(product_fields)),
+            page=products_query.get("page"),
+            per_page=products_query.get("per_page"),
+            error_out=True)
 
         brands = db.session.execute(
-            db.select(ProductModel.brand).distinct()).scalars().all()
+            brands_select(marketplace)).scalars().all()
 
-        return {
+        result = {
             "products": pagination.items,
             "page": pagination.page,
             "per_page": pagination.per_page,
@@ -162,22 +276,29 @@ class ProductsList(MethodView):
             "has_prev": pagination.has_prev,
             "brands": brands
         }
+        if product_fields:
+            return jsonify(PaginationProductsSchema.with_product_fields(
+                product_fields).dump(result))
+        return result
 
     @blp.arguments(ProductInputSchema(many=True))
     @blp.response(201)
     @role_filter(["admin"])
-    def post(self, products_data: ProductModel):
+    def post(self, products_data: ProductModel, marketplace):
         """Endpoint to post a list of products"""
 
+        check_marketplace(marketplace)
         new_products = []
         repeated_count = 0
 
         for product_data in products_data:
 
-            if ProductModel.query.filter_by(asin=product_data.asin).first():
+            if ProductModel.query.filter_by(
+                    marketplace=marketplace, asin=product_data.asin).first():
                 repeated_count += 1
                 continue
 
+            product_data.marketplace = marketplace
             db.session.add(product_data)
             new_products.append(product_data)
 
@@ -188,59 +309,166 @@ class ProductsList(MethodView):
 
         return {"message": "The products have been created.", "repeated_products": repeated_count}
 
-    @jwt_required()
     @blp.arguments(ProductPutSchema(many=True))
     @blp.response(200)
     @role_filter(["admin"])
-    def put(self, products_data):
-        """Endpoint to update the products on data base."""
+    def put(self, products_data, marketplace):
+        """Endpoint to update the products on data base.
+
+        Products whose content hash matches the payload are skipped, and
+        the price drops are matched against the watchlists. Products
+        whose version is not the one of the payload, or which another
+        request updates meanwhile, are returned as conflicts."""
+
+        check_marketplace(marketplace)
+        payloads = {data["asin"]: data for data in products_data}
+
+        stored = {
+            asin: (content_hash, version)
+            for asin, content_hash, version in db.session.execute(
+                db.select(
+                    ProductModel.asin, ProductModel.content_hash,
+                    ProductModel.version)
+                .filter(ProductModel.marketplace == marketplace,
+                        ProductModel.asin.in_(list(payloads))))
+        }
 
-        count_updated = 0
         to_create = []
+        conflicts = []
+        changed = {}
+        unchanged = 0
+        for asin, data in payloads.items():
+            if asin not in stored:
+                to_create.append(asin)
+                continue
+            stored_hash, version = stored[asin]
+            if data.get("version") not in (None, version):
+                conflicts.append(asin)
+                continue
+            content_hash = ProductModel.hash_for(data)
+            if content_hash != stored_hash:
+                changed[asin] = content_hash
+            else:
+                unchanged += 1
+
+        with db.session.no_autoflush:
+            products = db.session.execute(
+                db.select(ProductModel)
+                .filter(ProductModel.marketplace == marketplace,
+                        ProductModel.asin.in_(list(changed)))
+                .options(selectinload(ProductModel.images))
+            ).scalars().all()
+            claimed = claim_products(marketplace, products)
+            conflicts.extend(sorted(
+                {product.asin for product in products}
+                - {product.asin for product in claimed}))
+
+            price_changes = {}
+            for product in claimed:
+                data = payloads[product.asin]
+                price_changes[product.asin] = (product.price, data.get("price"))
+                update_product(product, data, changed[product.asin])
+
+            match_price_drops(price_changes, marketplace)
 
-        for data in products_data:
-            with db.session.no_autoflush:
-                product = ProductModel.query.filter_by(
-                    asin=data["asin"]).first()
-
-            if product:
-                count_updated += 1
-                for column in ProductModel.__table__.columns.keys():
-                    if column == "id":
-                        continue
-                    if column in data:
-                        setattr(product, column, data[column])
-                    else:
-                        setattr(product, column, None)
-
-                if data.get("images"):
-                    product.images.clear()
-                    for image in data["images"]:
-                        product.images.append(ProductImage(**image))
-
-                product.twister.clear()
-                if data.get("twister"):
-                    for twister in data["twister"]:
-                        product.twister.append(Twister(**twister))
-                        db.session.commit()
+        db.session.commit()
+        return {
+            "message": f"{len(claimed)} products updated successfully.",
+            "updated": len(claimed),
+            "unchanged": unchanged,
+            "to_create": to_create,
+            "conflicts": conflicts
+        }
+
+    @blp.arguments(ProductsPatchSchema(many=True))
+    @blp.response(200)
+    @role_filter(["admin"])
+    def patch(self, products_data, marketplace):
+        """Endpoint to update the fields sent of the products.
+
+        The payloads with prices only (`price`, `basis_price`,
+        `saving_percentage`) are applied with one set-based UPDATE, the
+        others through the ORM. The versions are checked like for the
+        PUT, and the products which change are the ones updated."""
+
+        check_marketplace(marketplace)
+        payloads = {data["asin"]: data for data in products_data}
+
+        price_rows = {}
+        others = {}
+        for asin, data in payloads.items():
+            if set(data) <= {"asin", "version", *PRICE_COLUMNS}:
+                columns = tuple(
+                    column for column in PRICE_COLUMNS if column in data)
+                price_rows.setdefault(columns, []).append((
+                    asin, data.get("version"),
+                    *[data[column] for column in columns]))
             else:
-                to_create.append(data["asin"])
+                others[asin] = data
+
+        result = {"updated": 0, "unchanged": 0, "to_create": [],
+                  "conflicts": []}
+        with db.session.no_autoflush:
+            products = db.session.execute(
+                db.select(ProductModel)
+                .filter(ProductModel.marketplace == marketplace,
+                        ProductModel.asin.in_(list(others)))
+                .options(selectinload(ProductModel.images))
+            ).scalars().all() if others else []
+            found = {product.asin for product in products}
+            result["to_create"] = [
+                asin for asin in others if asin not in found]
+
+            changes = {}
+            for product in products:
+                data = others[product.asin]
+                if data.get("version") not in (None, product.version):
+                    result["conflicts"].append(product.asin)
+                    continue
+                product_changes = patch_changes(product, data)
+                if product_changes:
+                    changes[product.asin] = product_changes
+                else:
+                    result["unchanged"] += 1
+
+            claimed = claim_products(marketplace, [
+                product for product in products if product.asin in changes])
+            result["conflicts"].extend(sorted(
+                set(changes) - {product.asin for product in claimed}))
+
+            price_changes = {}
+            for product in claimed:
+                product_changes = changes[product.asin]
+                if "price" in product_changes:
+                    price_changes[product.asin] = (
+                        product.price, product_changes["price"])
+                patch_product(product, product_changes)
+            match_price_drops(price_changes, marketplace)
+            result["updated"] = len(claimed)
+
+        for columns, rows in price_rows.items():
+            prices_result = update_prices(marketplace, rows, columns)
+            result["updated"] += prices_result["updated"]
+            result["unchanged"] += prices_result["unchanged"]
+            result["to_create"] += prices_result["to_create"]
+            result["conflicts"] += prices_result["conflicts"]
 
         db.session.commit()
         return {
-            "message": f"{count_updated} products updated successfully.",
-            "to_create": to_create
+            "message": f"{result['updated']} products updated successfully.",
+            **result
         }
 
     @blp.response(200)
     @role_filter(["admin"])
-    def delete(self):
-        """Endpoint to delete ALL products."""
+    def delete(self, marketplace):
+        """Endpoint to delete ALL products of the marketplace."""
 
+        check_marketplace(marketplace)
         try:
             # Delete all records in ProductModel
             products = (db.session.execute(
-                db.select(ProductModel)
+                db.select(ProductModel).filter_by(marketplace=marketplace)
             ).scalars()
                 .all())
             count = 0
@@ -259,32 +487,88 @@ class ProductsList(MethodView):
             abort(500, {"error": str(e)})
 
 
-@blp.route("/products/amazon/id")
+@blp.route("/products/<string:marketplace>/prices")
+class ProductsPrices(MethodView):
+    """Class to update the prices of products in bulk"""
+
+    @blp.response(200)
+    @role_filter(["admin"])
+    def put(self, marketplace):
+        """Endpoint to update prices from a JSON array of `[asin, price,
+        basis_price, saving_percentage]` arrays.
+
+        The arrays are validated in one pass, without marshmallow, and
+        applied with one set-based UPDATE. The products whose prices
+        change are the ones updated, their versions are bumped."""
+
+        check_marketplace(marketplace)
+        rows, errors = parse_price_rows(request.get_json(silent=True))
+        if errors:
+            abort(422, errors={"json": errors})
+
+        result = update_prices(marketplace, rows, PRICE_COLUMNS)
+        db.session.commit()
+        return {
+            "message": f"{result['updated']} products updated successfully.",
+            **result
+        }
+
+
+@blp.route("/products/<string:marketplace>/lookup")
+class ProductsLookup(MethodView):
+    """Class to get several products by their asin."""
+
+    @blp.arguments(ProductsLookupSchema)
+    @blp.response(200, ProductsLookupResultSchema)
+    def post(self, lookup_data, marketplace):
+        """Endpoint to get a list of products by their asins, in one query."""
+
+        check_marketplace(marketplace)
+        asins = list(dict.fromkeys(lookup_data["asins"]))
+
+        products = db.session.execute(
+            db.select(ProductModel)
+            .filter(ProductModel.marketplace == marketplace,
+                    ProductModel.asin.in_(asins))
+            .options(*product_read_options())
+        ).scalars().all()
+
+        found = {product.asin: product for product in products}
+
+        return {
+            "products": found,
+            "missing": [asin for asin in asins if asin not in found]
+        }
+
+
+@blp.route("/products/<string:marketplace>/id")
 class ProductsIdList(MethodView):
     """Class to get all the Products IDs"""
 
     @blp.response(200, ProductsColumns)
     @role_filter(["admin"])
-    def get(self):
+    def get(self, marketplace):
         """Endpoint to get all the IDs"""
 
+        check_marketplace(marketplace)
         asins_list = db.session.execute(
-            db.select(ProductModel.asin)).scalars().all()
+            db.select(ProductModel.asin).filter_by(marketplace=marketplace)
+        ).scalars().all()
 
         return {"asins": asins_list}
 
 
-@blp.route("/brands/amazon")
+@blp.route("/brands/<string:marketplace>")
 class ProductBrandsList(MethodView):
     """Class to get all the Products brands"""
 
     @blp.response(200, ProductsColumns)
     @role_filter(["admin"])
-    def get(self):
+    def get(self, marketplace):
         """Endpoint to get all the brands on database."""
 
+        check_marketplace(marketplace)
         brands_list = db.session.execute(
-            db.select(ProductModel.brand).distinct()
-        ).scalars().all()
+            brands_select(marketplace)).scalars().all()
 
         return {"brands": brands_list}
@@ -111,7 +111,6 @@ class User(MethodView):
             abort(404, message="User not found.")
         return user
 
-    @jwt_required()
     @role_filter(["admin"])
     def delete(self, user_id):
         """Endpoint to delete a specific user by the id."""
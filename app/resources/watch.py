@@ -0,0 +1,86 @@
+"""
+Resource to handle the watchlist endpoints.
+It works with:
+flask_smorest to create blueprints, routes,
+arguments and responses (the last two based on schemas).
+"""
+
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from ..extensions import db
+from ..models.product import ProductModel
+from ..models.watch import WatchModel
+from ..schemas import MarketplaceQuerySchema, WatchSchema
+from ..utils.marketplaces import check_marketplace
+
+blp = Blueprint(
+    "watchlist", __name__,
+    description="Operations on the watchlist of the user.",
+    url_prefix="/api"
+)
+
+
+@blp.route("/watchlist")
+class Watchlist(MethodView):
+    """Class to list and add the watches of the user"""
+
+    @jwt_required()
+    @blp.response(200, WatchSchema(many=True))
+    def get(self):
+        """Endpoint to get the watchlist of the user."""
+        return db.session.execute(
+            db.select(WatchModel)
+            .filter_by(user_id=int(get_jwt_identity()))
+            .order_by(WatchModel.id)
+        ).scalars().all()
+
+    @jwt_required()
+    @blp.arguments(WatchSchema)
+    @blp.response(201, WatchSchema)
+    def post(self, watch_data):
+        """Endpoint to watch a product, alerted when its price drops to
+        the target price."""
+        user_id = int(get_jwt_identity())
+        check_marketplace(watch_data["marketplace"])
+
+        if not db.session.execute(
+                db.select(ProductModel.id).filter_by(
+                    marketplace=watch_data["marketplace"],
+                    asin=watch_data["asin"])
+        ).first():
+            abort(404, message="Product not found")
+        if db.session.execute(
+                db.select(WatchModel.id).filter_by(
+                    user_id=user_id, marketplace=watch_data["marketplace"],
+                    asin=watch_data["asin"])
+        ).first():
+            abort(409, message="The product is already in the watchlist.")
+
+        watch = WatchModel(user_id=user_id, **watch_data)
+        db.session.add(watch)
+        db.session.commit()
+        return watch
+
+
+@blp.route("/watchlist/<string:asin>")
+class WatchOperations(MethodView):
+    """Class to remove a watch of the user"""
+
+    @jwt_required()
+    @blp.arguments(MarketplaceQuerySchema, location="query")
+    def delete(self, marketplace_query, asin):
+        """Endpoint to stop watching a product of a marketplace, the
+        default one unless `marketplace` is given."""
+        watch = db.session.execute(
+            db.select(WatchModel).filter_by(
+                user_id=int(get_jwt_identity()),
+                marketplace=marketplace_query["marketplace"], asin=asin)
+        ).scalar_one_or_none()
+        if not watch:
+            abort(404, message="The product is not in the watchlist.")
+
+        db.session.delete(watch)
+        db.session.commit()
+        return {"message": "The product has been removed from the watchlist."}
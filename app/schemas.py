@@ -3,10 +3,16 @@ Module to handle api schemas.
 This function allows to structure the
 requests and the responses in our endpoints.
 """
-from marshmallow import Schema, fields, EXCLUDE, post_dump, post_load
+from functools import lru_cache
+
+from marshmallow import Schema, fields, validate, EXCLUDE, post_dump, post_load
+from webargs.fields import DelimitedList
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from .models.user import UserModel, RoleModel
-from .models.product import ProductModel, ProductImage, Twister
+from .models.product import (
+    DEFAULT_MARKETPLACE, ProductModel, ProductImage, VariantGroupMember)
+from .models.change import ChangeModel
+from .models.watch import WatchModel
 from passlib.hash import pbkdf2_sha256
 from .extensions import db
 
@@ -72,10 +78,10 @@ class ProductImageSchema(SQLAlchemyAutoSchema):
         model = ProductImage
         load_instance = True
         include_fk = True
+        exclude = ("position", "image_id")
         sqla_session = db.session
         nknown = EXCLUDE
 
-    id = fields.Int(dump_only=True)
     url = fields.Str(required=True)
     product_id = fields.Int(dump_only=True)
 
@@ -85,15 +91,17 @@ class ProductPutImageSchema(ProductImageSchema):
         model = ProductImage
         load_instance = False
         include_fk = True
+        exclude = ("position", "image_id")
         sqla_session = db.session
         nknown = EXCLUDE
 
 
 class TwisterSchema(SQLAlchemyAutoSchema):
     class Meta:
-        model = Twister
+        model = VariantGroupMember
         load_instance = True
         include_fk = True
+        exclude = ("group_id", "position", "marketplace")
         sqla_session = db.session
         unknown = EXCLUDE
 
@@ -103,16 +111,21 @@ class TwisterSchema(SQLAlchemyAutoSchema):
     asin = fields.Str(required=True)
     product_id = fields.Int(dump_only=True)
 
-    @post_dump
-    def add_product_info(self, data, **kwargs):
-        product = ProductModel.query.filter_by(asin=data["asin"]).first()
+    @post_dump(pass_original=True)
+    def add_product_info(self, data, original, **kwargs):
+        if isinstance(original, VariantGroupMember):
+            product = original.variant
+        else:
+            product = ProductModel.query.filter_by(
+                marketplace=original.get("marketplace", DEFAULT_MARKETPLACE),
+                asin=data["asin"]).first()
         if product and product.price != 0:
             key = f"product_{product.asin}"
             data[key] = {
                 "asin": product.asin,
                 "title": product.title,
                 "price": product.price,
-                "image": product.images[0].url,
+                "image": product.primary_image_url,
                 "url": product.url
             }
             if data["type"] == 'color_name':
@@ -130,9 +143,10 @@ class TwisterSchema(SQLAlchemyAutoSchema):
 
 class TwisterPutSchema(TwisterSchema):
     class Meta:
-        model = Twister
+        model = VariantGroupMember
         load_instance = False
         include_fk = True
+        exclude = ("group_id", "position", "marketplace")
         sqla_session = db.session
         unknown = EXCLUDE
 
@@ -143,6 +157,10 @@ class ProductInputSchema(SQLAlchemyAutoSchema):
         load_instance = True
         include_relationships = True
         include_fk = True
+        exclude = (
+            "marketplace", "variant_group", "variant_group_id",
+            "variant_members", "content_hash", "primary_image_url",
+            "version")
         sqla_session = db.session
         unknown = EXCLUDE
 
@@ -168,14 +186,57 @@ class ProductPutSchema(ProductInputSchema):
         load_instance = False
         include_relationships = True
         include_fk = True
+        exclude = (
+            "marketplace", "variant_group", "variant_group_id",
+            "variant_members", "content_hash", "primary_image_url")
         sqla_session = db.session
         unknown = EXCLUDE
 
     images = fields.List(fields.Nested(ProductPutImageSchema))
     twister = fields.List(fields.Nested(TwisterPutSchema))
+    version = fields.Int(metadata={
+        "description": "Version the update is based on. The update is a "
+                       "conflict if the product has another version."})
+
+
+class ProductPatchSchema(ProductPutSchema):
+    class Meta:
+        model = ProductModel
+        load_instance = False
+        include_relationships = True
+        include_fk = True
+        exclude = (
+            "marketplace", "variant_group", "variant_group_id",
+            "variant_members", "content_hash", "primary_image_url")
+        sqla_session = db.session
+        unknown = EXCLUDE
+
+    # Only the fields sent are updated, null clears an optional one.
+    asin = fields.Str(metadata={
+        "description": "Optional, the ASIN of the URL when given."})
+    price = fields.Float(allow_none=True)
+    url = fields.Str()
+    title = fields.Str()
+    brand = fields.Str(allow_none=True)
+    model = fields.Str(allow_none=True)
+    saving_percentage = fields.Int(allow_none=True)
+    basis_price = fields.Float(allow_none=True)
+    custumers_opinion = fields.Str(allow_none=True)
+    ranking = fields.Int(allow_none=True)
+
+
+class ProductsPatchSchema(ProductPatchSchema):
+    class Meta(ProductPatchSchema.Meta):
+        pass
+
+    asin = fields.Str(required=True)
 
 
 class ProductOutputSchema(ProductInputSchema):
+    class Meta(ProductInputSchema.Meta):
+        exclude = (
+            "marketplace", "variant_group", "variant_group_id",
+            "variant_members", "content_hash")
 
     images_examples = [
         "string",
@@ -212,6 +273,11 @@ class ProductOutputSchema(ProductInputSchema):
                 continue
             simplified[key] = value
 
+        # Dumped for the `fields` listings only, the full product has its
+        # images already.
+        if not self.only:
+            simplified.pop("primary_image_url", None)
+
         if simplified.get("images"):
             simplified["images"] = [image["url"]
                                     for image in simplified["images"]]
@@ -236,9 +302,35 @@ class ProductOutputSchema(ProductInputSchema):
         return simplified
 
 
+PRODUCT_OUTPUT_FIELDS = sorted(ProductOutputSchema().fields)
+
+MAX_LOOKUP_ASINS = 100
+
+
+class ProductsLookupSchema(Schema):
+
+    asins = fields.List(
+        fields.Str(), required=True,
+        validate=validate.Length(min=1, max=MAX_LOOKUP_ASINS))
+
+
+class ProductsLookupResultSchema(Schema):
+
+    products = fields.Dict(
+        keys=fields.Str(), values=fields.Nested(ProductOutputSchema),
+        dump_only=True)
+    missing = fields.List(fields.Str(), dump_only=True)
+
+
 class PaginationProductsSchema(Schema):
 
     products = fields.List(fields.Nested(ProductOutputSchema), dump_only=True)
+    product_fields = DelimitedList(
+        fields.Str(),
+        data_key="fields",
+        load_only=True,
+        validate=validate.ContainsOnly(PRODUCT_OUTPUT_FIELDS),
+        metadata={"description": "Comma separated product fields to return."})
     page = fields.Int(load_default=1)
     per_page = fields.Int(load_default=10)
     min_price = fields.Float(load_only=True)
@@ -251,7 +343,135 @@ class PaginationProductsSchema(Schema):
     has_prev = fields.Bool(dump_only=True)
     brands = fields.List(fields.String, load_default=[])
 
+    @classmethod
+    @lru_cache(maxsize=128)
+    def with_product_fields(cls, product_fields: tuple = None):
+        """Return a schema dumping only `product_fields` of each product."""
+        if not product_fields:
+            return cls()
+        return cls(only=[
+            name for name in cls._declared_fields if name != "products"
+        ] + [f"products.{name}" for name in product_fields])
+
 class ProductsColumns(Schema):
 
     asins = fields.List(fields.String, dump_only=True)
     brands = fields.List(fields.String, dump_only=True)
+
+
+MAX_CHANGES_LIMIT = 1000
+MAX_CHANGES_WAIT = 30
+
+
+class ChangeSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = ChangeModel
+        exclude = ("created_at",)
+
+
+class ChangesQuerySchema(Schema):
+
+    since = fields.Int(load_default=0, validate=validate.Range(min=0))
+    limit = fields.Int(
+        load_default=500,
+        validate=validate.Range(min=1, max=MAX_CHANGES_LIMIT))
+    wait = fields.Float(
+        load_default=0,
+        validate=validate.Range(min=0, max=MAX_CHANGES_WAIT),
+        metadata={"description": "Seconds to wait for a change when there is none."})
+
+
+class ChangesSchema(Schema):
+
+    changes = fields.List(fields.Nested(ChangeSchema), dump_only=True)
+    last_seq = fields.Int(dump_only=True)
+    has_more = fields.Bool(dump_only=True)
+
+
+class WatchSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = WatchModel
+        load_instance = False
+        unknown = EXCLUDE
+
+    id = fields.Int(dump_only=True)
+    marketplace = fields.Str(load_default=DEFAULT_MARKETPLACE)
+    asin = fields.Str(required=True)
+    target_price = fields.Float(
+        required=True, validate=validate.Range(min=0, min_inclusive=False))
+    created_at = fields.DateTime(dump_only=True)
+
+
+class MarketplaceQuerySchema(Schema):
+
+    marketplace = fields.Str(load_default=DEFAULT_MARKETPLACE)
+
+
+MAX_ANALYTICS_BINS = 200
+
+
+class AnalyticsQuerySchema(Schema):
+
+    bins = fields.Int(
+        load_default=20,
+        validate=validate.Range(min=1, max=MAX_ANALYTICS_BINS),
+        metadata={"description": "Number of bins of the price histogram."})
+
+
+class StatsSummarySchema(Schema):
+
+    count = fields.Int(dump_only=True)
+    min = fields.Float(dump_only=True, allow_none=True)
+    max = fields.Float(dump_only=True, allow_none=True)
+    mean = fields.Float(dump_only=True, allow_none=True)
+    percentiles = fields.Dict(
+        keys=fields.Str(), values=fields.Float(allow_none=True),
+        dump_only=True)
+
+
+class HistogramSchema(Schema):
+
+    edges = fields.List(fields.Float, dump_only=True)
+    counts = fields.List(fields.Int, dump_only=True)
+
+
+class PriceStatsSchema(StatsSummarySchema):
+
+    histogram = fields.Nested(HistogramSchema, dump_only=True)
+
+
+class BrandStatsSchema(Schema):
+
+    brand = fields.Str(dump_only=True, allow_none=True)
+    count = fields.Int(dump_only=True)
+    mean_price = fields.Float(dump_only=True, allow_none=True)
+    min_price = fields.Float(dump_only=True, allow_none=True)
+    max_price = fields.Float(dump_only=True, allow_none=True)
+    mean_discount = fields.Float(dump_only=True, allow_none=True)
+    best_ranking = fields.Float(dump_only=True, allow_none=True)
+
+
+class AnalyticsSchema(Schema):
+
+    marketplace = fields.Str(dump_only=True)
+    count = fields.Int(dump_only=True)
+    price = fields.Nested(PriceStatsSchema, dump_only=True)
+    discount = fields.Nested(StatsSummarySchema, dump_only=True)
+    saving_percentage = fields.Nested(StatsSummarySchema, dump_only=True)
+    ranking = fields.Nested(StatsSummarySchema, dump_only=True)
+    brands = fields.List(fields.Nested(BrandStatsSchema), dump_only=True)
+    last_seq = fields.Int(dump_only=True)
+
+
+class CatalogFileQuerySchema(Schema):
+
+    format = fields.Str(
+        load_default="parquet", validate=validate.OneOf(["parquet", "arrow"]),
+        metadata={"description": "Parquet file or Arrow IPC stream."})
+
+
+class CatalogImportResultSchema(Schema):
+
+    message = fields.Str(dump_only=True)
+    created = fields.Int(dump_only=True)
+    repeated = fields.Int(dump_only=True)
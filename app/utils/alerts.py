@@ -0,0 +1,146 @@
+"""Alerts Utilities
+This module matches the price changes of the product updates against
+the watchlists and drains the alert outbox.
+
+The watches crossed by the price drops are selected in SQL, joining
+the drops with the watches on the (marketplace, asin, target_price)
+index: each drop is one range scan of the index, new_price <=
+target_price < old_price, so a batch of N drops reads only the watches
+it crosses, in O(N log W) plus those watches, whatever the number W of
+watches of the ASINs. The drops are bound as one array per column on
+Postgres, and as one JSON array read with json_each on SQLite.
+"""
+
+import datetime
+import json
+
+from flask import current_app
+from sqlalchemy.dialects import postgresql
+
+from ..extensions import db
+from ..models.product import DEFAULT_MARKETPLACE
+from ..models.watch import WatchModel, AlertModel
+
+ALERT_MAX_ATTEMPTS = 5
+
+
+def drops_source(marketplace: str, drops: dict):
+    """Return the (marketplace, asin, old_price, new_price) rows of
+    `drops` as a FROM clause, with one parameter per column on Postgres
+    and one in all on SQLite.
+
+    The marketplace is a column of the rows rather than a constant of
+    the join: with a constant, SQLite scans the watches of the
+    marketplace as the outer loop of the join."""
+    rows = [(marketplace, asin, old_price or None, new_price)
+            for asin, (old_price, new_price) in drops.items()]
+    names = ("marketplace", "asin", "old_price", "new_price")
+    types = (WatchModel.marketplace.type, WatchModel.asin.type,
+             WatchModel.target_price.type, WatchModel.target_price.type)
+    if db.session.get_bind().dialect.name == "postgresql":
+        return db.func.unnest(*[
+            db.bindparam(
+                None, [row[index] for row in rows],
+                type_=postgresql.ARRAY(column_type))
+            for index, column_type in enumerate(types)
+        ]).table_valued(*[
+            db.column(name, column_type)
+            for name, column_type in zip(names, types)
+        ]).render_derived(name="d")
+
+    values = db.func.json_each(json.dumps(rows)).table_valued("value")
+    return db.select(*[
+        db.func.json_extract(values.c.value, f"$[{index}]").label(name)
+        for index, name in enumerate(names)
+    ]).subquery("d")
+
+
+def crossed_watches(marketplace: str, drops: dict) -> list:
+    """Return the (asin, watch_id, user_id, target_price) of the watches
+    of `marketplace` whose target the prices of `drops`, mapping ASINs
+    to their (old_price, new_price), dropped to: old_price >
+    target_price >= new_price.
+
+    A product without a previous price crosses every target above its
+    new price.
+    """
+    if not drops:
+        return []
+    source = drops_source(marketplace, drops)
+    return db.session.execute(
+        db.select(
+            WatchModel.asin, WatchModel.id, WatchModel.user_id,
+            WatchModel.target_price)
+        .select_from(source)
+        .join(WatchModel, db.and_(
+            WatchModel.marketplace == source.c.marketplace,
+            WatchModel.asin == source.c.asin,
+            WatchModel.target_price >= source.c.new_price,
+            db.or_(source.c.old_price.is_(None),
+                   WatchModel.target_price < source.c.old_price)))
+        .order_by(WatchModel.asin, WatchModel.target_price)
+    ).all()
+
+
+def match_price_drops(price_changes: dict,
+                      marketplace: str = DEFAULT_MARKETPLACE) -> int:
+    """Add an outbox alert for each watch crossed by `price_changes`.
+
+    `price_changes` maps each ASIN of `marketplace` to its (old_price,
+    new_price). The alerts are added to the session, to be committed
+    with the update.
+    """
+    drops = {
+        asin: (old_price, new_price)
+        for asin, (old_price, new_price) in price_changes.items()
+        if new_price and (not old_price or new_price < old_price)
+    }
+
+    alerts = [
+        AlertModel(
+            user_id=user_id, watch_id=watch_id,
+            marketplace=marketplace, asin=asin,
+            price=drops[asin][1], target_price=target_price)
+        for asin, watch_id, user_id, target_price
+        in crossed_watches(marketplace, drops)
+    ]
+    db.session.add_all(alerts)
+    return len(alerts)
+
+
+def log_alert(alert: AlertModel) -> None:
+    """Default delivery of the alerts: the app log."""
+    current_app.logger.info(
+        "Price alert for user %s: %s on %s is at %s (target %s).",
+        alert.user_id, alert.asin, alert.marketplace, alert.price, alert.target_price)
+
+
+def drain_outbox(deliver=log_alert, batch_size: int = 100) -> int:
+    """Deliver a batch of pending alerts, returns how many were sent.
+
+    On Postgres the batch is locked with SKIP LOCKED, so several
+    workers can drain the outbox at once. Alerts whose delivery raises
+    are retried by the next batches, up to ALERT_MAX_ATTEMPTS times.
+    """
+    alerts = db.session.execute(
+        db.select(AlertModel)
+        .filter(AlertModel.sent_at.is_(None),
+                AlertModel.attempts < ALERT_MAX_ATTEMPTS)
+        .order_by(AlertModel.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    sent = 0
+    for alert in alerts:
+        alert.attempts += 1
+        try:
+            deliver(alert)
+        except Exception:
+            current_app.logger.exception("Delivery of alert %s failed.", alert.id)
+            continue
+        alert.sent_at = datetime.datetime.now(datetime.timezone.utc)
+        sent += 1
+
+    db.session.commit()
+    return sent
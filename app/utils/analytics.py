@@ -0,0 +1,174 @@
+"""Analytics Utilities
+This module computes the catalog statistics of a marketplace: price
+distribution, discounts, ranking and per-brand aggregates. The numeric
+columns are read in one query into NumPy arrays and every statistic is
+computed on the arrays, without a Python loop over the products.
+
+The results are cached per marketplace and number of bins until the
+next product write, seen as a new sequence number of the change feed,
+so every worker drops its copy after a write of any process.
+"""
+
+import threading
+
+import numpy as np
+from flask import Flask
+
+from ..extensions import db
+from ..models.change import ChangeModel
+from ..models.product import ProductModel
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def fetch_columns(marketplace: str) -> dict:
+    """Read the numeric columns and brand of `marketplace` as arrays.
+
+    Missing values are NaN in the numeric arrays."""
+    rows = db.session.execute(
+        db.select(
+            ProductModel.brand, ProductModel.price, ProductModel.basis_price,
+            ProductModel.saving_percentage, ProductModel.ranking)
+        .filter(ProductModel.marketplace == marketplace)
+    ).all()
+    brand, price, basis_price, saving_percentage, ranking = (
+        zip(*rows) if rows else ((),) * 5)
+    return {
+        "brand": np.array([name or "" for name in brand], dtype=str),
+        "price": np.array(price, dtype=float),
+        "basis_price": np.array(basis_price, dtype=float),
+        "saving_percentage": np.array(saving_percentage, dtype=float),
+        "ranking": np.array(ranking, dtype=float),
+    }
+
+
+def to_number(value):
+    """Return a JSON number, None for NaN and infinities."""
+    value = float(value)
+    return round(value, 2) if np.isfinite(value) else None
+
+
+def summary(values: np.ndarray) -> dict:
+    """Count, min, max, mean and percentiles of the finite `values`."""
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return {"count": 0, "min": None, "max": None, "mean": None,
+                "percentiles": {f"p{q}": None for q in PERCENTILES}}
+    return {
+        "count": int(values.size),
+        "min": to_number(values.min()),
+        "max": to_number(values.max()),
+        "mean": to_number(values.mean()),
+        "percentiles": dict(zip(
+            [f"p{q}" for q in PERCENTILES],
+            map(to_number, np.percentile(values, PERCENTILES)))),
+    }
+
+
+def brand_aggregates(brand: np.ndarray, price: np.ndarray,
+                     discount: np.ndarray, ranking: np.ndarray) -> list:
+    """Per-brand counts, prices, mean discount and best ranking."""
+    if not brand.size:
+        return []
+    names, inverse = np.unique(brand, return_inverse=True)
+    size = names.size
+
+    def mean(values):
+        known = np.isfinite(values)
+        counts = np.bincount(inverse[known], minlength=size)
+        sums = np.bincount(
+            inverse[known], weights=values[known], minlength=size)
+        return np.divide(
+            sums, counts, out=np.full(size, np.nan), where=counts > 0)
+
+    def extreme(values, function, start):
+        known = np.isfinite(values)
+        result = np.full(size, start)
+        function.at(result, inverse[known], values[known])
+        return result
+
+    counts = np.bincount(inverse, minlength=size)
+    mean_price = mean(price)
+    min_price = extreme(price, np.minimum, np.inf)
+    max_price = extreme(price, np.maximum, -np.inf)
+    mean_discount = mean(discount)
+    best_ranking = extreme(ranking, np.minimum, np.inf)
+
+    order = np.lexsort((names, -counts))
+    return [{
+        "brand": str(names[index]) or None,
+        "count": int(counts[index]),
+        "mean_price": to_number(mean_price[index]),
+        "min_price": to_number(min_price[index]),
+        "max_price": to_number(max_price[index]),
+        "mean_discount": to_number(mean_discount[index]),
+        "best_ranking": to_number(best_ranking[index]),
+    } for index in order]
+
+
+def compute_analytics(columns: dict, bins: int) -> dict:
+    """Compute the statistics of the arrays of `fetch_columns`."""
+    price = columns["price"]
+    basis_price = columns["basis_price"]
+    # Price 0 marks the products without an offer, like the listing.
+    price = np.where(price > 0, price, np.nan)
+
+    # Discount from the basis price, in percent, where there is one.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discount = np.where(
+            (basis_price > 0) & (price <= basis_price),
+            (basis_price - price) / basis_price * 100, np.nan)
+
+    offered = price[np.isfinite(price)]
+    counts, edges = (np.histogram(offered, bins=bins) if offered.size
+                     else (np.zeros(0), np.zeros(0)))
+
+    return {
+        "count": int(columns["brand"].size),
+        "price": dict(summary(price), histogram={
+            "edges": [to_number(edge) for edge in edges],
+            "counts": [int(count) for count in counts],
+        }),
+        "discount": summary(discount),
+        "saving_percentage": summary(columns["saving_percentage"]),
+        "ranking": summary(columns["ranking"]),
+        "brands": brand_aggregates(
+            columns["brand"], price, discount, columns["ranking"]),
+    }
+
+
+class AnalyticsCache:
+    """Analytics results, valid until the next change of the feed."""
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def get(self, marketplace: str, bins: int) -> dict:
+        last_seq = db.session.execute(
+            db.select(db.func.max(ChangeModel.seq))).scalar() or 0
+        key = (marketplace, bins)
+        with self._lock:
+            cached = self._results.get(key)
+        if cached is not None and cached["last_seq"] == last_seq:
+            return cached
+
+        result = dict(
+            compute_analytics(fetch_columns(marketplace), bins),
+            marketplace=marketplace, last_seq=last_seq)
+        with self._lock:
+            # The results computed before the last change are stale.
+            self._results = {
+                cached_key: cached
+                for cached_key, cached in self._results.items()
+                if cached["last_seq"] == last_seq
+            }
+            self._results[key] = result
+        return result
+
+
+def init_analytics(app: Flask) -> AnalyticsCache:
+    """Register the analytics cache on `app`."""
+    cache = AnalyticsCache()
+    app.extensions["analytics_cache"] = cache
+    return cache
@@ -1,22 +1,117 @@
 """Authentication Utilities
 This module provides utility functions for handling authentication and authorization
 using Flask-JWT-Extended. It includes decorators to enforce role-based access control.
+
+The access tokens verified by `role_filter` are kept in a bounded LRU keyed by the
+raw token, so repeated admin calls skip the signature verification and the claims
+parsing. A cached token is dropped once it expires, after `JWT_CACHE_TTL` seconds,
+or as soon as its jti is in the blocklist.
+
+The signing keys are loaded once by create_app, before the cache is created, so
+a key removed from `JWT_KEYS_DIR` is trusted until the workers are restarted
+(all of them: gunicorn preloads the app in its master, a HUP keeps the keys),
+and the restart empties the cache with it: a removed key is not trusted
+`JWT_CACHE_TTL` seconds longer.
 """
 
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask, current_app, g, request
 from flask_jwt_extended import (
-    jwt_required,
+    verify_jwt_in_request,
     get_jwt,
 )
 from flask_smorest import abort
 from functools import wraps
 
+from ..blocklist import BLOCKLIST
+
+
+class VerifiedTokenCache:
+    """Thread safe LRU of verified access tokens and their claims."""
+
+    def __init__(self, max_entries: int, ttl: float, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """Return the (header, claims) of a cached token still valid."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            header, claims, valid_until = entry
+            if self.clock() >= valid_until or claims["jti"] in BLOCKLIST:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return header, claims
+
+    def set(self, token: str, header: dict, claims: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        valid_until = self.clock() + self.ttl
+        if "exp" in claims:
+            valid_until = min(valid_until, claims["exp"])
+        with self._lock:
+            self._entries[token] = (header, claims, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def init_token_cache(app: Flask) -> VerifiedTokenCache:
+    """Create the verified-token cache of `app`."""
+    app.config.setdefault("JWT_CACHE_SIZE", 1024)
+    app.config.setdefault("JWT_CACHE_TTL", 60)
+
+    cache = VerifiedTokenCache(
+        app.config["JWT_CACHE_SIZE"], app.config["JWT_CACHE_TTL"])
+    app.extensions["token_cache"] = cache
+    return cache
+
+
+def request_token():
+    """Return the raw token of the Authorization header, or None."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme != current_app.config["JWT_HEADER_TYPE"] or not token:
+        return None
+    return token
+
+
+def verify_access_token() -> None:
+    """`verify_jwt_in_request` for access tokens, through the cache."""
+    cache = current_app.extensions.get("token_cache")
+    token = request_token()
+    cached = cache.get(token) if cache is not None and token else None
+
+    if cached is None:
+        verified = verify_jwt_in_request()
+        if verified and token and cache is not None:
+            cache.set(token, *verified)
+        return
+
+    # The request context state of verify_jwt_in_request, read by get_jwt.
+    # These are private names of flask-jwt-extended, test_auth checks they
+    # are still the ones it sets. No user is loaded: with a
+    # `user_lookup_loader`, get_current_user() would raise on a cache hit,
+    # so the views behind role_filter use get_jwt_identity() instead.
+    g._jwt_extended_jwt_user = None
+    g._jwt_extended_jwt_header, g._jwt_extended_jwt = cached
+    g._jwt_extended_jwt_location = "headers"
+
 
 def role_filter(roles: list) -> callable:
 
     def wrapper(fn):
         @wraps(fn)
-        @jwt_required()
         def decorated(*args, **kwargs):
+            verify_access_token()
             claims = get_jwt()
             if claims.get("role") not in roles:
                 abort(403, message="Admin privilege required.")
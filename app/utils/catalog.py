@@ -0,0 +1,428 @@
+"""Catalog Utilities
+This module holds the offline catalog maintenance of `flask catalog`:
+the bulk insert path shared by the file loads and imports, the loads of
+NDJSON and CSV files, the purges by filter and the rebuild of the data
+derived from the products.
+
+A load reads the file in chunks of records that a pool of worker
+processes parses and validates with `ProductPutSchema`, while the main
+process inserts the chunks already validated with executemany inserts,
+one transaction per chunk. Purges and recomputes go by batches of ids
+too, so none of them loads the catalog in memory or holds a long
+transaction.
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+from collections import deque
+
+from marshmallow import ValidationError
+from sqlalchemy import or_, text
+from sqlalchemy.orm import selectinload
+
+from ..extensions import db
+from ..models.change import record_changes
+from ..models.product import (
+    Image, ProductModel, ProductImage, VariantGroup,
+    delete_orphan_groups, intern_groups, intern_images)
+from ..schemas import ProductPutSchema
+
+LOAD_FORMATS = ("ndjson", "csv")
+
+CHUNK_SIZE = 1000
+
+BATCH_SIZE = 1000
+
+# Errors kept to report, the others are only counted.
+MAX_ERRORS = 20
+
+PRODUCT_COLUMNS = [
+    "asin", "price", "url", "title", "brand", "model", "saving_percentage",
+    "basis_price", "custumers_opinion", "ranking", "content_hash",
+]
+
+REINDEX_TABLES = (
+    "products", "product_images", "images", "variant_groups",
+    "variant_group_members", "changes",
+)
+
+
+def resolve_groups(marketplace: str, rows_by_key: dict) -> dict:
+    """Return the variant group id of each key of `rows_by_key`,
+    inserting the missing groups with their (type, name, asin) rows."""
+    return intern_groups(db.session, {
+        key: (marketplace, rows) for key, rows in rows_by_key.items()})
+
+
+def insert_products(marketplace: str, products: list) -> tuple:
+    """Insert `products` into `marketplace` with executemany inserts.
+
+    Each product is a dict of the PRODUCT_COLUMNS, its image URLs under
+    "images" and its (type, name, asin) dicts under "twister". Products
+    whose ASIN already exists are skipped. The caller commits.
+    Returns the (created, repeated) counts.
+    """
+    existing = set(db.session.execute(
+        db.select(ProductModel.asin).filter(
+            ProductModel.marketplace == marketplace,
+            ProductModel.asin.in_([row["asin"] for row in products]))
+    ).scalars())
+    new_products = []
+    for row in products:
+        if row["asin"] not in existing:
+            existing.add(row["asin"])
+            new_products.append(row)
+    if not new_products:
+        return 0, len(products)
+
+    keys = []
+    rows_by_key = {}
+    for row in new_products:
+        key = None
+        if row["twister"]:
+            rows = [(entry["type"], entry["name"], entry["asin"])
+                    for entry in row["twister"]]
+            key = VariantGroup.key_for(marketplace, rows)
+            rows_by_key[key] = rows
+        keys.append(key)
+    group_ids = resolve_groups(marketplace, rows_by_key)
+
+    product_ids = db.session.execute(
+        db.insert(ProductModel).returning(
+            ProductModel.id, sort_by_parameter_order=True),
+        [dict(
+            {column: row[column] for column in PRODUCT_COLUMNS},
+            marketplace=marketplace, variant_group_id=group_ids.get(key),
+            primary_image_url=(row["images"] or [None])[0])
+         for row, key in zip(new_products, keys)]
+    ).scalars().all()
+
+    image_ids = intern_images(db.session, [
+        url for row in new_products for url in row["images"] or []])
+    images = [
+        {"product_id": product_id, "position": position,
+         "image_id": image_ids[url]}
+        for product_id, row in zip(product_ids, new_products)
+        for position, url in enumerate(row["images"] or [])
+    ]
+    if images:
+        db.session.execute(db.insert(ProductImage), images)
+
+    record_changes(
+        db.session, marketplace, [row["asin"] for row in new_products],
+        "upsert")
+    return len(new_products), len(products) - len(new_products)
+
+
+def product_row(data: dict) -> dict:
+    """Return the `insert_products` row of a loaded `ProductPutSchema`
+    payload, hashed like the PUT endpoints hash it."""
+    row = {column: data.get(column) for column in PRODUCT_COLUMNS}
+    row["content_hash"] = ProductModel.hash_for(data)
+    row["images"] = [image["url"] for image in data.get("images") or []]
+    row["twister"] = [
+        {"type": entry["type"], "name": entry["name"], "asin": entry["asin"]}
+        for entry in data.get("twister") or []]
+    return row
+
+
+def csv_record(row: dict) -> dict:
+    """Return the payload of a CSV row. Empty cells are missing, the
+    images are space separated URLs and the twister is a JSON list."""
+    record = {
+        key: value for key, value in row.items()
+        if key and value not in (None, "")
+    }
+    if "images" in record:
+        record["images"] = [{"url": url} for url in record["images"].split()]
+    if "twister" in record:
+        record["twister"] = json.loads(record["twister"])
+    return record
+
+
+class CountingLines:
+    """Decoded lines of a binary file, counting the bytes read."""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for line in self.file:
+            self.bytes_read += len(line)
+            yield line.decode("utf-8")
+
+
+def read_chunks(file, file_format: str, chunk_size: int = CHUNK_SIZE):
+    """Yield the (start, records, file_format, bytes_read) chunks of an
+    NDJSON (lines) or CSV (rows) binary file."""
+    lines = CountingLines(file)
+    if file_format == "csv":
+        records = csv.DictReader(lines)
+    else:
+        records = (line for line in lines if line.strip())
+
+    start = 0
+    while True:
+        records_chunk = list(itertools.islice(records, chunk_size))
+        if not records_chunk:
+            return
+        yield start, records_chunk, file_format, lines.bytes_read
+        start += len(records_chunk)
+
+
+def parse_chunk(chunk: tuple) -> tuple:
+    """Validate a chunk of `read_chunks`, in a worker process.
+
+    Returns the `insert_products` rows, the (record number, message)
+    errors of the invalid records and the bytes read up to the chunk.
+    """
+    start, records, file_format, bytes_read = chunk
+    schema = ProductPutSchema()
+    products = []
+    errors = []
+    for number, record in enumerate(records, start + 1):
+        try:
+            if file_format == "csv":
+                data = csv_record(record)
+            else:
+                data = json.loads(record)
+            products.append(product_row(schema.load(data)))
+        except (ValueError, ValidationError) as error:
+            errors.append((number, str(error)))
+    return products, errors, bytes_read
+
+
+def parse_chunks(chunks, workers: int):
+    """Yield the parsed `chunks` in order, parsed by `workers` processes.
+
+    At most two chunks per worker are in flight, so a file is never read
+    faster than it is inserted."""
+    if workers <= 1:
+        yield from map(parse_chunk, chunks)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(parse_chunk, (chunk,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def load_products(marketplace: str, file, file_format: str, workers: int = 1,
+                  chunk_size: int = CHUNK_SIZE, progress=None) -> dict:
+    """Load the products of an NDJSON or CSV binary `file`, committing
+    each chunk. `progress` is called with the bytes read by each chunk."""
+    result = {"created": 0, "repeated": 0, "invalid": 0, "errors": []}
+    bytes_done = 0
+    for products, errors, bytes_read in parse_chunks(
+            read_chunks(file, file_format, chunk_size), workers):
+        if products:
+            created, repeated = insert_products(marketplace, products)
+            db.session.commit()
+            result["created"] += created
+            result["repeated"] += repeated
+        result["invalid"] += len(errors)
+        result["errors"].extend(
+            errors[:MAX_ERRORS - len(result["errors"])])
+        if progress:
+            progress(bytes_read - bytes_done)
+        bytes_done = bytes_read
+    return result
+
+
+def purge_filter(marketplace: str, brands=(), asins=(), price_below=None,
+                 price_above=None, unpriced: bool = False) -> list:
+    """Return the clauses of the products of `marketplace` to purge."""
+    clauses = [ProductModel.marketplace == marketplace]
+    if brands:
+        clauses.append(ProductModel.brand.in_(brands))
+    if asins:
+        clauses.append(ProductModel.asin.in_(asins))
+    if price_below is not None:
+        clauses.append(ProductModel.price < price_below)
+    if price_above is not None:
+        clauses.append(ProductModel.price > price_above)
+    if unpriced:
+        # Price 0 marks the products without an offer.
+        clauses.append(or_(
+            ProductModel.price.is_(None), ProductModel.price == 0))
+    return clauses
+
+
+def count_products(clauses: list) -> int:
+    return db.session.execute(
+        db.select(db.func.count(ProductModel.id)).filter(*clauses)).scalar()
+
+
+def purge_products(marketplace: str, clauses: list,
+                   batch_size: int = BATCH_SIZE, progress=None) -> int:
+    """Delete the products matching `clauses` with their images, one
+    batch per transaction, and record the deletions in the change feed.
+    The variant groups left without products are deleted, the images
+    are left to `delete_orphan_images`."""
+    deleted = 0
+    while True:
+        rows = db.session.execute(
+            db.select(ProductModel.id, ProductModel.asin,
+                      ProductModel.variant_group_id)
+            .filter(*clauses)
+            .order_by(ProductModel.id)
+            .limit(batch_size)).all()
+        if not rows:
+            return deleted
+
+        product_ids = [row.id for row in rows]
+        db.session.execute(db.delete(ProductImage).filter(
+            ProductImage.product_id.in_(product_ids)))
+        db.session.execute(db.delete(ProductModel).filter(
+            ProductModel.marketplace == marketplace,
+            ProductModel.id.in_(product_ids)))
+        delete_orphan_groups(
+            db.session, {row.variant_group_id for row in rows} - {None})
+        record_changes(
+            db.session, marketplace, [row.asin for row in rows], "delete")
+        db.session.commit()
+
+        deleted += len(rows)
+        if progress:
+            progress(len(rows))
+
+
+def stored_payload(product: ProductModel) -> dict:
+    """Return the PUT payload that leaves `product` as it is stored."""
+    data = {
+        column: getattr(product, column)
+        for column in ProductModel.__table__.columns.keys()
+        if column not in ProductModel.INTERNAL_COLUMNS
+    }
+    data["images"] = [{"url": image.url} for image in product.images]
+    data["twister"] = [
+        {"type": member.type, "name": member.name, "asin": member.asin}
+        for member in product.variant_members]
+    return data
+
+
+def recompute_content_hashes(marketplace: str, batch_size: int = BATCH_SIZE,
+                             progress=None) -> int:
+    """Recompute the content hashes of `marketplace` from the stored
+    products, one batch per transaction. Returns the hashes changed."""
+    changed = 0
+    last_id = 0
+    while True:
+        products = db.session.execute(
+            db.select(ProductModel)
+            .filter(ProductModel.marketplace == marketplace,
+                    ProductModel.id > last_id)
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+            .options(selectinload(ProductModel.images),
+                     selectinload(ProductModel.variant_members))
+        ).scalars().all()
+        if not products:
+            return changed
+
+        hashes = []
+        for product in products:
+            content_hash = ProductModel.hash_for(stored_payload(product))
+            if content_hash != product.content_hash:
+                hashes.append({"id": product.id, "content_hash": content_hash})
+        last_id = products[-1].id
+        if hashes:
+            db.session.execute(db.update(ProductModel), hashes)
+        db.session.commit()
+
+        changed += len(hashes)
+        if progress:
+            progress(len(products))
+
+
+def recompute_primary_images(marketplace: str, batch_size: int = BATCH_SIZE,
+                             progress=None) -> int:
+    """Reset the primary image URLs of `marketplace` to the URL of the
+    first image, one batch of ids per transaction. Returns the URLs
+    changed."""
+    first_image = (
+        db.select(Image.url)
+        .join(ProductImage, ProductImage.image_id == Image.id)
+        .where(ProductImage.product_id == ProductModel.id,
+               ProductImage.position == 0)
+        .scalar_subquery())
+    changed = 0
+    last_id = 0
+    while True:
+        product_ids = db.session.execute(
+            db.select(ProductModel.id)
+            .filter(ProductModel.marketplace == marketplace,
+                    ProductModel.id > last_id)
+            .order_by(ProductModel.id)
+            .limit(batch_size)).scalars().all()
+        if not product_ids:
+            return changed
+
+        changed += db.session.execute(
+            db.update(ProductModel)
+            .where(ProductModel.marketplace == marketplace,
+                   ProductModel.id.between(product_ids[0], product_ids[-1]),
+                   ProductModel.primary_image_url.is_distinct_from(
+                       first_image))
+            .values(primary_image_url=first_image)
+            .execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+
+        last_id = product_ids[-1]
+        if progress:
+            progress(len(product_ids))
+
+
+def delete_all_orphan_groups() -> int:
+    """Delete the variant groups no product points to."""
+    group_ids = db.session.execute(
+        db.select(VariantGroup.id).filter(
+            ~db.select(ProductModel.id)
+            .filter(ProductModel.variant_group_id == VariantGroup.id)
+            .exists())).scalars().all()
+    delete_orphan_groups(db.session, group_ids)
+    db.session.commit()
+    return len(group_ids)
+
+
+def delete_orphan_images() -> int:
+    """Delete the images no product shows anymore.
+
+    A write that reuses one of them at the same time fails on its
+    foreign key, run it while the catalog is not written."""
+    deleted = db.session.execute(db.delete(Image).filter(
+        ~db.select(ProductImage.image_id)
+        .filter(ProductImage.image_id == Image.id)
+        .exists())).rowcount
+    db.session.commit()
+    return deleted
+
+
+def reindex_tables(tables=REINDEX_TABLES, progress=None) -> None:
+    """Rebuild the indexes of `tables` and refresh their statistics.
+
+    On Postgres the indexes are rebuilt concurrently, outside of a
+    transaction, so the writes go on during the rebuild."""
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT") as connection:
+            for table in tables:
+                connection.execute(text(f"REINDEX TABLE CONCURRENTLY {table}"))
+                connection.execute(text(f"ANALYZE {table}"))
+                if progress:
+                    progress(table)
+        return
+
+    for table in tables:
+        db.session.execute(text(f"REINDEX {table}"))
+        db.session.execute(text(f"ANALYZE {table}"))
+        if progress:
+            progress(table)
+    db.session.commit()
@@ -0,0 +1,30 @@
+"""Changes Utilities
+This module provides the notifier of the change feed. Commits that
+write to the change log wake up the long-polling requests of this
+process; the requests also poll the database, for the changes written
+by other processes.
+"""
+
+import threading
+
+
+class ChangeNotifier:
+    """Wakes up the waiting requests when changes are committed."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.generation = 0
+
+    def notify(self) -> None:
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation: int, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a commit after `generation`."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.generation != generation, timeout)
+
+
+change_notifier = ChangeNotifier()
@@ -0,0 +1,259 @@
+"""Columnar Utilities
+This module exports the catalog of a marketplace to Arrow IPC or
+Parquet and imports it back, in batches, so a catalog can be moved
+between environments without paging through the JSON endpoints.
+
+Each product is one row, with its images and twister as list columns,
+so a file does not depend on the ids of the database it came from.
+The export reads the products with a server-side cursor (`yield_per`)
+and writes one record batch (one Parquet row group) per batch: the
+memory used does not grow with the catalog. The import inserts each
+batch with the bulk insert path of the catalog utilities, bypassing
+the ORM unit of work, and commits it before reading the next one.
+
+A file is checked before its first batch is inserted: it must be a
+Parquet file or an Arrow stream with every column of SCHEMA, of a type
+that casts to the one of SCHEMA. Each batch is checked for the missing
+required values and the strings longer than their column before it is
+inserted, so an invalid batch stops the import after the batches
+committed before it, and raises a ValueError.
+"""
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+import pyarrow.parquet
+
+from ..extensions import db
+from ..models.product import (
+    Image, ProductModel, ProductImage, VariantGroupMember)
+from .catalog import PRODUCT_COLUMNS, insert_products
+
+FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+BATCH_SIZE = 5000
+
+REQUIRED_COLUMNS = ("asin", "url", "title")
+
+SCHEMA = pa.schema([
+    ("asin", pa.string()),
+    ("price", pa.float64()),
+    ("url", pa.string()),
+    ("title", pa.string()),
+    ("brand", pa.string()),
+    ("model", pa.string()),
+    ("saving_percentage", pa.int32()),
+    ("basis_price", pa.float64()),
+    ("custumers_opinion", pa.string()),
+    ("ranking", pa.int64()),
+    ("content_hash", pa.string()),
+    ("images", pa.list_(pa.string())),
+    ("twister", pa.list_(pa.struct([
+        ("type", pa.string()),
+        ("name", pa.string()),
+        ("asin", pa.string()),
+    ]))),
+])
+
+
+
+def string_lengths(model) -> dict:
+    """Return the lengths of the sized string columns of `model`."""
+    return {
+        column.name: column.type.length
+        for column in model.__table__.columns
+        if isinstance(column.type, db.String) and column.type.length
+    }
+
+
+# (column, twister field or None, label) -> length of its database column.
+MAX_LENGTHS = {
+    **{(name, None, name): length
+       for name, length in string_lengths(ProductModel).items()
+       if name in SCHEMA.names},
+    ("images", None, "image url"): string_lengths(Image)["url"],
+    **{("twister", name, f"twister {name}"):
+       string_lengths(VariantGroupMember)[name]
+       for name in ("type", "name", "asin")},
+}
+
+
+def export_batches(marketplace: str, batch_size: int = BATCH_SIZE):
+    """Yield the products of `marketplace` as Arrow record batches."""
+    rows = db.session.execute(
+        db.select(
+            ProductModel.id, ProductModel.variant_group_id,
+            *[getattr(ProductModel, column) for column in PRODUCT_COLUMNS])
+        .filter(ProductModel.marketplace == marketplace)
+        .order_by(ProductModel.id)
+        .execution_options(yield_per=batch_size))
+
+    for batch in rows.partitions():
+        product_ids = [row.id for row in batch]
+        group_ids = {row.variant_group_id for row in batch} - {None}
+
+        images = {}
+        for product_id, url in db.session.execute(
+                db.select(ProductImage.product_id, Image.url)
+                .join(Image, ProductImage.image_id == Image.id)
+                .filter(ProductImage.product_id.in_(product_ids))
+                .order_by(ProductImage.product_id, ProductImage.position)):
+            images.setdefault(product_id, []).append(url)
+
+        members = {}
+        for member in db.session.execute(
+                db.select(
+                    VariantGroupMember.group_id, VariantGroupMember.type,
+                    VariantGroupMember.name, VariantGroupMember.asin)
+                .filter(VariantGroupMember.group_id.in_(group_ids))
+                .order_by(VariantGroupMember.group_id,
+                          VariantGroupMember.position)):
+            members.setdefault(member.group_id, []).append(
+                {"type": member.type, "name": member.name,
+                 "asin": member.asin})
+
+        columns = {
+            column: [getattr(row, column) for row in batch]
+            for column in PRODUCT_COLUMNS
+        }
+        columns["images"] = [images.get(row.id, []) for row in batch]
+        columns["twister"] = [
+            members.get(row.variant_group_id, []) for row in batch]
+        yield pa.RecordBatch.from_pydict(columns, schema=SCHEMA)
+
+
+class ChunkSink:
+    """Write-only file collecting the bytes written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def write_stream(batches, file_format: str):
+    """Encode record batches as a Parquet or Arrow IPC file, yielding
+    the bytes of each batch as soon as it is written."""
+    sink = ChunkSink()
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(
+            sink, SCHEMA, compression="zstd")
+        write = writer.write_batch
+    else:
+        writer = pyarrow.ipc.new_stream(
+            sink, SCHEMA, options=pyarrow.ipc.IpcWriteOptions(
+                compression="zstd"))
+        write = writer.write_batch
+
+    for batch in batches:
+        write(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def read_batches(source, file_format: str, batch_size: int = BATCH_SIZE):
+    """Yield the record batches of a Parquet file (seekable) or of an
+    Arrow IPC stream, cast to SCHEMA.
+
+    Raises a ValueError, before the first batch, when the file is not
+    of the format or misses columns of SCHEMA."""
+    try:
+        if file_format == "parquet":
+            reader = pyarrow.parquet.ParquetFile(source)
+            check_schema(reader.schema_arrow)
+            batches = reader.iter_batches(
+                batch_size=batch_size, columns=SCHEMA.names)
+        else:
+            reader = pyarrow.ipc.open_stream(source)
+            check_schema(reader.schema)
+            batches = reader
+        for batch in batches:
+            yield batch.select(SCHEMA.names).cast(SCHEMA)
+    except (pa.ArrowInvalid, pa.ArrowTypeError,
+            pa.ArrowNotImplementedError) as error:
+        raise ValueError(f"Invalid {file_format} file: {error}") from error
+
+
+def check_schema(schema: pa.Schema) -> None:
+    """Raise a ValueError when `schema` misses columns of SCHEMA."""
+    missing = [name for name in SCHEMA.names if name not in schema.names]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}.")
+
+
+def check_batch(batch: pa.RecordBatch, offset: int) -> None:
+    """Raise a ValueError when a row of `batch` misses a required value
+    or has a string longer than its database column, with its index in
+    the file (`offset` is the one of the batch)."""
+    for name in REQUIRED_COLUMNS:
+        column = batch.column(name)
+        if column.null_count:
+            row = offset + column.is_null().index(True).as_py()
+            raise ValueError(f"Row {row}: the {name} is missing.")
+
+    for (name, field, label), max_length in MAX_LENGTHS.items():
+        values = batch.column(name)
+        parents = None
+        if pa.types.is_list(values.type):
+            parents = pc.list_parent_indices(values)
+            values = pc.list_flatten(values)
+        if field is not None:
+            values = pc.struct_field(values, field)
+        too_long = pc.greater(pc.utf8_length(values), max_length)
+        if pc.any(too_long).as_py():
+            index = too_long.index(True).as_py()
+            if parents is not None:
+                index = parents[index].as_py()
+            raise ValueError(
+                f"Row {offset + index}: the {label} is longer than "
+                f"{max_length} characters.")
+
+
+def import_batches(marketplace: str, batches) -> dict:
+    """Insert the products of `batches` into `marketplace`, committing
+    each batch. Products whose ASIN already exists are skipped.
+
+    The ValueError of an invalid batch says how many products the
+    batches before it created."""
+    created = repeated = rows = 0
+    try:
+        for batch in batches:
+            check_batch(batch, rows)
+            batch_created, batch_repeated = insert_products(
+                marketplace, batch.to_pylist())
+            db.session.commit()
+            created += batch_created
+            repeated += batch_repeated
+            rows += batch.num_rows
+    except ValueError as error:
+        db.session.rollback()
+        if rows:
+            raise ValueError(
+                f"{error} The {rows} rows before it were imported, "
+                f"{created} products created.") from error
+        raise
+    return {"created": created, "repeated": repeated}
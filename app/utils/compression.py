@@ -0,0 +1,218 @@
+"""Compression Utilities
+This module provides the negotiated response compression (zstd, brotli
+and gzip). Small bodies are sent as they are, large or streamed bodies
+are compressed chunk by chunk, and the compressed bodies are kept in an
+LRU cache keyed by the digest of the plain body, so a repeated response
+is not compressed twice. It is not a response cache: the view still
+runs and serializes the body for each request, the cache only saves
+the compression of a body already sent. The strong ETags of the
+compressed responses are made weak, since the bytes sent are not the
+ones they validate.
+"""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Flask, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/html",
+    "text/css",
+    "text/plain",
+}
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def available_encodings() -> list:
+    """Return the supported encodings, preferred first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(accept_encoding: str, encodings: list):
+    """Return the encoding of `encodings` to use for `accept_encoding`.
+
+    The client q-values rank the encodings, the order of `encodings`
+    breaks the ties. Returns None when no encoding is acceptable.
+    """
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, levels: dict) -> bytes:
+    """Compress `body` in one shot."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=levels["zstd"]).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=levels["br"])
+    return gzip.compress(body, compresslevel=levels["gzip"], mtime=0)
+
+
+def compress_stream(chunks, encoding: str, levels: dict):
+    """Compress an iterable of chunks, yielding the compressed chunks."""
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(
+            level=levels["zstd"]).compressobj()
+        process, finish = compressor.compress, compressor.flush
+    elif encoding == "br":
+        compressor = brotli.Compressor(quality=levels["br"])
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(levels["gzip"], zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressedBodyCache:
+    """Thread safe LRU of compressed bodies keyed by the plain body."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(body: bytes, encoding: str) -> tuple:
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, body: bytes, encoding: str):
+        key = self.key(body, encoding)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+            return compressed
+
+    def set(self, body: bytes, encoding: str, compressed: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[self.key(body, encoding)] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class Compressor:
+    """Compresses the responses of an app according to its config."""
+
+    def __init__(self, app: Flask):
+        self.min_size = app.config["COMPRESS_MIN_SIZE"]
+        self.stream_size = app.config["COMPRESS_STREAM_SIZE"]
+        self.levels = app.config["COMPRESS_LEVELS"]
+        self.encodings = [
+            encoding for encoding in app.config["COMPRESS_ALGORITHMS"]
+            if encoding in available_encodings()
+        ]
+        self.cache = CompressedBodyCache(app.config["COMPRESS_CACHE_SIZE"])
+
+    def compress_body(self, body: bytes, encoding: str) -> bytes:
+        """Compress a body, reusing the cached result when there is one."""
+        compressed = self.cache.get(body, encoding)
+        if compressed is None:
+            compressed = compress(body, encoding, self.levels)
+            self.cache.set(body, encoding, compressed)
+        return compressed
+
+    def stream_body(self, body: bytes, encoding: str):
+        """Compress a large body as a stream of chunks."""
+        chunks = (body[start:start + STREAM_CHUNK_SIZE]
+                  for start in range(0, len(body), STREAM_CHUNK_SIZE))
+        return compress_stream(chunks, encoding, self.levels)
+
+    def after_request(self, response):
+        """Compress the response if the client accepts it."""
+        if (response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or request.method == "HEAD"
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or "Content-Encoding" in response.headers):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(
+            request.headers.get("Accept-Encoding"), self.encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(
+                response.response, encoding, self.levels)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            if len(body) >= self.stream_size:
+                response.response = self.stream_body(body, encoding)
+                response.headers.pop("Content-Length", None)
+            else:
+                response.set_data(self.compress_body(body, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        # A strong ETag validates the bytes of the plain body only.
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(tag, weak=True)
+        return response
+
+
+def init_compression(app: Flask) -> Compressor:
+    """Register the response compression on `app`."""
+    app.config.setdefault("COMPRESS_ALGORITHMS", ["zstd", "br", "gzip"])
+    app.config.setdefault("COMPRESS_LEVELS", {"zstd": 3, "br": 4, "gzip": 6})
+    app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+    app.config.setdefault("COMPRESS_STREAM_SIZE", 1024 * 1024)
+    app.config.setdefault("COMPRESS_CACHE_SIZE", 256)
+
+    compressor = Compressor(app)
+    app.extensions["compressor"] = compressor
+    app.after_request(compressor.after_request)
+    return compressor
@@ -0,0 +1,80 @@
+"""Concurrency Utilities
+This module provides the optimistic concurrency control of the product
+updates: every product has a version, bumped by each update, and an
+update applies only if the version is still the one it was based on.
+Each claim writes the change of the product to the change feed, so
+an update the product row does not show (its images, its variant
+group) is recorded too.
+
+The version is claimed with a compare-and-swap: a single UPDATE
+bumping the version of the products whose (id, version) is still the
+loaded one, returning the ids it matched. There is no SELECT ... FOR
+UPDATE: a concurrent claim of the same product waits for the row to be
+committed, then no longer matches and reports a conflict, so parallel
+batches overlapping on a few ASINs only lose those ASINs, never an
+update nor the whole request.
+"""
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..extensions import db
+from ..models.change import record_changes
+from ..models.product import ProductModel
+
+
+def etag(version: int) -> str:
+    """Return the (strong) ETag of a product version.
+
+    The compressed responses send it weak, W/"<version>"."""
+    return f'"{version}"'
+
+
+def etag_versions(header: str):
+    """Return the versions listed by an If-Match or If-None-Match
+    header, or None when the header is missing or `*`.
+
+    Weak ETags are compared like strong ones, as a compressed response
+    sends the ETag of its version weak, and ETags which are not a
+    version match none.
+    """
+    if not header or header.strip() == "*":
+        return None
+    versions = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag.isdigit():
+            versions.add(int(tag))
+    return versions
+
+
+def claim_products(marketplace: str, products: list) -> list:
+    """Bump the version of `products` where it is still the loaded
+    one, and return the products claimed, in order.
+
+    The others were updated by a concurrent request since they were
+    loaded: they are left as they are, for the caller to report. The
+    changes of the products claimed are recorded.
+    """
+    if not products:
+        return []
+    claimed = set(db.session.execute(
+        db.update(ProductModel)
+        .where(ProductModel.marketplace == marketplace,
+               db.tuple_(ProductModel.id, ProductModel.version).in_(
+                   [(product.id, product.version) for product in products]))
+        .values(version=ProductModel.version + 1)
+        .returning(ProductModel.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+
+    result = []
+    for product in products:
+        if product.id in claimed:
+            set_committed_value(product, "version", product.version + 1)
+            result.append(product)
+    record_changes(db.session, marketplace, [
+        product.asin for product in result], "upsert")
+    return result
@@ -0,0 +1,143 @@
+"""Signing Keys Utilities
+This module provides the asymmetric signing of the JWTs (RS256 or
+EdDSA). The keys are PEM files named `<kid>.pem` in `JWT_KEYS_DIR`:
+the active key signs the new tokens and every key of the directory
+verifies them, so a key is rotated by adding the new one, making it
+active, and deleting the old one once its tokens have expired. The
+public keys are published as a JWKS, for other services to verify the
+tokens locally.
+
+The keys are parsed once and kept by kid, so verifying a token does
+not load a PEM.
+"""
+
+import datetime
+import os
+import secrets
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+ALGORITHMS = ("RS256", "EdDSA")
+
+
+def generate_private_key(algorithm: str):
+    """Return a new private key for `algorithm`."""
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unsupported signing algorithm {algorithm!r}.")
+
+
+def new_kid() -> str:
+    """Return a kid that sorts after the ones created before it."""
+    return f"{datetime.date.today():%Y%m%d}-{secrets.token_hex(4)}"
+
+
+class KeySet:
+    """Private keys by kid, the active one signing the tokens."""
+
+    def __init__(self, algorithm: str, private_keys: dict, active_kid: str = None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported signing algorithm {algorithm!r}.")
+        if not private_keys:
+            raise ValueError("The key set has no keys.")
+        self.algorithm = algorithm
+        self.active_kid = active_kid or max(private_keys)
+        if self.active_kid not in private_keys:
+            raise ValueError(f"No key with the kid {self.active_kid!r}.")
+        self.signing_key = private_keys[self.active_kid]
+        self.public_keys = {
+            kid: key.public_key() for kid, key in private_keys.items()}
+        self._jwks = None
+
+    @classmethod
+    def from_directory(cls, algorithm: str, path: str, active_kid: str = None):
+        """Load the `<kid>.pem` private keys of `path`."""
+        private_keys = {}
+        for name in os.listdir(path):
+            kid, extension = os.path.splitext(name)
+            if extension != ".pem":
+                continue
+            with open(os.path.join(path, name), "rb") as key_file:
+                private_keys[kid] = serialization.load_pem_private_key(
+                    key_file.read(), password=None)
+        return cls(algorithm, private_keys, active_kid)
+
+    @classmethod
+    def generate(cls, algorithm: str):
+        """Return a key set with one new key, not persisted."""
+        return cls(algorithm, {new_kid(): generate_private_key(algorithm)})
+
+    def verification_key(self, kid: str):
+        """Return the public key of `kid`, or None."""
+        return self.public_keys.get(kid)
+
+    def jwks(self) -> dict:
+        """Return the public keys as a JWK set."""
+        if self._jwks is None:
+            to_jwk = (RSAAlgorithm if self.algorithm == "RS256"
+                      else OKPAlgorithm).to_jwk
+            self._jwks = {"keys": [
+                {**to_jwk(key, as_dict=True),
+                 "kid": kid, "alg": self.algorithm, "use": "sig"}
+                for kid, key in sorted(self.public_keys.items())
+            ]}
+        return self._jwks
+
+
+def write_private_key(key, path: str) -> None:
+    """Write a private key as an unencrypted PKCS8 PEM file."""
+    with open(path, "wb") as key_file:
+        key_file.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()))
+    os.chmod(path, 0o600)
+
+
+def init_signing_keys(app: Flask, jwt_manager: JWTManager):
+    """Sign the tokens of `app` with its key set, for RS256 or EdDSA.
+
+    Without `JWT_KEYS_DIR`, a key is generated at startup (development
+    only, its tokens do not survive a restart). Returns the key set, or
+    None for the HMAC algorithms.
+    """
+    algorithm = app.config["JWT_ALGORITHM"]
+    if algorithm.startswith("HS"):
+        return None
+
+    if app.config.get("JWT_KEYS_DIR"):
+        key_set = KeySet.from_directory(
+            algorithm, app.config["JWT_KEYS_DIR"],
+            app.config.get("JWT_ACTIVE_KID"))
+    else:
+        app.logger.warning(
+            "JWT_KEYS_DIR is not set, signing with a temporary %s key.",
+            algorithm)
+        key_set = KeySet.generate(algorithm)
+
+    app.extensions["jwt_keys"] = key_set
+    app.config["JWT_DECODE_ALGORITHMS"] = [algorithm]
+
+    @jwt_manager.encode_key_loader
+    def encode_key(identity):
+        return key_set.signing_key
+
+    @jwt_manager.additional_headers_loader
+    def kid_header(identity):
+        return {"kid": key_set.active_kid}
+
+    @jwt_manager.decode_key_loader
+    def decode_key(jwt_header, jwt_data):
+        key = key_set.verification_key(jwt_header.get("kid"))
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key.")
+        return key
+
+    return key_set
@@ -0,0 +1,75 @@
+"""Marketplaces Utilities
+This module provides the marketplaces (sources) of the catalog. Every
+product route and query is scoped to the marketplace of its URL, so on
+Postgres, where the products table is partitioned by marketplace, each
+request reads a single partition, and on SQLite it reads one range of
+the (marketplace, ...) indexes.
+"""
+
+import re
+
+from flask import Flask, current_app
+from flask_smorest import abort
+from sqlalchemy import text
+
+from ..models.product import DEFAULT_MARKETPLACE
+
+MARKETPLACE_PATTERN = re.compile(r"[a-z][a-z0-9_]{0,19}")
+
+DEFAULT_PARTITION = "products_default"
+
+
+def parse_marketplaces(value: str) -> list:
+    """Parse a comma separated list of marketplace names."""
+    marketplaces = [name.strip() for name in value.split(",") if name.strip()]
+    for name in marketplaces:
+        if not MARKETPLACE_PATTERN.fullmatch(name):
+            raise ValueError(f"Invalid marketplace name: {name!r}.")
+    return marketplaces
+
+
+def check_marketplace(marketplace: str) -> str:
+    """Abort with a 404 unless `marketplace` is configured."""
+    if marketplace not in current_app.config["MARKETPLACES"]:
+        abort(404, message="Marketplace not found.")
+    return marketplace
+
+
+def partition_name(marketplace: str) -> str:
+    return f"products_{marketplace}"
+
+
+def create_partition(connection, marketplace: str) -> bool:
+    """Create the Postgres partition of `marketplace` if it is missing.
+
+    Its products are moved out of the default partition in the same
+    transaction. Returns whether the partition was created.
+    """
+    if not MARKETPLACE_PATTERN.fullmatch(marketplace):
+        raise ValueError(f"Invalid marketplace name: {marketplace!r}.")
+    name = partition_name(marketplace)
+    exists = connection.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    ).scalar()
+    if exists:
+        return False
+
+    connection.execute(text(
+        f"CREATE TABLE {name} (LIKE products INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE marketplace = :marketplace RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"),
+        {"marketplace": marketplace})
+    connection.execute(text(
+        f"ALTER TABLE products ATTACH PARTITION {name} "
+        f"FOR VALUES IN ('{marketplace}')"))
+    return True
+
+
+def init_marketplaces(app: Flask) -> None:
+    """Parse the MARKETPLACES of `app`, given as a list or a string."""
+    app.config.setdefault("MARKETPLACES", [DEFAULT_MARKETPLACE])
+    if isinstance(app.config["MARKETPLACES"], str):
+        app.config["MARKETPLACES"] = parse_marketplaces(
+            app.config["MARKETPLACES"])
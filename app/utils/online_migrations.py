@@ -0,0 +1,290 @@
+"""Online Migrations Utilities
+This module runs the migrations that cannot hold a lock on a large
+table for their whole length: index builds (CREATE INDEX CONCURRENTLY
+on Postgres, partition by partition on a partitioned table) and
+backfills in keyset-ordered batches.
+
+The revisions enqueue them with the `op.create_index_concurrently` and
+`op.backfill` operations, which only store the operation in the
+`online_migrations` table, in the Alembic transaction. Once that
+transaction is committed, `migrations/env.py` runs the pending
+operations, each with its own short transactions. A backfill commits
+a checkpoint with every batch, so an interrupted run resumes from its
+last batch on the next `flask db upgrade`.
+
+    def upgrade():
+        op.add_column("products", sa.Column("currency", sa.String(3)))
+        op.backfill(
+            "0007_products_currency", "products", {"currency": "'MXN'"},
+            where="currency IS NULL")
+"""
+
+import datetime
+import logging
+import time
+
+import sqlalchemy as sa
+from alembic.operations import MigrateOperation, Operations
+
+from ..models.migration import OnlineMigrationModel
+
+logger = logging.getLogger("alembic.online")
+
+online_migrations = OnlineMigrationModel.__table__
+
+
+def now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class ConcurrentIndex:
+    """Builds an index without blocking the writes on Postgres."""
+
+    def __init__(self, name: str, index_name: str, table: str,
+                 columns: list, unique: bool = False, where: str = None):
+        self.name = name
+        self.index_name = index_name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.where = where
+
+    def index(self, dialect: str, index_name: str = None,
+              table: str = None) -> sa.Index:
+        table = sa.Table(
+            table or self.table, sa.MetaData(),
+            *[sa.Column(column) for column in self.columns])
+        where = sa.text(self.where) if self.where else None
+        return sa.Index(
+            index_name or self.index_name,
+            *[table.c[column] for column in self.columns],
+            unique=self.unique,
+            postgresql_concurrently=dialect == "postgresql",
+            postgresql_where=where, sqlite_where=where)
+
+    def run(self, engine: sa.Engine, checkpoint) -> None:
+        with engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT") as connection:
+            dialect = connection.dialect.name
+            if dialect != "postgresql":
+                connection.execute(sa.schema.CreateIndex(
+                    self.index(dialect), if_not_exists=True))
+                return
+
+            partitioned = connection.execute(sa.text(
+                "SELECT relkind = 'p' FROM pg_class "
+                "WHERE oid = to_regclass(:table)"),
+                {"table": self.table}).scalar()
+            if not partitioned:
+                self.build_concurrently(connection, self.index_name, self.table)
+                return
+
+            # A partitioned table cannot be indexed concurrently: build the
+            # index of each partition concurrently, then attach it to an
+            # index created on the parent table alone.
+            columns = ", ".join(f'"{column}"' for column in self.columns)
+            where = f" WHERE {self.where}" if self.where else ""
+            connection.execute(sa.text(
+                f'CREATE {"UNIQUE " if self.unique else ""}INDEX IF NOT EXISTS '
+                f'"{self.index_name}" ON ONLY "{self.table}" ({columns}){where}'))
+            # The partitions with an index attached already are skipped: a
+            # rerun, or an index created on the whole table since it was
+            # queued (revision 0007 rebuilds products partitioned, with the
+            # brand index queued by 0006).
+            partitions = connection.execute(sa.text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table) "
+                "AND NOT EXISTS ("
+                "SELECT 1 FROM pg_inherits a "
+                "JOIN pg_index x ON x.indexrelid = a.inhrelid "
+                "WHERE a.inhparent = to_regclass(:index) "
+                "AND x.indrelid = c.oid) "
+                "ORDER BY c.relname"),
+                {"table": self.table,
+                 "index": f'"{self.index_name}"'}).scalars().all()
+            for partition in partitions:
+                index_name = f"{self.index_name}_{partition}"[:63]
+                self.build_concurrently(connection, index_name, partition)
+                connection.execute(sa.text(
+                    f'ALTER INDEX "{self.index_name}" '
+                    f'ATTACH PARTITION "{index_name}"'))
+
+    def build_concurrently(self, connection, index_name: str, table: str):
+        """Build an index of a Postgres table with CREATE INDEX CONCURRENTLY."""
+        # An interrupted concurrent build leaves an invalid index.
+        valid = connection.execute(sa.text(
+            "SELECT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name"),
+            {"name": index_name}).scalar()
+        if valid is False:
+            connection.execute(sa.text(
+                f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+        connection.execute(sa.schema.CreateIndex(
+            self.index("postgresql", index_name, table), if_not_exists=True))
+
+
+class Backfill:
+    """Updates a table in batches of `batch_size` rows, in `key` order.
+
+    `values` maps the columns to SQL expressions. `where` selects the
+    rows still to update, so a batch run twice changes nothing. Each
+    batch is a transaction of its own, followed by a `pause` in seconds
+    so the replicas and the other writers keep up.
+    """
+
+    def __init__(self, name: str, table: str, values: dict, where: str = None,
+                 key: str = "id", batch_size: int = 1000, pause: float = 0.05):
+        self.name = name
+        self.table = sa.table(
+            table, sa.column(key), *[sa.column(column) for column in values])
+        self.values = {column: sa.text(expression)
+                       for column, expression in values.items()}
+        self.where = sa.text(where) if where is not None else sa.true()
+        self.key = self.table.c[key]
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def run(self, engine: sa.Engine, checkpoint) -> None:
+        last_key = checkpoint.last_key
+        while True:
+            with engine.begin() as connection:
+                keys = sa.select(self.key).where(self.where)
+                if last_key is not None:
+                    keys = keys.where(self.key > last_key)
+                batch = connection.execute(
+                    keys.order_by(self.key).limit(self.batch_size)
+                ).scalars().all()
+                if not batch:
+                    return
+
+                update = sa.update(self.table).values(self.values).where(
+                    self.where, self.key <= batch[-1])
+                if last_key is not None:
+                    update = update.where(self.key > last_key)
+                rows = connection.execute(update).rowcount
+
+                last_key = batch[-1]
+                checkpoint.save(connection, last_key, rows)
+
+            logger.info("%s: %s rows, up to %s=%s.",
+                        self.name, checkpoint.rows, self.key.name, last_key)
+            if self.pause:
+                time.sleep(self.pause)
+
+
+OPERATIONS = {"concurrent_index": ConcurrentIndex, "backfill": Backfill}
+
+
+class Checkpoint:
+    """Progress of an operation, in its online_migrations row."""
+
+    def __init__(self, engine: sa.Engine, name: str, last_key, rows: int):
+        self.engine = engine
+        self.name = name
+        self.last_key = last_key
+        self.rows = rows
+
+    def save(self, connection, last_key, rows: int) -> None:
+        """Save the progress in the transaction of the batch."""
+        self.last_key = last_key
+        self.rows += rows
+        connection.execute(
+            online_migrations.update()
+            .where(online_migrations.c.name == self.name)
+            .values(last_key=last_key, rows=self.rows, updated_at=now()))
+
+    def done(self) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(
+                online_migrations.update()
+                .where(online_migrations.c.name == self.name)
+                .values(status="done", updated_at=now()))
+
+
+def run_pending(engine: sa.Engine) -> int:
+    """Run the pending operations in name order, returns how many ran.
+
+    The names start with the revision, so they run in revision order."""
+    if not sa.inspect(engine).has_table(online_migrations.name):
+        return 0
+
+    with engine.connect() as connection:
+        pending = connection.execute(
+            sa.select(online_migrations)
+            .where(online_migrations.c.status == "pending")
+            .order_by(online_migrations.c.name)
+        ).all()
+
+    for row in pending:
+        logger.info("Running online migration %s.", row.name)
+        params = dict(row.operation)
+        operation = OPERATIONS[params.pop("kind")](row.name, **params)
+        checkpoint = Checkpoint(engine, row.name, row.last_key, row.rows)
+        operation.run(engine, checkpoint)
+        checkpoint.done()
+    return len(pending)
+
+
+class OnlineMigrationOp(MigrateOperation):
+    """Alembic operation storing an online migration to run."""
+
+    kind = None
+
+    def __init__(self, name: str, **params):
+        self.name = name
+        self.params = params
+
+
+@Operations.register_operation("create_index_concurrently")
+class CreateIndexConcurrentlyOp(OnlineMigrationOp):
+    kind = "concurrent_index"
+
+    @classmethod
+    def create_index_concurrently(cls, operations, name, index_name, table,
+                                  columns, unique=False, where=None):
+        """Build an index after the migration, without locking writes."""
+        return operations.invoke(cls(
+            name, index_name=index_name, table=table, columns=columns,
+            unique=unique, where=where))
+
+
+@Operations.register_operation("backfill")
+class BackfillOp(OnlineMigrationOp):
+    kind = "backfill"
+
+    @classmethod
+    def backfill(cls, operations, name, table, values, where=None,
+                 key="id", batch_size=1000, pause=0.05):
+        """Update a table after the migration, in resumable batches."""
+        return operations.invoke(cls(
+            name, table=table, values=values, where=where, key=key,
+            batch_size=batch_size, pause=pause))
+
+
+@Operations.register_operation("drop_online_migration")
+class DropOnlineMigrationOp(MigrateOperation):
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @classmethod
+    def drop_online_migration(cls, operations, name):
+        """Forget an online migration, from a `downgrade()`."""
+        return operations.invoke(cls(name))
+
+
+@Operations.implementation_for(CreateIndexConcurrentlyOp)
+@Operations.implementation_for(BackfillOp)
+def enqueue_online_migration(operations, operation):
+    operations.execute(online_migrations.insert().values(
+        name=operation.name,
+        operation={"kind": operation.kind, **operation.params},
+        status="pending", rows=0, updated_at=now()))
+
+
+@Operations.implementation_for(DropOnlineMigrationOp)
+def drop_online_migration(operations, operation):
+    operations.execute(online_migrations.delete().where(
+        online_migrations.c.name == operation.name))
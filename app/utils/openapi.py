@@ -0,0 +1,116 @@
+"""OpenAPI Utilities
+This module provides an Api subclass that defers the OpenAPI spec
+generation until the spec is first used, and that can serve the
+spec from a JSON file written by `flask openapi write`.
+
+The spec file is served only while it documents the views the app
+registers, the same operations (path and method) under the same
+API_VERSION; otherwise it is ignored, with a warning, and the spec is
+built. A change of the schemas alone is not seen: write the file in
+the build step of the release, or bump API_VERSION.
+"""
+
+import json
+import os
+import re
+
+import flask
+from flask_smorest import Api
+
+# Werkzeug rule arguments, <converter:name> or <name>.
+RULE_ARGUMENT = re.compile(r"<(?:[^<>:]+:)?([^<>]+)>")
+
+
+class LazyApi(Api):
+    """Api that registers the blueprint views right away but
+    documents them only when the spec is needed."""
+
+    def __init__(self, app=None, *, spec_kwargs=None, config_prefix=""):
+        self._pending_docs = []
+        self._spec = None
+        self._spec_dict = None
+        super().__init__(
+            app, spec_kwargs=spec_kwargs, config_prefix=config_prefix)
+
+    @property
+    def spec(self):
+        """The APISpec, completed with every queued blueprint."""
+        while self._pending_docs:
+            blp, blp_name, parameters = self._pending_docs.pop(0)
+            blp.register_views_in_doc(
+                self,
+                self._app,
+                self._spec,
+                name=blp_name,
+                parameters=parameters,
+            )
+            self._spec.tag({"name": blp_name, "description": blp.description})
+        return self._spec
+
+    @spec.setter
+    def spec(self, value):
+        self._spec = value
+
+    def register_blueprint(self, blp, *, parameters=None, **options):
+        """Register the blueprint in the app and queue its documentation."""
+        if not self.config.get("OPENAPI_LAZY", False):
+            return super().register_blueprint(
+                blp, parameters=parameters, **options)
+
+        blp_name = options.get("name", blp.name)
+        self._app.extensions["flask-smorest"]["blp_name_to_api"][blp_name] = self
+        self._app.register_blueprint(blp, **options)
+        self._pending_docs.append((blp, blp_name, parameters))
+
+    def spec_dict(self) -> dict:
+        """Return the spec as a dict, read from the cache file if it is
+        still the spec of the app."""
+        if self._spec_dict is None:
+            cache_path = self.config.get("OPENAPI_CACHE_PATH")
+            if cache_path and os.path.exists(cache_path):
+                with open(cache_path, encoding="utf-8") as cache_file:
+                    cached = json.load(cache_file)
+                if self.is_current(cached):
+                    self._spec_dict = cached
+                else:
+                    self._app.logger.warning(
+                        "%s does not document the current views, "
+                        "building the OpenAPI spec.", cache_path)
+            if self._spec_dict is None:
+                self._spec_dict = self.spec.to_dict()
+        return self._spec_dict
+
+    def is_current(self, spec: dict) -> bool:
+        """Whether `spec` has the API_VERSION and the operations of the
+        views registered by this Api."""
+        if spec.get("info", {}).get("version") != self.config.get(
+                "API_VERSION"):
+            return False
+        documented = {
+            (path, method)
+            for path, item in spec.get("paths", {}).items()
+            for method in item if method != "parameters"
+        }
+        return documented == self.operations()
+
+    def operations(self) -> set:
+        """Return the (path, method) of the views of the blueprints
+        registered by this Api, as the spec writes them."""
+        blp_names = {
+            name for name, api in
+            self._app.extensions["flask-smorest"]["blp_name_to_api"].items()
+            if api is self
+        }
+        return {
+            (RULE_ARGUMENT.sub(r"{\1}", rule.rule), method.lower())
+            for rule in self._app.url_map.iter_rules()
+            if rule.endpoint.partition(".")[0] in blp_names
+            for method in rule.methods - {"HEAD", "OPTIONS"}
+        }
+
+    def _openapi_json(self):
+        """Serve JSON spec file"""
+        return flask.current_app.response_class(
+            flask.json.dumps(self.spec_dict(), indent=2, sort_keys=False),
+            mimetype="application/json",
+        )
@@ -0,0 +1,190 @@
+"""Prices Utilities
+This module applies the price-only updates of the products with one
+set-based statement instead of the ORM unit of work:
+
+    UPDATE products SET price = v.price, ..., version = version + 1
+    FROM unnest(:ids, :versions, :prices, ...) AS v (id, version, ...)
+    WHERE products.id = v.id AND products.version = v.version
+    RETURNING products.id
+
+The products and their versions are read first, by ASIN, and only the
+products whose prices differ are written. The version read is the
+compare-and-swap of the update (see utils.concurrency): a product
+updated meanwhile is not returned and is reported as a conflict, and
+the prices read are the ones replaced, for the price drop alerts.
+
+The rows are bound as one array per column on Postgres, and as one
+JSON array read with json_each on SQLite, rather than as a VALUES list:
+the statements have a few parameters whatever the number of rows, so
+they are compiled once and SQLite does not cap the rows of a request.
+
+The compact price endpoint sends (asin, price, basis_price,
+saving_percentage) tuples, validated here in one pass without
+marshmallow.
+"""
+
+import json
+
+from sqlalchemy.dialects import postgresql
+
+from ..extensions import db
+from ..models.change import record_changes
+from ..models.product import ProductModel
+from .alerts import match_price_drops
+
+PRICE_COLUMNS = ("price", "basis_price", "saving_percentage")
+
+MAX_PRICE_ROWS = 100_000
+ASIN_LENGTH = ProductModel.__table__.c.asin.type.length
+NUMBER_TYPES = (int, float)
+
+
+def price_row_error(row):
+    """Return why `row` is not an (asin, price, basis_price,
+    saving_percentage) tuple, or None."""
+    # Exact types: JSON numbers are int or float, and bool is an int.
+    if type(row) is not list or len(row) != 4:
+        return "Not an [asin, price, basis_price, saving_percentage] array."
+    asin, price, basis_price, saving_percentage = row
+    if type(asin) is not str or not 0 < len(asin) <= ASIN_LENGTH:
+        return f"The ASIN must be a string of 1 to {ASIN_LENGTH} characters."
+    for name, value in (("price", price), ("basis_price", basis_price)):
+        if value is not None and (
+                type(value) not in NUMBER_TYPES
+                or not 0 <= value < float("inf")):
+            return f"The {name} must be a positive number or null."
+    if saving_percentage is not None and (
+            type(saving_percentage) is not int
+            or not 0 <= saving_percentage <= 100):
+        return "The saving_percentage must be an integer from 0 to 100 or null."
+    return None
+
+
+def parse_price_rows(payload) -> tuple:
+    """Validate the tuples of the compact price endpoint.
+
+    Returns the (asin, None, price, basis_price, saving_percentage) rows
+    of update_prices and the errors, keyed by the index of the tuple.
+    """
+    if not isinstance(payload, list):
+        return [], {"_schema": ["Not an array of price arrays."]}
+    if len(payload) > MAX_PRICE_ROWS:
+        return [], {"_schema": [f"More than {MAX_PRICE_ROWS} prices."]}
+
+    errors = {}
+    for index, row in enumerate(payload):
+        error = price_row_error(row)
+        if error:
+            errors[index] = [error]
+    if errors:
+        return [], errors
+    return [(asin, None, price, basis_price, saving_percentage)
+            for asin, price, basis_price, saving_percentage in payload], {}
+
+
+def update_prices(marketplace: str, rows: list, columns: tuple) -> dict:
+    """Update `columns` (some of PRICE_COLUMNS) of the products of
+    `marketplace` from `rows`, (asin, version, *values) tuples where the
+    version the update is based on may be None.
+
+    Returns the `updated` and `unchanged` counts and lists the ASINs
+    `to_create` (unknown) and in `conflicts` (of another version). The
+    changes and the price drop alerts are added to the session, to be
+    committed with the update.
+    """
+    products = ProductModel.__table__
+    # The last row of an ASIN wins, like the last key of a JSON object.
+    rows = list({row[0]: row for row in rows}.values())
+    result = {"updated": 0, "unchanged": 0, "to_create": [],
+              "conflicts": []}
+    if not rows:
+        return result
+
+    stored = {
+        row.asin: row for row in db.session.execute(
+            db.select(products.c.asin, products.c.id, products.c.version,
+                      *[products.c[column] for column in columns])
+            .filter(products.c.marketplace == marketplace,
+                    asin_filter([row[0] for row in rows])))
+    }
+
+    changed = {}
+    for asin, version, *values in rows:
+        current = stored.get(asin)
+        if current is None:
+            result["to_create"].append(asin)
+        elif version not in (None, current.version):
+            result["conflicts"].append(asin)
+        elif tuple(values) == tuple(current[3:]):
+            result["unchanged"] += 1
+        else:
+            changed[current.id] = (current, values)
+    if not changed:
+        return result
+
+    source = rows_source(("id", "version", *columns), [
+        (product_id, current.version, *new_values)
+        for product_id, (current, new_values) in changed.items()])
+    clauses = [products.c.id == source.c.id,
+               products.c.version == source.c.version]
+    if db.session.get_bind().dialect.name == "postgresql":
+        # Prunes the other partitions. The ids are of `marketplace`
+        # already, and on SQLite the filter would make the products of
+        # the marketplace the outer loop of the join.
+        clauses.append(products.c.marketplace == marketplace)
+    updated = db.session.execute(
+        db.update(products)
+        .where(*clauses)
+        .values(
+            version=products.c.version + 1,
+            content_hash=None,
+            **{column: db.cast(source.c[column], products.c[column].type)
+               for column in columns})
+        .returning(products.c.id)
+    ).scalars().all()
+
+    # Updated by another request since they were read.
+    for product_id in sorted(set(changed) - set(updated)):
+        result["conflicts"].append(changed.pop(product_id)[0].asin)
+    result["updated"] = len(changed)
+
+    record_changes(db.session, marketplace, [
+        current.asin for current, _ in changed.values()], "upsert")
+    if "price" in columns:
+        index = columns.index("price")
+        match_price_drops({
+            current.asin: (current.price, new_values[index])
+            for current, new_values in changed.values()
+        }, marketplace)
+    return result
+
+
+def asin_filter(asins: list):
+    """Return the filter of the products of `asins`, with one parameter."""
+    column = ProductModel.__table__.c.asin
+    if db.session.get_bind().dialect.name == "postgresql":
+        return column == db.any_(
+            db.bindparam(None, asins, type_=postgresql.ARRAY(column.type)))
+    values = db.func.json_each(json.dumps(asins)).table_valued("value")
+    return column.in_(db.select(values.c.value))
+
+
+def rows_source(names: tuple, rows: list):
+    """Return `rows` as a FROM clause of columns `names` of products,
+    with one parameter per column on Postgres and one in all on SQLite."""
+    products = ProductModel.__table__
+    if db.session.get_bind().dialect.name == "postgresql":
+        return db.func.unnest(*[
+            db.bindparam(
+                None, [row[index] for row in rows],
+                type_=postgresql.ARRAY(products.c[name].type))
+            for index, name in enumerate(names)
+        ]).table_valued(
+            *[db.column(name, products.c[name].type) for name in names]
+        ).render_derived(name="v")
+
+    values = db.func.json_each(json.dumps(rows)).table_valued("value")
+    return db.select(*[
+        db.func.json_extract(values.c.value, f"$[{index}]").label(name)
+        for index, name in enumerate(names)
+    ]).cte("v")
@@ -0,0 +1,73 @@
+"""Query Utilities
+This module builds the product selects shared by the Flask resources
+and the async read endpoints, so both apply the same filters.
+"""
+
+from sqlalchemy import asc, desc, select
+from sqlalchemy.orm import load_only, selectinload
+
+from ..models.product import ProductModel, VariantGroupMember
+
+
+def products_list_select(marketplace: str, products_query: dict):
+    """Build the select of the products listing of `marketplace` from
+    its query args."""
+    min_price = products_query.get("min_price")
+    max_price = products_query.get("max_price")
+    sort_by = products_query.get("sort_by")
+    sort_order = products_query.get("sort_order")
+    brands = products_query.get("brands")
+
+    query = select(ProductModel).filter(
+        ProductModel.marketplace == marketplace, ProductModel.price != 0)
+
+    # Filters
+    if min_price is not None:
+        query = query.filter(ProductModel.price >= min_price)
+    if max_price is not None:
+        query = query.filter(ProductModel.price <= max_price)
+
+    # Brand
+    if brands:
+        query = query.filter(ProductModel.brand.in_(brands))
+
+    # Order
+    if sort_by and hasattr(ProductModel, sort_by):
+        column = getattr(ProductModel, sort_by)
+        if sort_order == "desc":
+            query = query.order_by(desc(column))
+        else:
+            query = query.order_by(asc(column))
+
+    return query
+
+
+def brands_select(marketplace: str):
+    """Build the select of the distinct product brands of `marketplace`."""
+    return select(ProductModel.brand).filter(
+        ProductModel.marketplace == marketplace).distinct()
+
+
+def product_read_options(product_fields=None) -> tuple:
+    """Loader options that fetch what ProductOutputSchema dumps.
+
+    With `product_fields`, only those columns are loaded, and the
+    relationships that are not requested are not loaded at all.
+    """
+    if not product_fields:
+        product_fields = ("images", "twister")
+        options = []
+    else:
+        columns = ProductModel.__table__.columns
+        options = [load_only(*[
+            getattr(ProductModel, name) for name in product_fields
+            if name in columns
+        ] or [ProductModel.id])]
+
+    if "images" in product_fields:
+        options.append(selectinload(ProductModel.images))
+    if "twister" in product_fields:
+        options.append(
+            selectinload(ProductModel.variant_members)
+            .selectinload(VariantGroupMember.variant))
+    return tuple(options)
@@ -0,0 +1,197 @@
+"""Rate Limit Utilities
+This module provides the token-bucket rate limiting of the API. The
+limits are configured per blueprint endpoint in `RATELIMIT_RULES` and
+keyed on the client IP, the JWT identity or the JWT role. Each request
+costs one dict lookup and one bucket update, in process (`memory://`)
+or in Redis (`redis://...`) to share the buckets between workers and
+hosts. Tokens with an exempt role (the admin scraper) are not limited.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from flask import Flask, current_app, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_smorest import abort
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+DEFAULT_RULES = {
+    "products.ProductsList": {"methods": ["GET"], "limit": "120/minute", "burst": 30},
+    "products.ProductOperations": {"methods": ["GET"], "limit": "120/minute", "burst": 30},
+    "products.ProductsLookup": {"methods": ["POST"], "limit": "60/minute", "burst": 10},
+    "users.UserLogin": {"methods": ["POST"], "limit": "10/minute", "burst": 5},
+}
+
+# Set by the ASGI app for the requests it already counted before
+# handing them to Flask.
+already_limited = contextvars.ContextVar("already_limited", default=False)
+
+
+class Rule(NamedTuple):
+    endpoint: str
+    rate: float  # tokens per second
+    burst: int
+    key: str  # "ip", "identity" or "role"
+
+
+def parse_rules(rules: dict) -> dict:
+    """Return the rules keyed by (endpoint, method)."""
+    parsed = {}
+    for endpoint, options in rules.items():
+        count, _, period = options["limit"].partition("/")
+        rule = Rule(
+            endpoint=endpoint,
+            rate=int(count) / PERIODS[period],
+            burst=options.get("burst", int(count)),
+            key=options.get("key", "ip"),
+        )
+        if rule.key not in ("ip", "identity", "role"):
+            raise ValueError(f"Unknown rate limit key {rule.key!r}.")
+        for method in options.get("methods", ["GET"]):
+            parsed[endpoint, method.upper()] = rule
+    return parsed
+
+
+def take_token(tokens: float, updated: float, now: float,
+               rate: float, burst: int) -> tuple:
+    """Refill a bucket and take a token from it.
+
+    Returns the (tokens, wait) of the bucket, `wait` being 0 when a token
+    was taken, else the seconds until the next one."""
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryStore:
+    """Token buckets of this process, the least recently used dropped
+    past `max_keys`. The clock can be replaced in tests."""
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: float, burst: int) -> float:
+        with self._lock:
+            now = self.clock()
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens, wait = take_token(tokens, updated, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class RedisStore:
+    """Token buckets shared in Redis, updated by one script call."""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("The redis package is needed for a redis:// store.")
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key: str, rate: float, burst: int) -> float:
+        return float(self._script(keys=[f"ratelimit:{key}"], args=[rate, burst]))
+
+
+def create_store(url: str):
+    """Return the store of a `memory://` or `redis://` URL."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    if url.startswith("memory://"):
+        return MemoryStore()
+    raise ValueError(f"Unknown rate limit storage {url!r}.")
+
+
+class RateLimiter:
+    """Applies the rate limit rules of an app."""
+
+    def __init__(self, app: Flask):
+        self.rules = parse_rules(app.config["RATELIMIT_RULES"])
+        self.exempt_roles = set(app.config["RATELIMIT_EXEMPT_ROLES"])
+        self.store = create_store(app.config["RATELIMIT_STORAGE_URL"])
+
+    def rule_for(self, endpoint: str, method: str):
+        return self.rules.get((endpoint, method))
+
+    def hit(self, rule: Rule, ip: str, claims) -> float:
+        """Take a token for a request, returns the seconds to wait or 0."""
+        if claims and claims.get("role") in self.exempt_roles:
+            return 0.0
+        if rule.key == "identity" and claims:
+            value = f"user:{claims['sub']}"
+        elif rule.key == "role":
+            value = (claims or {}).get("role") or "anonymous"
+        else:
+            value = ip
+        return self.store.consume(
+            f"{rule.endpoint}:{rule.key}:{value}", rule.rate, rule.burst)
+
+    def before_request(self):
+        """Answer 429 to the requests over their limit."""
+        if not current_app.config["RATELIMIT_ENABLED"] or already_limited.get():
+            return
+        rule = self.rule_for(request.endpoint, request.method)
+        if rule is None:
+            return
+
+        claims = None
+        if "Authorization" in request.headers:
+            try:
+                verify_jwt_in_request(optional=True)
+                claims = get_jwt() or None
+            except Exception:
+                # The view rejects the invalid tokens itself.
+                claims = None
+
+        wait = self.hit(rule, request.remote_addr, claims)
+        if wait:
+            abort(429, message="Too many requests.",
+                  headers={"Retry-After": str(math.ceil(wait))})
+
+
+def init_rate_limit(app: Flask) -> RateLimiter:
+    """Register the rate limiting on `app`."""
+    app.config.setdefault("RATELIMIT_ENABLED", True)
+    app.config.setdefault("RATELIMIT_STORAGE_URL", "memory://")
+    app.config.setdefault("RATELIMIT_RULES", DEFAULT_RULES)
+    app.config.setdefault("RATELIMIT_EXEMPT_ROLES", ["admin"])
+
+    limiter = RateLimiter(app)
+    app.extensions["rate_limiter"] = limiter
+    app.before_request(limiter.before_request)
+    return limiter
@@ -0,0 +1,65 @@
+"""Warm-up Utilities
+This module provides the functions used by the gunicorn hooks to warm
+the app up: `warm_up_master` runs once in the master before forking
+(so the workers share the result copy-on-write) and `warm_up_worker`
+runs in each worker right after the fork.
+"""
+
+import gc
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+
+from ..extensions import db
+from ..models.product import ProductModel, ProductImage
+from ..schemas import (
+    ProductOutputSchema,
+    PaginationProductsSchema,
+    ProductPutSchema,
+)
+
+
+def warm_up_master(app: Flask) -> None:
+    """Configure the mappers and schemas before the workers are forked."""
+    if app.extensions.get("warmed_up"):
+        return
+
+    with app.app_context():
+        configure_mappers()
+
+        # Dump a transient product so the marshmallow fields and hooks
+        # are built once in the master instead of in every worker.
+        product = ProductModel(
+            asin="WARMUP", title="Warm-up", url="https://warm.up", price=1,
+            images=[ProductImage(url="https://warm.up/image.jpg")],
+        )
+        PaginationProductsSchema().dump({"products": [product], "brands": []})
+        ProductOutputSchema().dump(product)
+        ProductPutSchema(many=True)
+
+        # Connections must not be shared across the fork.
+        db.engine.dispose()
+
+    app.extensions["warmed_up"] = True
+
+    # Keep the objects created so far out of the garbage collector,
+    # otherwise its bookkeeping writes break the copy-on-write sharing.
+    gc.freeze()
+
+
+def warm_up_worker(app: Flask) -> None:
+    """Reset the inherited pool and open this worker's own connections."""
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+        connections = []
+        try:
+            for _ in range(app.config.get("DB_WARMUP_CONNECTIONS", 1)):
+                connection = db.engine.connect()
+                connection.execute(text("SELECT 1"))
+                connections.append(connection)
+        finally:
+            # Closing gives the connections back to the pool, still open.
+            for connection in connections:
+                connection.close()
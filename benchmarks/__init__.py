@@ -0,0 +1 @@
+"""benchmarks __init__"""
@@ -0,0 +1,164 @@
+"""
+Load benchmark for the REST API.
+It loads a generated catalog in the given database, runs the
+scenarios through the Flask test client of create_app and compares
+the results with the thresholds stored in thresholds.json.
+
+With --marketplaces N the catalog is loaded once for each of N
+marketplaces, and the scenarios still run on the first one, so the
+results show whether its latency stays flat as sources are added.
+
+Usage: python -m benchmarks.bench_api [--scale 1k|100k|1m]
+           [--db-url URL] [--requests 200] [--scenario NAME ...]
+           [--marketplaces 1]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+from app import create_app, db
+from benchmarks.catalog import (
+    SCALES,
+    BRANDS,
+    ADMIN_EMAIL,
+    ADMIN_PASSWORD,
+    asin_for,
+    create_admin,
+    load_catalog,
+)
+from benchmarks.runner import (
+    run_scenario,
+    load_thresholds,
+    check_thresholds,
+    print_report,
+)
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+MARKETPLACES = ["amazon", "mercadolibre", "walmart", "liverpool"]
+
+BULK_PUT_SIZE = 50
+CRAWL_CHANGED_RATIO = 0.1
+
+
+def put_payload(asin: str, rng: random.Random) -> dict:
+    """Return a scraper PUT payload for `asin`."""
+    return {
+        "asin": asin,
+        "price": round(rng.uniform(5, 2500), 2),
+        "url": f"https://www.amazon.com.mx/dp/{asin}",
+        "title": f"Updated product {asin}",
+        "brand": rng.choice(BRANDS),
+        "images": [{"url": f"https://m.media-amazon.com/{asin}.jpg"}],
+    }
+
+
+def build_scenarios(client, count: int, headers: dict, seed: int = 7) -> dict:
+    """Return the scenarios, as callables doing one request each."""
+    rng = random.Random(seed)
+
+    def list_filtered():
+        min_price = rng.randint(0, 1000)
+        response = client.get("/api/products/amazon", query_string={
+            "min_price": min_price,
+            "max_price": min_price + 500,
+            "brands": rng.sample(BRANDS, 3),
+            "sort_by": "price",
+            "sort_order": "desc",
+            "per_page": 20,
+        })
+        assert response.status_code == 200, response.status_code
+
+    def detail():
+        asin = asin_for(rng.randrange(count))
+        response = client.get(f"/api/product/amazon/{asin}")
+        assert response.status_code == 200, response.status_code
+
+    def bulk_put():
+        payload = []
+        for index in rng.sample(range(count), min(BULK_PUT_SIZE, count)):
+            asin = asin_for(index)
+            payload.append(put_payload(asin, rng))
+        response = client.put(
+            "/api/products/amazon", json=payload, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    crawl = [put_payload(asin_for(index), rng)
+             for index in rng.sample(range(count), min(BULK_PUT_SIZE, count))]
+
+    def crawl_put():
+        # A steady-state crawl: the same batch with a few price changes.
+        for product in rng.sample(
+                crawl, max(1, int(len(crawl) * CRAWL_CHANGED_RATIO))):
+            product["price"] = round(rng.uniform(5, 2500), 2)
+        response = client.put(
+            "/api/products/amazon", json=crawl, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    def login():
+        response = client.post("/api/login", json={
+            "email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        assert response.status_code == 200, response.status_code
+
+    return {
+        "list_filtered": list_filtered,
+        "detail": detail,
+        "bulk_put": bulk_put,
+        "crawl_put": crawl_put,
+        "login": login,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--db-url", default="sqlite://")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--scenario", action="append")
+    parser.add_argument("--marketplaces", type=int, default=1,
+                        choices=range(1, len(MARKETPLACES) + 1))
+    parser.add_argument("--no-load", action="store_true",
+                        help="Reuse the catalog already in the database.")
+    args = parser.parse_args()
+
+    count = SCALES[args.scale]
+    app = create_app(db_url=args.db_url)
+    app.config["RATELIMIT_ENABLED"] = False
+    app.config["MARKETPLACES"] = MARKETPLACES[:args.marketplaces]
+
+    with app.app_context():
+        if not args.no_load:
+            db.drop_all()
+            db.create_all()
+            for marketplace in app.config["MARKETPLACES"]:
+                load_catalog(count, marketplace=marketplace)
+        create_admin()
+
+        client = app.test_client()
+        token = client.post("/api/login", json={
+            "email": ADMIN_EMAIL, "password": ADMIN_PASSWORD,
+        }).json["access_token"]
+        scenarios = build_scenarios(
+            client, count, {"Authorization": f"Bearer {token}"})
+
+        results = {}
+        for name, call in scenarios.items():
+            if args.scenario and name not in args.scenario:
+                continue
+            results[name] = run_scenario(call, args.requests, db.engine)
+
+    print_report(results)
+
+    dialect = args.db_url.split(":", 1)[0].split("+", 1)[0]
+    thresholds = load_thresholds(THRESHOLDS_PATH)
+    failures = check_thresholds(
+        results, thresholds.get(dialect, {}).get(args.scale, {}))
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
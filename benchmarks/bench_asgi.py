@@ -0,0 +1,139 @@
+"""
+Concurrency benchmark of the ASGI read endpoints against gunicorn.
+It loads a catalog in a database file, starts the gunicorn (WSGI)
+and uvicorn (ASGI) servers on it with the same number of workers,
+and measures the throughput of the product reads at increasing
+numbers of concurrent connections.
+
+Usage: python -m benchmarks.bench_asgi [--scale 1k] [--workers 2]
+           [--concurrency 1 16 64] [--duration 10] [--db-url URL]
+"""
+
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+
+from app import create_app, db
+from benchmarks.catalog import SCALES, BRANDS, asin_for, load_catalog
+from benchmarks.runner import percentile
+
+SERVERS = {
+    "gunicorn": ["gunicorn", "--config", "gunicorn.conf.py",
+                 "--bind", "127.0.0.1:{port}", "--workers", "{workers}"],
+    "uvicorn": ["uvicorn", "--factory", "app.asgi:create_asgi_app",
+                "--port", "{port}", "--workers", "{workers}",
+                "--log-level", "warning"],
+}
+
+
+def read_paths(count: int, seed: int = 7):
+    """Yield an endless mix of listing and detail paths."""
+    rng = random.Random(seed)
+    while True:
+        if rng.random() < 0.5:
+            brands = "&".join(f"brands={brand}"
+                              for brand in rng.sample(BRANDS, 3))
+            yield f"/api/products/amazon?{brands}&sort_by=price&per_page=20"
+        else:
+            yield f"/api/product/amazon/{asin_for(rng.randrange(count))}"
+
+
+def wait_for(port: int, timeout: float = 30) -> None:
+    """Wait until the server on `port` answers."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            connection.request("GET", "/api/products/amazon?per_page=1")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server on port {port} did not start.")
+
+
+def load(port: int, count: int, concurrency: int, duration: float) -> dict:
+    """Keep `concurrency` connections busy for `duration` seconds."""
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def client(seed):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        paths = read_paths(count, seed)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            connection.request("GET", next(paths))
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                errors.append(response.status)
+
+    threads = [threading.Thread(target=client, args=(seed,))
+               for seed in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--db-url")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5100)
+    args = parser.parse_args()
+
+    count = SCALES[args.scale]
+    db_url = args.db_url or f"sqlite:///{tempfile.mkdtemp()}/bench_asgi.db"
+
+    app = create_app(db_url=db_url)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        load_catalog(count)
+        db.engine.dispose()
+
+    # The servers are measured without the rate limits of the clients.
+    env = {"JWT_SECRET": "bench-secret", **os.environ,
+           "DATABASE_URL": db_url, "APP_ENV": "production",
+           "RATELIMIT_ENABLED": "false"}
+    print(f"{'server':>10}{'connections':>13}{'rps':>10}"
+          f"{'p50_ms':>10}{'p99_ms':>10}{'errors':>8}")
+    for offset, (name, command) in enumerate(SERVERS.items()):
+        port = args.port + offset
+        server = subprocess.Popen(
+            [part.format(port=port, workers=args.workers) for part in command],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for(port)
+            for concurrency in args.concurrency:
+                result = load(port, count, concurrency, args.duration)
+                print(f"{name:>10}{concurrency:>13}{result['rps']:>10}"
+                      f"{result['p50_ms']:>10}{result['p99_ms']:>10}"
+                      f"{result['errors']:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
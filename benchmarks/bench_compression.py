@@ -0,0 +1,66 @@
+"""
+Benchmark of the response compression.
+It requests the products listing at several page sizes with each
+encoding and reports the body size, the server latency with a cold
+and a warm compressed-body cache, and the time to send the body over
+a link of the given bandwidth. The warm cache only skips the
+compression (it is keyed by the digest of the plain body), the queries
+and the serialization of each request are still measured.
+
+Usage: python -m benchmarks.bench_compression [--scale 1k]
+           [--requests 100] [--mbps 10]
+"""
+
+import argparse
+
+from app import create_app, db
+from benchmarks.catalog import SCALES, load_catalog
+from benchmarks.runner import run_scenario
+
+ENCODINGS = ["identity", "gzip", "br", "zstd"]
+PAGE_SIZES = [10, 50, 100]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--db-url", default="sqlite://")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--mbps", type=float, default=10)
+    args = parser.parse_args()
+
+    app = create_app(db_url=args.db_url)
+    app.config["RATELIMIT_ENABLED"] = False
+    cache = app.extensions["compressor"].cache
+    client = app.test_client()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        load_catalog(SCALES[args.scale])
+
+    print(f"{'per_page':>9}{'encoding':>10}{'bytes':>10}{'cold_p50':>10}"
+          f"{'warm_p50':>10}{'send_ms':>10}")
+    for per_page in PAGE_SIZES:
+        path = f"/api/products/amazon?per_page={per_page}"
+        for encoding in ENCODINGS:
+            headers = {"Accept-Encoding": encoding}
+            size = len(client.get(path, headers=headers).data)
+
+            def cold():
+                cache._entries.clear()
+                client.get(path, headers=headers)
+
+            def warm():
+                client.get(path, headers=headers)
+
+            cold_result = run_scenario(cold, args.requests)
+            warm_result = run_scenario(warm, args.requests)
+            send_ms = size * 8 / (args.mbps * 1_000_000) * 1000
+            print(f"{per_page:>9}{encoding:>10}{size:>10}"
+                  f"{cold_result['p50_ms']:>10}{warm_result['p50_ms']:>10}"
+                  f"{send_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of the JWT signing and verification.
+For each algorithm it creates and decodes access tokens through the
+app. For the asymmetric ones it also compares the bare signature
+verification with the cached key object and with the public key
+parsed from its PEM on every token, as without the verification-key
+cache.
+
+Usage: python -m benchmarks.bench_jwt [--tokens 2000]
+"""
+
+import argparse
+import os
+import time
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from flask_jwt_extended import create_access_token, decode_token
+
+from app import create_app
+
+ALGORITHMS = ["HS256", "RS256", "EdDSA"]
+
+
+def per_second(call, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        call()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'algorithm':>10}{'sign/s':>10}{'verify/s':>10}"
+          f"{'key_verify/s':>14}{'pem_verify/s':>14}")
+    for algorithm in ALGORITHMS:
+        with mock.patch.dict(os.environ, {"JWT_ALGORITHM": algorithm}):
+            app = create_app(db_url="sqlite://")
+
+        with app.app_context():
+            token = create_access_token(identity="1")
+            sign = per_second(
+                lambda: create_access_token(identity="1"), args.tokens)
+            verify = per_second(lambda: decode_token(token), args.tokens)
+
+            key_verify = pem_verify = ""
+            key_set = app.extensions.get("jwt_keys")
+            if key_set:
+                key = key_set.verification_key(key_set.active_kid)
+                pem = key.public_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PublicFormat.SubjectPublicKeyInfo)
+                key_verify = per_second(lambda: jwt.decode(
+                    token, key, algorithms=[algorithm]), args.tokens)
+                pem_verify = per_second(lambda: jwt.decode(
+                    token, serialization.load_pem_public_key(pem),
+                    algorithms=[algorithm]), args.tokens)
+                key_verify, pem_verify = f"{key_verify:.0f}", f"{pem_verify:.0f}"
+
+        print(f"{algorithm:>10}{sign:>10.0f}{verify:>10.0f}"
+              f"{key_verify:>14}{pem_verify:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of the compact price updates.
+It loads a generated catalog and sends batches of new prices for
+`--rows` of its products to `PUT /api/products/<marketplace>/prices`,
+every price changed so every row is written, through the Flask test
+client of create_app. With --compare the same batches are sent as
+price-only payloads of the bulk PATCH, validated by marshmallow.
+
+The results are checked against the "prices" thresholds of
+thresholds.json for the database.
+
+Usage: python -m benchmarks.bench_prices [--rows 50000] [--requests 5]
+           [--db-url URL] [--compare] [--no-load]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+
+from app import create_app, db
+from benchmarks.catalog import (
+    ADMIN_EMAIL,
+    ADMIN_PASSWORD,
+    asin_for,
+    create_admin,
+    load_catalog,
+)
+from benchmarks.runner import (
+    run_scenario,
+    load_thresholds,
+    check_thresholds,
+    print_report,
+)
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+
+def build_scenarios(client, rows: int, headers: dict, seed: int = 7) -> dict:
+    """Return the scenarios, as callables sending one batch each.
+
+    The batches alternate between two sets of prices, so every batch
+    changes every price, and are encoded beforehand: the time measured
+    is the time of the server."""
+    rng = random.Random(seed)
+    asins = [asin_for(index) for index in range(rows)]
+    batches = []
+    for low, high in ((5, 1000), (1000, 2500)):
+        prices = [
+            [asin, round(rng.uniform(low, high), 2),
+             round(rng.uniform(2500, 3000), 2), rng.randint(0, 60)]
+            for asin in asins]
+        batches.append((
+            json.dumps(prices),
+            json.dumps([
+                {"asin": asin, "price": price, "basis_price": basis_price,
+                 "saving_percentage": saving_percentage}
+                for asin, price, basis_price, saving_percentage in prices])))
+    calls = itertools.count()
+
+    def send(method, path, body):
+        response = client.open(
+            path, method=method, data=body, headers=headers,
+            content_type="application/json")
+        assert response.status_code == 200, response.status_code
+        assert response.json["updated"] == rows, response.json["updated"]
+
+    def compact():
+        body, _ = batches[next(calls) % 2]
+        send("PUT", "/api/products/amazon/prices", body)
+
+    def patch():
+        _, body = batches[next(calls) % 2]
+        send("PATCH", "/api/products/amazon", body)
+
+    return {"prices": compact, "patch_prices": patch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--db-url", default="sqlite://")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also send the batches to the bulk PATCH.")
+    parser.add_argument("--no-load", action="store_true",
+                        help="Reuse the catalog already in the database.")
+    args = parser.parse_args()
+
+    app = create_app(db_url=args.db_url)
+    app.config["RATELIMIT_ENABLED"] = False
+
+    with app.app_context():
+        if not args.no_load:
+            db.drop_all()
+            db.create_all()
+            load_catalog(args.rows)
+        create_admin()
+
+        client = app.test_client()
+        token = client.post("/api/login", json={
+            "email": ADMIN_EMAIL, "password": ADMIN_PASSWORD,
+        }).json["access_token"]
+        scenarios = build_scenarios(
+            client, args.rows, {"Authorization": f"Bearer {token}"})
+
+        results = {}
+        for name, call in scenarios.items():
+            if name == "patch_prices" and not args.compare:
+                continue
+            results[name] = run_scenario(
+                call, args.requests, db.engine, warmup=1)
+
+    print_report(results)
+    for name, result in results.items():
+        print(f"{name}: {args.rows / result['mean_ms'] * 1000:,.0f} "
+              "price updates per second")
+
+    dialect = args.db_url.split(":", 1)[0].split("+", 1)[0]
+    thresholds = load_thresholds(THRESHOLDS_PATH)
+    failures = check_thresholds(
+        results, thresholds.get(dialect, {}).get("prices", {}))
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
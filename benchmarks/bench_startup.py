@@ -0,0 +1,63 @@
+"""
+Benchmark for the app startup.
+It measures, in fresh interpreters, the time to import the
+app package and the time spent in create_app for the
+development and production startup modes.
+
+Usage: python -m benchmarks.bench_startup [--runs 10] [--db-url URL]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(db_url={db_url!r})
+booted = time.perf_counter()
+with app.test_client() as client:
+    client.get("/openapi.json")
+spec = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "boot_ms": (booted - imported) * 1000,
+    "first_spec_ms": (spec - booted) * 1000,
+}}))
+"""
+
+
+def measure(mode: str, db_url: str, runs: int) -> dict:
+    """Run the probe `runs` times and return the median timings."""
+    env = {"JWT_SECRET": "bench-secret", **os.environ, "APP_ENV": mode}
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(db_url=db_url)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+
+    return {
+        key: round(statistics.median(sample[key] for sample in samples), 2)
+        for key in samples[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--db-url", default="sqlite://")
+    args = parser.parse_args()
+
+    for mode in ("development", "production"):
+        print(mode, measure(mode, args.db_url, args.runs))
+
+
+if __name__ == "__main__":
+    main()
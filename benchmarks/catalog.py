@@ -0,0 +1,211 @@
+"""
+Catalog generator for the benchmarks.
+It builds a deterministic catalog of products with images and
+variant groups and loads it with bulk inserts.
+"""
+
+import datetime
+import random
+
+from sqlalchemy import func, insert, select, text
+
+from app.extensions import db
+from app.models.product import (
+    DEFAULT_MARKETPLACE, Image, ProductModel, ProductImage, VariantGroup,
+    VariantGroupMember)
+from app.models.user import RoleModel, UserModel
+from passlib.hash import pbkdf2_sha256
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+BRANDS = [
+    "Acer", "Apple", "Asus", "Dell", "HP", "Huawei", "Lenovo", "LG",
+    "Logitech", "Microsoft", "Motorola", "MSI", "Nokia", "OnePlus",
+    "Razer", "Samsung", "Sony", "TCL", "Xiaomi", "Realme",
+]
+COLORS = [
+    "Black", "White", "Silver", "Blue", "Red", "Green", "Gold",
+    "Pink", "Purple", "Graphite", "Midnight", "Starlight",
+]
+SIZES = ["64 GB", "128 GB", "256 GB", "512 GB", "1 TB"]
+
+ADMIN_EMAIL = "bench_admin@mail.com"
+ADMIN_PASSWORD = "bench123"
+
+CHUNK_SIZE = 5_000
+
+
+def asin_for(index: int) -> str:
+    """Return the ASIN of the product at `index`."""
+    return f"B{index:09d}"
+
+
+def generate_products(count: int, seed: int = 42,
+                      marketplace: str = DEFAULT_MARKETPLACE):
+    """Yield (product, links, images, group, members) rows for `count`
+    products.
+
+    Products are grouped in families of 1 to 6 variants. The products of
+    a family share one variant group with a member for each of them, and
+    their images but the last one, of the variant; the group, members
+    and shared images come with the first product of the family.
+    The ids of each table start at 1.
+    """
+    rng = random.Random(seed)
+    index = 0
+    image_id = 0
+    group_id = 0
+    member_id = 0
+
+    while index < count:
+        family = range(index, min(index + rng.randint(1, 6), count))
+        brand = rng.choice(BRANDS)
+        model = f"{brand} {rng.randint(1, 99)}"
+        base_price = round(rng.uniform(5, 2500), 2)
+        variants = [
+            (rng.choice(("color_name", "size_name")),
+             rng.choice(COLORS if rng.random() < 0.5 else SIZES))
+            for _ in family
+        ]
+
+        family_images = []
+        for number in range(rng.randint(2, 6)):
+            image_id += 1
+            url = ("https://m.media-amazon.com/images/I/"
+                   f"{marketplace}/{asin_for(index)}-{number}._AC_SL1500_.jpg")
+            family_images.append(
+                {"id": image_id, "url_hash": Image.hash_for(url), "url": url})
+
+        group = None
+        members = []
+        if len(family) > 1:
+            group_id += 1
+            rows = [(tw_type, name, asin_for(sibling))
+                    for sibling, (tw_type, name) in zip(family, variants)]
+            group = {
+                "id": group_id, "key": VariantGroup.key_for(marketplace, rows)}
+            for position, (tw_type, name, asin) in enumerate(rows):
+                member_id += 1
+                members.append({
+                    "id": member_id,
+                    "group_id": group_id,
+                    "position": position,
+                    "marketplace": marketplace,
+                    "type": tw_type,
+                    "name": name,
+                    "asin": asin,
+                })
+
+        for position, product_index in enumerate(family):
+            price = round(base_price * rng.uniform(0.8, 1.2), 2)
+            saving = rng.choice((0, 0, 5, 10, 15, 20, 30))
+            product = {
+                "id": product_index + 1,
+                "marketplace": marketplace,
+                "asin": asin_for(product_index),
+                "price": price,
+                "url": f"https://www.amazon.com.mx/dp/{asin_for(product_index)}",
+                "title": f"{model} {variants[position][1]} "
+                         f"{'lorem ipsum ' * rng.randint(2, 10)}".strip(),
+                "brand": brand,
+                "model": model,
+                "saving_percentage": saving,
+                "basis_price": round(price / (1 - saving / 100), 2),
+                "custumers_opinion": f"{rng.randint(1, 5)} de 5 estrellas",
+                "ranking": rng.randint(1, 500_000),
+                "variant_group_id": group["id"] if group else None,
+            }
+
+            image_id += 1
+            url = ("https://m.media-amazon.com/images/I/"
+                   f"{marketplace}/{product['asin']}._AC_SL1500_.jpg")
+            images = [
+                {"id": image_id, "url_hash": Image.hash_for(url), "url": url}]
+            links = [
+                {"product_id": product["id"], "position": number,
+                 "image_id": image["id"]}
+                for number, image in enumerate(family_images + images)]
+            product["primary_image_url"] = family_images[0]["url"]
+
+            if position == 0:
+                yield product, links, family_images + images, group, members
+            else:
+                yield product, links, images, None, []
+
+        index = family.stop
+
+
+def load_catalog(count: int, seed: int = 42,
+                 marketplace: str = DEFAULT_MARKETPLACE) -> None:
+    """Bulk insert a generated catalog. Must run in an app context.
+
+    The ids continue after the rows already loaded, so the catalogs of
+    several marketplaces can be loaded one after the other.
+    """
+    models = (VariantGroup, VariantGroupMember, ProductModel, Image,
+              ProductImage)
+    chunk = ([], [], [], [], [])
+    group_offset, member_offset, product_offset, image_offset = (
+        db.session.scalar(select(func.coalesce(func.max(model.id), 0)))
+        for model in models[:4])
+
+    def shift(group, members, product, links, images):
+        if group:
+            group["id"] += group_offset
+        for member in members:
+            member["id"] += member_offset
+            member["group_id"] += group_offset
+        product["id"] += product_offset
+        if product["variant_group_id"]:
+            product["variant_group_id"] += group_offset
+        for image in images:
+            image["id"] += image_offset
+        for link in links:
+            link["product_id"] += product_offset
+            link["image_id"] += image_offset
+
+    def flush():
+        for model, rows in zip(models, chunk):
+            if rows:
+                db.session.execute(insert(model), rows)
+                rows.clear()
+        db.session.commit()
+
+    for product, links, images, group, members in generate_products(
+            count, seed, marketplace):
+        shift(group, members, product, links, images)
+        if group:
+            chunk[0].append(group)
+        chunk[1].extend(members)
+        chunk[2].append(product)
+        chunk[3].extend(images)
+        chunk[4].extend(links)
+        if len(chunk[2]) >= CHUNK_SIZE:
+            flush()
+    flush()
+
+    if db.engine.dialect.name == "postgresql":
+        for model in models[:4]:
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval('{table}_id_seq', "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+        db.session.commit()
+
+
+def create_admin() -> None:
+    """Create the roles and the admin user used by the scenarios."""
+    if not db.session.get(RoleModel, 1):
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+    if not UserModel.query.filter_by(email=ADMIN_EMAIL).first():
+        db.session.add(UserModel(
+            first_name="Bench", last_name="Admin",
+            birth_date=datetime.date(1990, 1, 1),
+            email=ADMIN_EMAIL,
+            password=pbkdf2_sha256.hash(ADMIN_PASSWORD),
+            role_id=1,
+        ))
+    db.session.commit()
@@ -0,0 +1,105 @@
+"""
+Helpers to time the benchmark scenarios.
+A scenario is a callable doing one request; it is called a number
+of times and its latency, throughput and SQL query count are
+reported and checked against the stored thresholds.
+"""
+
+import json
+import statistics
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(engine):
+    """Count the statements executed on `engine` inside the block."""
+    counter = {"queries": 0}
+
+    def before_cursor_execute(*args, **kwargs):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def percentile(samples: list, percent: float) -> float:
+    """Return the `percent` percentile of the sorted `samples`."""
+    index = min(len(samples) - 1, round(percent / 100 * (len(samples) - 1)))
+    return samples[index]
+
+
+def run_scenario(call, requests: int, engine=None, warmup: int = 5) -> dict:
+    """Call `call` `requests` times and return its statistics."""
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    queries = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        if engine is not None:
+            with count_queries(engine) as counter:
+                start = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - start)
+            queries += counter["queries"]
+        else:
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "queries_per_request": round(queries / requests, 2),
+    }
+
+
+def load_thresholds(path: str) -> dict:
+    """Load the thresholds file, or an empty dict if it does not exist."""
+    try:
+        with open(path, encoding="utf-8") as thresholds_file:
+            return json.load(thresholds_file)
+    except FileNotFoundError:
+        return {}
+
+
+def check_thresholds(results: dict, thresholds: dict) -> list:
+    """Return the list of regressions of `results` against `thresholds`.
+
+    Thresholds are keyed by scenario and accept `min_rps`, `max_p50_ms`,
+    `max_p99_ms` and `max_queries_per_request`.
+    """
+    failures = []
+    for scenario, limits in thresholds.items():
+        result = results.get(scenario)
+        if result is None:
+            continue
+        if "min_rps" in limits and result["rps"] < limits["min_rps"]:
+            failures.append(
+                f"{scenario}: {result['rps']} rps < {limits['min_rps']}")
+        for key in ("p50_ms", "p99_ms", "queries_per_request"):
+            limit = limits.get(f"max_{key}")
+            if limit is not None and result[key] > limit:
+                failures.append(f"{scenario}: {key} {result[key]} > {limit}")
+    return failures
+
+
+def print_report(results: dict) -> None:
+    """Print the results as a table."""
+    header = ("scenario", "rps", "p50_ms", "p99_ms", "queries_per_request")
+    print("".join(f"{column:>22}" for column in header))
+    for scenario, result in results.items():
+        print(f"{scenario:>22}" + "".join(
+            f"{result[column]:>22}" for column in header[1:]))
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration.
+The app is loaded and warmed up once in the master, then each
+worker opens its own database connections after the fork.
+"""
+
+import os
+
+from app.utils.warmup import warm_up_master, warm_up_worker
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# The long polls of GET /api/changes hold a thread for up to 30 s, a
+# sync worker would answer nothing else meanwhile.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+
+
+def when_ready(server):
+    """Runs in the master once the app is loaded, before forking."""
+    warm_up_master(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    """Runs in each worker right after the fork."""
+    warm_up_worker(server.app.wsgi())
@@ -0,0 +1,83 @@
+"""baseline
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+Schema created by `db.create_all()` before the migrations were tracked.
+Stamp existing databases with `flask db stamp 0001`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'roles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('title', sa.Text(), nullable=False),
+        sa.Column('brand', sa.String(length=100), nullable=True),
+        sa.Column('model', sa.String(length=100), nullable=True),
+        sa.Column('saving_percentage', sa.Integer(), nullable=True),
+        sa.Column('basis_price', sa.Float(), nullable=True),
+        sa.Column('custumers_opinion', sa.String(length=50), nullable=True),
+        sa.Column('ranking', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('asin'),
+    )
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=50), nullable=False),
+        sa.Column('birth_date', sa.Date(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('password', sa.String(length=100), nullable=False),
+        sa.Column('role_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['role_id'], ['roles.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'product_images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'twister',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('twister')
+    op.drop_table('product_images')
+    op.drop_table('users')
+    op.drop_table('products')
+    op.drop_table('roles')
@@ -0,0 +1,167 @@
+"""variant groups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 10:00:00.000000
+
+Moves the per-product twister rows into variant groups shared by the
+products with the same variations, then drops the twister table.
+"""
+import hashlib
+import json
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+twister = sa.table(
+    'twister',
+    sa.column('id', sa.Integer),
+    sa.column('type', sa.String),
+    sa.column('name', sa.String),
+    sa.column('asin', sa.String),
+    sa.column('product_id', sa.Integer),
+)
+products = sa.table(
+    'products',
+    sa.column('id', sa.Integer),
+    sa.column('variant_group_id', sa.Integer),
+)
+variant_groups = sa.table(
+    'variant_groups',
+    sa.column('id', sa.Integer),
+    sa.column('key', sa.String),
+)
+variant_group_members = sa.table(
+    'variant_group_members',
+    sa.column('group_id', sa.Integer),
+    sa.column('position', sa.Integer),
+    sa.column('type', sa.String),
+    sa.column('name', sa.String),
+    sa.column('asin', sa.String),
+)
+
+
+def group_key(rows):
+    """Same key as VariantGroup.key_for, frozen for this revision."""
+    payload = json.dumps([list(row) for row in rows], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def upgrade():
+    op.create_table(
+        'variant_groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key'),
+    )
+    op.create_table(
+        'variant_group_members',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['variant_groups.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_variant_group_members_group_id', 'variant_group_members',
+        ['group_id'])
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(
+            sa.Column('variant_group_id', sa.Integer(), nullable=True))
+        batch_op.create_index(
+            'ix_products_variant_group_id', ['variant_group_id'])
+        batch_op.create_foreign_key(
+            'fk_products_variant_group_id', 'variant_groups',
+            ['variant_group_id'], ['id'])
+
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(twister.c.product_id, twister.c.type,
+                  twister.c.name, twister.c.asin)
+        .order_by(twister.c.product_id, twister.c.id)).all()
+
+    group_ids = {}
+    assignments = []
+    for product_id, entries in groupby(rows, key=lambda row: row[0]):
+        entries = [tuple(entry[1:]) for entry in entries]
+        key = group_key(entries)
+        group_id = group_ids.get(key)
+        if group_id is None:
+            group_id = connection.execute(
+                variant_groups.insert().values(key=key)
+                .returning(variant_groups.c.id)).scalar_one()
+            connection.execute(variant_group_members.insert(), [
+                {"group_id": group_id, "position": position,
+                 "type": tw_type, "name": name, "asin": asin}
+                for position, (tw_type, name, asin) in enumerate(entries)
+            ])
+            group_ids[key] = group_id
+        assignments.append({"b_id": product_id, "b_group_id": group_id})
+
+        if len(assignments) >= BATCH_SIZE:
+            assign_groups(connection, assignments)
+    assign_groups(connection, assignments)
+
+    op.drop_table('twister')
+
+
+def assign_groups(connection, assignments):
+    """Point the products of `assignments` to their group and clear it."""
+    if assignments:
+        connection.execute(
+            products.update()
+            .where(products.c.id == sa.bindparam('b_id'))
+            .values(variant_group_id=sa.bindparam('b_group_id')),
+            assignments)
+        assignments.clear()
+
+
+def downgrade():
+    op.create_table(
+        'twister',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute(
+        twister.insert().from_select(
+            ['type', 'name', 'asin', 'product_id'],
+            sa.select(
+                variant_group_members.c.type,
+                variant_group_members.c.name,
+                variant_group_members.c.asin,
+                products.c.id,
+            )
+            .select_from(products.join(
+                variant_group_members,
+                variant_group_members.c.group_id
+                == products.c.variant_group_id))
+            .order_by(products.c.id, variant_group_members.c.position)))
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_constraint(
+            'fk_products_variant_group_id', type_='foreignkey')
+        batch_op.drop_index('ix_products_variant_group_id')
+        batch_op.drop_column('variant_group_id')
+    op.drop_index(
+        'ix_variant_group_members_group_id', 'variant_group_members')
+    op.drop_table('variant_group_members')
+    op.drop_table('variant_groups')
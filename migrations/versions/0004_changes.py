@@ -0,0 +1,32 @@
+"""changes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'changes',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.Column('op', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+
+
+def downgrade():
+    op.drop_table('changes')
@@ -0,0 +1,58 @@
+"""watchlists
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'watches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.Column('target_price', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'asin'),
+    )
+    op.create_index('ix_watches_user_id', 'watches', ['user_id'])
+    op.create_index(
+        'ix_watches_asin_target_price', 'watches', ['asin', 'target_price'])
+    op.create_table(
+        'alert_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('watch_id', sa.Integer(), nullable=True),
+        sa.Column('asin', sa.String(length=20), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('target_price', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(
+            ['watch_id'], ['watches.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_alert_outbox_sent_at', 'alert_outbox', ['sent_at'])
+
+
+def downgrade():
+    op.drop_index('ix_alert_outbox_sent_at', 'alert_outbox')
+    op.drop_table('alert_outbox')
+    op.drop_index('ix_watches_asin_target_price', 'watches')
+    op.drop_index('ix_watches_user_id', 'watches')
+    op.drop_table('watches')
@@ -0,0 +1,38 @@
+"""online migrations, products brand index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'online_migrations',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('operation', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('last_key', sa.BigInteger(), nullable=True),
+        sa.Column('rows', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.create_index_concurrently(
+        '0006_products_brand_index', 'ix_products_brand', 'products',
+        ['brand'])
+
+
+def downgrade():
+    op.drop_index('ix_products_brand', 'products', if_exists=True)
+    op.drop_online_migration('0006_products_brand_index')
+    op.drop_table('online_migrations')
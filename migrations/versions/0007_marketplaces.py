@@ -0,0 +1,255 @@
+"""marketplaces
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00.000000
+
+Adds the marketplace of the products, their variant groups, changes,
+watches and alerts, with 'amazon' for the existing rows. An ASIN is
+unique per marketplace.
+
+On Postgres the products table is rebuilt partitioned by LIST
+(marketplace), with a partition for 'amazon' and a default partition
+(`flask marketplaces partition` adds the others). Its primary key
+becomes (id, marketplace), since the unique keys of a partitioned
+table must include the partition key, so the product_images foreign
+key to products.id is dropped there. Elsewhere the table keeps its
+primary key and gets (marketplace, ...) indexes.
+
+The rebuild copies the whole products table with one INSERT ... SELECT,
+in the transaction of the upgrade, and holds its ACCESS EXCLUSIVE lock
+until the commit: run it in a maintenance window, with the writers
+stopped. The brand index it creates replaces the one queued by 0006,
+which then finds every partition indexed already.
+
+product_images gets the index on product_id it was missing, so
+loading the images of a page does not scan the images of every
+marketplace.
+
+The downgrade deletes the products of the other marketplaces.
+"""
+import hashlib
+import json
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+DEFAULT_MARKETPLACE = 'amazon'
+
+# Names of the unnamed unique constraints of the SQLite tables.
+NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_N_name)s'}
+
+variant_groups = sa.table(
+    'variant_groups',
+    sa.column('id', sa.Integer),
+    sa.column('key', sa.String),
+)
+variant_group_members = sa.table(
+    'variant_group_members',
+    sa.column('group_id', sa.Integer),
+    sa.column('position', sa.Integer),
+    sa.column('type', sa.String),
+    sa.column('name', sa.String),
+    sa.column('asin', sa.String),
+)
+
+
+def group_key(marketplace, rows):
+    """Same key as VariantGroup.key_for, frozen for this revision."""
+    if marketplace is None:  # The key of revision 0002.
+        payload = [list(row) for row in rows]
+    else:
+        payload = [marketplace, [list(row) for row in rows]]
+    payload = json.dumps(payload, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def rekey_variant_groups(marketplace):
+    """Recompute the keys of the variant groups, from their members."""
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(variant_group_members.c.group_id,
+                  variant_group_members.c.type,
+                  variant_group_members.c.name,
+                  variant_group_members.c.asin)
+        .order_by(variant_group_members.c.group_id,
+                  variant_group_members.c.position)).all()
+
+    keys = [
+        {'b_id': group_id,
+         'b_key': group_key(marketplace, [tuple(row[1:]) for row in members])}
+        for group_id, members in groupby(rows, key=lambda row: row[0])
+    ]
+    if keys:
+        connection.execute(
+            variant_groups.update()
+            .where(variant_groups.c.id == sa.bindparam('b_id'))
+            .values(key=sa.bindparam('b_key')),
+            keys)
+
+
+def marketplace_column():
+    return sa.Column(
+        'marketplace', sa.String(length=20), nullable=False,
+        server_default=DEFAULT_MARKETPLACE)
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    for table in ('variant_group_members', 'changes', 'alert_outbox'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(marketplace_column())
+    rekey_variant_groups(DEFAULT_MARKETPLACE)
+
+    op.drop_index('ix_watches_asin_target_price', 'watches')
+    with op.batch_alter_table(
+            'watches', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(marketplace_column())
+        batch_op.drop_constraint(
+            'watches_user_id_asin_key' if postgresql
+            else 'uq_watches_user_id_asin', type_='unique')
+        batch_op.create_unique_constraint(
+            'uq_watches_user_id_marketplace_asin',
+            ['user_id', 'marketplace', 'asin'])
+    op.create_index(
+        'ix_watches_marketplace_asin_target_price', 'watches',
+        ['marketplace', 'asin', 'target_price'])
+    # The images were read with a scan of every marketplace.
+    op.create_index(
+        'ix_product_images_product_id', 'product_images', ['product_id'])
+
+    if postgresql:
+        partition_products()
+        return
+
+    with op.batch_alter_table(
+            'products', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(marketplace_column())
+        batch_op.drop_constraint('uq_products_asin', type_='unique')
+        batch_op.create_unique_constraint(
+            'uq_products_marketplace_asin', ['marketplace', 'asin'])
+        batch_op.create_index(
+            'ix_products_marketplace_price', ['marketplace', 'price'])
+
+
+def partition_products():
+    """Rebuild the Postgres products table partitioned by marketplace."""
+    op.add_column('products', marketplace_column())
+    op.drop_constraint(
+        'product_images_product_id_fkey', 'product_images',
+        type_='foreignkey')
+
+    # The index names are global, free them for the new table.
+    op.execute('ALTER TABLE products RENAME TO products_unpartitioned')
+    op.execute('ALTER TABLE products_unpartitioned '
+               'RENAME CONSTRAINT products_pkey TO products_unpartitioned_pkey')
+    op.execute('DROP INDEX IF EXISTS ix_products_brand')
+    op.execute('DROP INDEX ix_products_variant_group_id')
+
+    op.execute(
+        'CREATE TABLE products ('
+        'LIKE products_unpartitioned INCLUDING DEFAULTS, '
+        'CONSTRAINT products_pkey PRIMARY KEY (id, marketplace), '
+        'UNIQUE (marketplace, asin)'
+        ') PARTITION BY LIST (marketplace)')
+    op.execute(
+        f"CREATE TABLE products_{DEFAULT_MARKETPLACE} PARTITION OF products "
+        f"FOR VALUES IN ('{DEFAULT_MARKETPLACE}')")
+    op.execute('CREATE TABLE products_default PARTITION OF products DEFAULT')
+    op.execute('INSERT INTO products SELECT * FROM products_unpartitioned')
+    op.execute('ALTER SEQUENCE products_id_seq OWNED BY products.id')
+    op.execute('DROP TABLE products_unpartitioned')
+
+    op.create_foreign_key(
+        'fk_products_variant_group_id', 'products', 'variant_groups',
+        ['variant_group_id'], ['id'])
+    op.create_index(
+        'ix_products_variant_group_id', 'products', ['variant_group_id'])
+    op.create_index('ix_products_brand', 'products', ['brand'])
+    op.create_index(
+        'ix_products_marketplace_price', 'products', ['marketplace', 'price'])
+
+
+def unpartition_products():
+    """Rebuild the Postgres products table without partitions."""
+    op.execute('ALTER TABLE products RENAME TO products_partitioned')
+    op.execute('ALTER TABLE products_partitioned '
+               'RENAME CONSTRAINT products_pkey TO products_partitioned_pkey')
+    op.execute('DROP INDEX ix_products_brand')
+    op.execute('DROP INDEX ix_products_variant_group_id')
+    op.execute('DROP INDEX ix_products_marketplace_price')
+
+    op.execute(
+        'CREATE TABLE products ('
+        'LIKE products_partitioned INCLUDING DEFAULTS, '
+        'CONSTRAINT products_pkey PRIMARY KEY (id), '
+        'UNIQUE (asin))')
+    op.execute('INSERT INTO products SELECT * FROM products_partitioned')
+    op.execute('ALTER SEQUENCE products_id_seq OWNED BY products.id')
+    op.execute('DROP TABLE products_partitioned')
+
+    op.drop_column('products', 'marketplace')
+    op.create_foreign_key(
+        'fk_products_variant_group_id', 'products', 'variant_groups',
+        ['variant_group_id'], ['id'])
+    op.create_index(
+        'ix_products_variant_group_id', 'products', ['variant_group_id'])
+    op.create_index('ix_products_brand', 'products', ['brand'])
+    op.create_foreign_key(
+        'product_images_product_id_fkey', 'product_images', 'products',
+        ['product_id'], ['id'])
+
+
+def downgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    other = f"marketplace != '{DEFAULT_MARKETPLACE}'"
+    op.execute(
+        'DELETE FROM product_images WHERE product_id IN '
+        f'(SELECT id FROM products WHERE {other})')
+    op.execute(f'DELETE FROM products WHERE {other}')
+    for table in ('changes', 'watches', 'alert_outbox',
+                  'variant_group_members'):
+        op.execute(f'DELETE FROM {table} WHERE {other}')
+    op.execute(
+        'DELETE FROM variant_groups WHERE id NOT IN '
+        '(SELECT group_id FROM variant_group_members)')
+
+    op.drop_index('ix_product_images_product_id', 'product_images')
+    if postgresql:
+        unpartition_products()
+    else:
+        with op.batch_alter_table(
+                'products', naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_index('ix_products_marketplace_price')
+            batch_op.drop_constraint(
+                'uq_products_marketplace_asin', type_='unique')
+            batch_op.create_unique_constraint('uq_products_asin', ['asin'])
+            batch_op.drop_column('marketplace')
+
+    op.drop_index('ix_watches_marketplace_asin_target_price', 'watches')
+    with op.batch_alter_table(
+            'watches', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(
+            'uq_watches_user_id_marketplace_asin', type_='unique')
+        batch_op.create_unique_constraint(
+            'watches_user_id_asin_key' if postgresql
+            else 'uq_watches_user_id_asin',
+            ['user_id', 'asin'])
+        batch_op.drop_column('marketplace')
+    op.create_index(
+        'ix_watches_asin_target_price', 'watches', ['asin', 'target_price'])
+
+    rekey_variant_groups(None)
+    for table in ('variant_group_members', 'changes', 'alert_outbox'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('marketplace')
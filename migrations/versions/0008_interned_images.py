@@ -0,0 +1,124 @@
+"""interned images
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00.000000
+
+Stores each image URL once, in the images table keyed by the sha256
+digest of the URL, and turns product_images into a (product_id, position,
+image_id) link table. Its primary key covers the image of a position,
+so the first image of a product is an index-only lookup (INCLUDE on
+Postgres, WITHOUT ROWID on SQLite).
+
+The URLs are hashed in Python, in batches of the distinct URLs. On
+Postgres product_images keeps no foreign key to the partitioned
+products table, like after revision 0007.
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+old_product_images = sa.table(
+    'product_images_old',
+    sa.column('url', sa.String),
+)
+images = sa.table(
+    'images',
+    sa.column('url_hash', sa.LargeBinary),
+    sa.column('url', sa.String),
+)
+
+
+def url_hash(url):
+    """Same hash as Image.hash_for, frozen for this revision."""
+    return hashlib.sha256(url.encode()).digest()
+
+
+def product_fk(postgresql):
+    if postgresql:
+        return []
+    return [sa.ForeignKeyConstraint(['product_id'], ['products.id'])]
+
+
+def rename_table(old, new, postgresql):
+    op.rename_table(old, new)
+    if postgresql:
+        op.execute(
+            f'ALTER TABLE {new} RENAME CONSTRAINT {old}_pkey TO {new}_pkey')
+
+
+def upgrade():
+    connection = op.get_bind()
+    postgresql = connection.dialect.name == 'postgresql'
+
+    op.create_table(
+        'images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url_hash', sa.LargeBinary(length=32), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('url_hash'),
+    )
+
+    op.drop_index('ix_product_images_product_id', 'product_images')
+    rename_table('product_images', 'product_images_old', postgresql)
+
+    urls = connection.execution_options(yield_per=BATCH_SIZE).execute(
+        sa.select(old_product_images.c.url).distinct())
+    for batch in urls.partitions():
+        connection.execute(images.insert(), [
+            {'url_hash': url_hash(url), 'url': url} for url, in batch])
+
+    op.create_table(
+        'product_images',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('image_id', sa.Integer(), nullable=False),
+        *product_fk(postgresql),
+        sa.ForeignKeyConstraint(['image_id'], ['images.id']),
+        sa.PrimaryKeyConstraint(
+            'product_id', 'position', postgresql_include=['image_id']),
+        sqlite_with_rowid=False,
+    )
+    op.execute(
+        'INSERT INTO product_images (product_id, position, image_id) '
+        'SELECT old.product_id, '
+        'ROW_NUMBER() OVER (PARTITION BY old.product_id ORDER BY old.id) - 1, '
+        'images.id '
+        'FROM product_images_old AS old '
+        'JOIN images ON images.url = old.url')
+    op.drop_table('product_images_old')
+
+
+def downgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    rename_table('product_images', 'product_image_links', postgresql)
+    op.create_table(
+        'product_images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        *product_fk(postgresql),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_product_images_product_id', 'product_images', ['product_id'])
+    op.execute(
+        'INSERT INTO product_images (product_id, url) '
+        'SELECT links.product_id, images.url '
+        'FROM product_image_links AS links '
+        'JOIN images ON images.id = links.image_id '
+        'ORDER BY links.product_id, links.position')
+    op.drop_table('product_image_links')
+    op.drop_table('images')
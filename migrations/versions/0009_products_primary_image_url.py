@@ -0,0 +1,42 @@
+"""products primary image url
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 17:00:00.000000
+
+Adds the URL of the first image of each product to the products table,
+so the listings and the variant cards do not read product_images. The
+existing products are backfilled after the upgrade, in batches.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+FIRST_IMAGE = (
+    'SELECT images.url FROM product_images '
+    'JOIN images ON images.id = product_images.image_id '
+    'WHERE product_images.product_id = products.id '
+    'AND product_images.position = 0')
+
+
+def upgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(
+            sa.Column('primary_image_url', sa.String(length=500),
+                      nullable=True))
+    op.backfill(
+        '0009_products_primary_image_url', 'products',
+        {'primary_image_url': f'({FIRST_IMAGE})'},
+        where=f'primary_image_url IS NULL AND EXISTS ({FIRST_IMAGE})')
+
+
+def downgrade():
+    op.drop_online_migration('0009_products_primary_image_url')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('primary_image_url')
@@ -0,0 +1,31 @@
+"""products version
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 18:00:00.000000
+
+Adds the version of the products, bumped by each update for the
+optimistic concurrency control of the PUT endpoints. The existing
+products start at version 1 through the server default.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(
+            sa.Column('version', sa.Integer(), server_default='1',
+                      nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,108 @@
+import numpy as np
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import ProductModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+from app.utils.analytics import compute_analytics
+
+
+class TestAnalytics(BaseTest):
+    """Test case for the catalog analytics."""
+
+    def setUp(self):
+        """Add four products of two brands and an admin token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        for index, (brand, price, basis_price, ranking) in enumerate([
+                ("TEST", 100, 200, 10),
+                ("TEST", 300, None, 5),
+                ("TEST_2", 50, 100, 30),
+                ("TEST_2", 0, None, None)]):
+            db.session.add(ProductModel(
+                asin=f"TESTASIN{index}", url="https://test.com",
+                title=f"Test Product {index}", brand=brand, price=price,
+                basis_price=basis_price, ranking=ranking))
+        db.session.commit()
+        self.app.extensions["analytics_cache"]._results.clear()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+    def test_compute_analytics(self):
+        """Test the statistics computed on the arrays."""
+        result = compute_analytics({
+            "brand": np.array(["B", "A", "A", ""]),
+            "price": np.array([10.0, 20.0, 30.0, np.nan]),
+            "basis_price": np.array([20.0, np.nan, 60.0, 5.0]),
+            "saving_percentage": np.array([50.0, np.nan, 50.0, np.nan]),
+            "ranking": np.array([3.0, 1.0, np.nan, 2.0]),
+        }, bins=2)
+
+        self.assertEqual(result["count"], 4)
+        self.assertEqual(result["price"]["count"], 3)
+        self.assertEqual(result["price"]["percentiles"]["p50"], 20)
+        self.assertEqual(result["price"]["histogram"], {
+            "edges": [10, 20, 30], "counts": [1, 2]})
+        self.assertEqual(result["discount"]["mean"], 50)
+        self.assertEqual(result["ranking"]["min"], 1)
+        self.assertListEqual(result["brands"], [
+            {"brand": "A", "count": 2, "mean_price": 25, "min_price": 20,
+             "max_price": 30, "mean_discount": 50, "best_ranking": 1},
+            {"brand": None, "count": 1, "mean_price": None,
+             "min_price": None, "max_price": None, "mean_discount": None,
+             "best_ranking": 2},
+            {"brand": "B", "count": 1, "mean_price": 10, "min_price": 10,
+             "max_price": 10, "mean_discount": 50, "best_ranking": 3},
+        ])
+
+    def test_get_analytics(self):
+        """Test the analytics endpoint and its cache."""
+        response = self.client.get(
+            "/api/analytics/amazon", query_string={"bins": 5},
+            headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["count"], 4)
+        self.assertEqual(response.json["price"]["mean"], 150)
+        self.assertEqual(sum(response.json["price"]["histogram"]["counts"]), 3)
+        self.assertEqual(
+            [brand["brand"] for brand in response.json["brands"]],
+            ["TEST", "TEST_2"])
+
+        cached = self.client.get(
+            "/api/analytics/amazon", query_string={"bins": 5},
+            headers=self.headers)
+        self.assertEqual(cached.json, response.json)
+
+        self.client.put("/api/products/amazon", json=[{
+            "asin": "TESTASIN1", "url": "https://test.com",
+            "title": "Test Product 1", "brand": "TEST", "price": 200,
+        }], headers=self.headers)
+        updated = self.client.get(
+            "/api/analytics/amazon", query_string={"bins": 5},
+            headers=self.headers)
+
+        self.assertGreater(updated.json["last_seq"], response.json["last_seq"])
+        self.assertEqual(updated.json["price"]["max"], 200)
+
+    def test_get_analytics_without_token(self):
+        """Test the analytics are for the admins only."""
+        response = self.client.get("/api/analytics/amazon")
+
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from app import db
+from app.asgi import create_asgi_app
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+from app.utils.ratelimit import MemoryStore
+
+
+def asgi_get(app, path, query_string="", headers=None):
+    """Do a GET on an ASGI app and return (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "scheme": "http",
+        "http_version": "1.1",
+        "query_string": query_string.encode(),
+        "headers": [
+            (key.lower().encode(), value.encode())
+            for key, value in (headers or {}).items()
+        ],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    response_headers = {
+        name.decode(): value.decode()
+        for name, value in messages[0]["headers"]
+    }
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], response_headers, body
+
+
+class TestAsgi(unittest.TestCase):
+    """Test case for the async read endpoints.
+
+    The async engine cannot see the transaction of BaseTest, so these
+    tests use a committed SQLite file and compare each async response
+    with the one of the Flask app.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Create the apps on a temporary database with two products."""
+        handle, cls.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+
+        cls.asgi = create_asgi_app(db_url=f"sqlite:///{cls.db_path}")
+        cls.client = cls.asgi.flask_app.test_client()
+
+        with cls.asgi.flask_app.app_context():
+            db.create_all()
+            db.session.add_all([
+                RoleModel(id=1, name="admin"),
+                RoleModel(id=2, name="user"),
+            ])
+            db.session.add(UserRegisterSchema().load({
+                "first_name": "Admin_name",
+                "last_name": "Admin_lastname",
+                "birth_date": "1985-05-05",
+                "email": "test_admin@mail.com",
+                "password": "admin123",
+            }))
+            db.session.commit()
+
+        cls.access_token = cls.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }).json["access_token"]
+
+        cls.client.post(
+            "/api/products/amazon",
+            json=[{
+                "asin": "TESTASIN123",
+                "price": 100,
+                "url": "https://test.com",
+                "images": [{"url": "https://test.com/image.jpg"}],
+                "title": "Test Product",
+                "twister": [{
+                    "type": "color_name",
+                    "asin": "TESTASIN1234",
+                    "name": "Test Color"}],
+                "brand": "TEST",
+            }, {
+                "asin": "TESTASIN1234",
+                "url": "https://test.com",
+                "title": "Test Product",
+                "images": [{"url": "https://test.com/image.jpg"}],
+                "price": 1,
+                "brand": "TEST_2"
+            }],
+            headers={"Authorization": f"Bearer {cls.access_token}"})
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary database."""
+        asyncio.run(cls.asgi.engine.dispose())
+        with cls.asgi.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(cls.db_path)
+
+    def get(self, path, query_string="", headers=None):
+        """Do a GET on the ASGI app and return (status, json)."""
+        status, _, body = asgi_get(self.asgi, path, query_string, headers)
+        return status, json.loads(body)
+
+    def assertSameResponse(self, path, query_string="", headers=None):
+        """Assert the ASGI and Flask apps answer `path` the same way."""
+        status, body = self.get(path, query_string, headers)
+        response = self.client.get(
+            path, query_string=query_string, headers=headers)
+
+        self.assertEqual(status, response.status_code)
+        self.assertEqual(body, response.json)
+        return status, body
+
+    def test_get_products(self):
+        """Test the async products listing."""
+        status, body = self.assertSameResponse(
+            "/api/products/amazon",
+            "brands=TEST&brands=TEST_2&sort_by=price&sort_order=desc")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body["total"], 2)
+        self.assertEqual(body["products"][0]["asin"], "TESTASIN123")
+        self.assertIn("twister", body["products"][0])
+
+    def test_get_products_fields(self):
+        """Test the async products listing with a sparse fieldset."""
+        status, body = self.assertSameResponse(
+            "/api/products/amazon", "fields=asin,images&sort_by=price")
+
+        self.assertEqual(status, 200)
+        self.assertListEqual(body["products"], [
+            {"asin": "TESTASIN1234", "images": ["https://test.com/image.jpg"]},
+            {"asin": "TESTASIN123", "images": ["https://test.com/image.jpg"]},
+        ])
+
+    def test_get_products_invalid_query(self):
+        """Test an invalid listing query is answered by Flask."""
+        status, _ = self.assertSameResponse("/api/products/amazon", "page=x")
+
+        self.assertEqual(status, 422)
+
+    def test_get_product(self):
+        """Test the async product detail."""
+        status, _ = self.assertSameResponse("/api/product/amazon/TESTASIN123")
+
+        self.assertEqual(status, 200)
+
+    def test_get_missing_product(self):
+        """Test a missing product is answered by Flask."""
+        status, _ = self.assertSameResponse("/api/product/amazon/MISSING")
+
+        self.assertEqual(status, 404)
+
+    def test_get_brands(self):
+        """Test the async brands listing."""
+        status, _ = self.assertSameResponse(
+            "/api/brands/amazon",
+            headers={"Authorization": f"Bearer {self.access_token}"})
+
+        self.assertEqual(status, 200)
+
+    def test_get_brands_without_token(self):
+        """Test the brands listing without a token is answered by Flask."""
+        status, _ = self.assertSameResponse("/api/brands/amazon")
+
+        self.assertEqual(status, 401)
+
+    def test_rate_limit(self):
+        """Test the async reads share the buckets of the Flask app."""
+        limiter = self.asgi.limiter
+        store = limiter.store
+        limiter.store = MemoryStore(clock=lambda: 0.0)
+        try:
+            burst = limiter.rule_for("products.ProductOperations", "GET").burst
+            for _ in range(burst - 1):
+                status, _ = self.get("/api/product/amazon/TESTASIN123")
+                self.assertEqual(status, 200)
+
+            # Answered by Flask, and counted once.
+            status, _ = self.get("/api/product/amazon/MISSING")
+            self.assertEqual(status, 404)
+
+            status, body = self.get("/api/product/amazon/TESTASIN123")
+        finally:
+            limiter.store = store
+
+        self.assertEqual(status, 429)
+        self.assertEqual(body, {
+            "code": 429,
+            "status": "Too Many Requests",
+            "message": "Too many requests.",
+        })
@@ -0,0 +1,112 @@
+from flask import g
+from flask_jwt_extended import (
+    get_current_user, get_jwt, get_jwt_header, verify_jwt_in_request)
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+from app.utils.auth import VerifiedTokenCache, verify_access_token
+
+# The request context state set by verify_access_token on a cache hit.
+JWT_STATE = {
+    "_jwt_extended_jwt", "_jwt_extended_jwt_header",
+    "_jwt_extended_jwt_location", "_jwt_extended_jwt_user",
+}
+
+
+class TestAuth(BaseTest):
+    """Test case for the verified-token cache of role_filter."""
+
+    def setUp(self):
+        """Set up an admin user and its token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+        self.access_token = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }).json["access_token"]
+        self.headers = {"Authorization": f"Bearer {self.access_token}"}
+        self.cache = self.app.extensions["token_cache"]
+
+    def test_cached_token(self):
+        """Test an admin token is verified once and then read from cache."""
+        response = self.client.get("/api/products/amazon/id", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.access_token, self.cache._entries)
+
+        response = self.client.get("/api/products/amazon/id", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_token_request_state(self):
+        """Test a cache hit sets the request state flask-jwt-extended
+        sets, under the same private names."""
+        with self.app.test_request_context(headers=self.headers):
+            verify_jwt_in_request()
+            names = {name for name in vars(g) if name.startswith("_jwt_")}
+            verified = (get_jwt_header(), get_jwt())
+
+        self.assertEqual(names, JWT_STATE)
+
+        with self.app.test_request_context(headers=self.headers):
+            verify_access_token()
+        self.assertIn(self.access_token, self.cache._entries)
+        with self.app.test_request_context(headers=self.headers):
+            verify_access_token()
+            self.assertEqual((get_jwt_header(), get_jwt()), verified)
+            # No user is loaded from the cache.
+            with self.assertRaises(RuntimeError):
+                get_current_user()
+
+    def test_revoked_cached_token(self):
+        """Test a cached token is rejected once revoked."""
+        self.client.get("/api/products/amazon/id", headers=self.headers)
+        self.client.post("/api/logout", headers=self.headers)
+
+        response = self.client.get("/api/products/amazon/id", headers=self.headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json["error"], "token_revoked")
+        self.assertNotIn(self.access_token, self.cache._entries)
+
+    def test_invalid_token_not_cached(self):
+        """Test a token failing verification is not cached."""
+        headers = {"Authorization": f"Bearer {self.access_token}x"}
+
+        response = self.client.get("/api/products/amazon/id", headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn(f"{self.access_token}x", self.cache._entries)
+
+    def test_cache_expiry(self):
+        """Test the cached tokens expire with the token or the TTL."""
+        now = [0]
+        cache = VerifiedTokenCache(max_entries=2, ttl=60, clock=lambda: now[0])
+        cache.set("a", {}, {"jti": "a", "exp": 30})
+        cache.set("b", {}, {"jti": "b", "exp": 1000})
+
+        now[0] = 29
+        self.assertIsNotNone(cache.get("a"))
+        now[0] = 30
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("b"))
+        now[0] = 60
+        self.assertIsNone(cache.get("b"))
+
+        cache.set("c", {}, {"jti": "c"})
+        cache.set("d", {}, {"jti": "d"})
+        cache.set("e", {}, {"jti": "e"})
+        self.assertEqual(list(cache._entries), ["d", "e"])
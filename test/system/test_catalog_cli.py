@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import ProductModel
+from app.models.change import ChangeModel
+from app.models.product import VariantGroup
+from app.schemas import ProductPutSchema
+
+
+class TestCatalogCli(BaseTest):
+    """Test case for the `flask catalog` maintenance commands."""
+
+    def setUp(self):
+        super().setUp()
+        self.runner = self.app.test_cli_runner()
+        self.directory = tempfile.TemporaryDirectory()
+        self.products = [{
+            "asin": f"TESTASIN{index}",
+            "price": 10 * index,
+            "url": "https://test.com",
+            "title": f"Test Product {index}",
+            "brand": "TEST" if index % 2 else "TEST_2",
+            "images": [{"url": f"https://test.com/{index}.jpg"}],
+            "twister": [
+                {"type": "color_name", "asin": "TESTASIN1", "name": "Red"},
+                {"type": "color_name", "asin": "TESTASIN2", "name": "Blue"},
+            ],
+        } for index in range(1, 7)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def load(self, path, *args):
+        result = self.runner.invoke(args=["catalog", "load", path, *args])
+        self.assertEqual(result.exit_code, 0, result.output)
+        return result.output
+
+    def count(self, *clauses):
+        return db.session.execute(
+            db.select(db.func.count(ProductModel.id)).filter(*clauses)
+        ).scalar()
+
+    def test_load_ndjson_with_workers(self):
+        """Test an NDJSON file is loaded by worker processes, skipping
+        the invalid records and the existing ASINs."""
+        lines = [json.dumps(product) for product in self.products]
+        lines.insert(2, "{not json")
+        lines.insert(4, json.dumps({"asin": "NOTITLE"}))
+        path = self.write_file("catalog.ndjson", "\n".join(lines) + "\n")
+
+        output = self.load(path, "--workers", "2", "--chunk-size", "2")
+        again = self.load(path, "--workers", "1")
+
+        self.assertIn("6 products loaded, 0 already there, 2 invalid.", output)
+        self.assertIn("Record 3:", output)
+        self.assertIn("Record 5:", output)
+        self.assertIn("0 products loaded, 6 already there", again)
+
+        product = self.client.get("/api/product/amazon/TESTASIN3").json
+        self.assertEqual(product["images"], ["https://test.com/3.jpg"])
+        self.assertIn("twister", product)
+        self.assertEqual(db.session.execute(
+            db.select(db.func.count(VariantGroup.id))).scalar(), 1)
+        self.assertEqual(db.session.execute(
+            db.select(db.func.count(ChangeModel.seq))).scalar(), 6)
+
+    def test_load_csv(self):
+        """Test a CSV file is loaded with its images and twister."""
+        twister = json.dumps(self.products[0]["twister"]).replace('"', '""')
+        path = self.write_file("catalog.csv", (
+            "asin,title,url,price,brand,images,twister\n"
+            "TESTASIN1,Test Product 1,https://test.com,10,TEST,"
+            "https://test.com/1.jpg https://test.com/1b.jpg,"
+            f"\"{twister}\"\n"
+            "TESTASIN2,\"Test, Product 2\",https://test.com,,,"
+            "https://test.com/2.jpg,\n"))
+
+        output = self.load(path, "--workers", "1")
+
+        self.assertIn("2 products loaded", output)
+        first = self.client.get("/api/product/amazon/TESTASIN1").json
+        second = self.client.get("/api/product/amazon/TESTASIN2").json
+        self.assertEqual(len(first["images"]), 2)
+        self.assertIn("twister", first)
+        self.assertEqual(second["title"], "Test, Product 2")
+        self.assertNotIn("brand", second)
+
+    def test_purge(self):
+        """Test the purge deletes the products matching every filter."""
+        path = self.write_file("catalog.ndjson", "\n".join(
+            json.dumps(product) for product in self.products))
+        self.load(path, "--workers", "1")
+
+        dry_run = self.runner.invoke(args=[
+            "catalog", "purge", "--brand", "TEST", "--price-below", "40",
+            "--dry-run"])
+        no_filter = self.runner.invoke(args=["catalog", "purge"])
+        purge = self.runner.invoke(args=[
+            "catalog", "purge", "--brand", "TEST", "--price-below", "40",
+            "--batch-size", "1"])
+
+        self.assertIn("2 products would be deleted.", dry_run.output)
+        self.assertNotEqual(no_filter.exit_code, 0)
+        self.assertIn("2 products deleted.", purge.output)
+        self.assertEqual(self.count(), 4)
+        self.assertEqual(self.count(ProductModel.asin.in_(
+            ["TESTASIN1", "TESTASIN3"])), 0)
+        self.assertEqual(db.session.execute(
+            db.select(ChangeModel.asin).filter(ChangeModel.op == "delete")
+            .order_by(ChangeModel.seq)).scalars().all(),
+            ["TESTASIN1", "TESTASIN3"])
+
+        self.runner.invoke(args=["catalog", "purge", "--all"])
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(db.session.execute(
+            db.select(db.func.count(VariantGroup.id))).scalar(), 0)
+
+    def test_recompute_and_reindex(self):
+        """Test the recompute fixes the content hashes and the reindex
+        runs on every catalog table."""
+        path = self.write_file("catalog.ndjson", "\n".join(
+            json.dumps(product) for product in self.products))
+        self.load(path, "--workers", "1")
+        db.session.execute(db.update(ProductModel).filter(
+            ProductModel.asin == "TESTASIN1").values(content_hash="stale"))
+        db.session.commit()
+
+        recompute = self.runner.invoke(args=["catalog", "recompute"])
+        reindex = self.runner.invoke(args=["catalog", "reindex"])
+        unknown = self.runner.invoke(args=[
+            "catalog", "recompute", "--marketplace", "ebay"])
+
+        self.assertIn("1 content hashes changed.", recompute.output)
+        self.assertIn("products reindexed.", reindex.output)
+        self.assertNotEqual(unknown.exit_code, 0)
+
+        # The loaded hash is the one of the PUT of the same payload.
+        self.assertEqual(
+            ProductModel.hash_for(ProductPutSchema().load(self.products[0])),
+            db.session.execute(db.select(ProductModel.content_hash).filter(
+                ProductModel.asin == "TESTASIN1")).scalar())
@@ -0,0 +1,225 @@
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import ProductModel
+from app.models.change import ChangeModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+
+
+class TestCatalogIO(BaseTest):
+    """Test case for the catalog export and import."""
+
+    def setUp(self):
+        """Add two products of a variant family and an admin token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+        twister = [
+            {"type": "color_name", "asin": "TESTASIN1", "name": "Red"},
+            {"type": "color_name", "asin": "TESTASIN2", "name": "Blue"},
+        ]
+        self.products = [{
+            "asin": f"TESTASIN{index}",
+            "price": 100 * index,
+            "url": "https://test.com",
+            "title": f"Test Product {index}",
+            "brand": "TEST",
+            "ranking": index,
+            "images": [{"url": f"https://test.com/{index}-{image}.jpg"}
+                       for image in range(2)],
+            "twister": twister,
+        } for index in (1, 2)]
+        response = self.client.post(
+            "/api/products/amazon", json=self.products, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+    def round_trip(self, file_format):
+        """Export amazon and import the file into mercadolibre."""
+        self.app.config["MARKETPLACES"] = ["amazon", "mercadolibre"]
+        export = self.client.get(
+            "/api/catalog/amazon/export",
+            query_string={"format": file_format}, headers=self.headers)
+        self.assertEqual(export.status_code, 200)
+        self.assertIn(f"amazon.{file_format}",
+                      export.headers["Content-Disposition"])
+
+        imports = [self.client.post(
+            "/api/catalog/mercadolibre/import",
+            query_string={"format": file_format}, data=export.data,
+            headers=self.headers) for _ in range(2)]
+        return imports
+
+    def check_round_trip(self, imports):
+        self.assertEqual(imports[0].status_code, 201)
+        self.assertEqual(imports[0].json["created"], 2)
+        self.assertEqual(imports[1].json["created"], 0)
+        self.assertEqual(imports[1].json["repeated"], 2)
+
+        for index in (1, 2):
+            amazon = self.client.get(
+                f"/api/product/amazon/TESTASIN{index}").json
+            imported = self.client.get(
+                f"/api/product/mercadolibre/TESTASIN{index}").json
+            del amazon["id"], imported["id"]
+            self.assertEqual(imported, amazon)
+            self.assertEqual(len(imported["images"]), 2)
+            self.assertIn("twister", imported)
+
+        changes = db.session.execute(
+            db.select(ChangeModel.asin, ChangeModel.op)
+            .filter(ChangeModel.marketplace == "mercadolibre")
+            .order_by(ChangeModel.seq)).all()
+        self.assertListEqual(
+            changes, [("TESTASIN1", "upsert"), ("TESTASIN2", "upsert")])
+
+    def test_parquet_round_trip(self):
+        """Test a Parquet export is imported with its relationships."""
+        self.check_round_trip(self.round_trip("parquet"))
+
+    def test_arrow_round_trip(self):
+        """Test an Arrow stream export is imported with its relationships."""
+        self.check_round_trip(self.round_trip("arrow"))
+
+    def test_export_batches(self):
+        """Test the export is written in batches of the cursor."""
+        from app.utils.columnar import export_batches
+
+        with self.app.app_context():
+            batches = list(export_batches("amazon", batch_size=1))
+
+        self.assertEqual([batch.num_rows for batch in batches], [1, 1])
+        self.assertEqual(
+            batches[1].to_pylist()[0]["images"],
+            ["https://test.com/2-0.jpg", "https://test.com/2-1.jpg"])
+
+    def post_file(self, table, file_format="parquet"):
+        import io
+
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        body = io.BytesIO()
+        if file_format == "parquet":
+            pyarrow.parquet.write_table(table, body)
+        else:
+            with pyarrow.ipc.new_stream(body, table.schema) as writer:
+                writer.write_table(table)
+        return self.client.post(
+            "/api/catalog/amazon/import",
+            query_string={"format": file_format}, data=body.getvalue(),
+            headers=self.headers)
+
+    def test_import_invalid_files(self):
+        """Test the invalid files are refused before any insert."""
+        import pyarrow as pa
+        from app.utils.columnar import SCHEMA
+
+        row = {"asin": "NEWASIN1", "url": "https://test.com",
+               "title": "New Product", "images": [], "twister": []}
+        no_twister = pa.Table.from_pylist(
+            [row], schema=SCHEMA.remove(SCHEMA.get_field_index("twister")))
+        null_title = pa.Table.from_pylist(
+            [row, dict(row, asin="NEWASIN2", title=None)], schema=SCHEMA)
+        bad_type = pa.Table.from_pylist(
+            [dict(row, price="cheap")], schema=SCHEMA.set(
+                SCHEMA.get_field_index("price"),
+                pa.field("price", pa.string())))
+
+        missing = self.post_file(no_twister)
+        null = self.post_file(null_title, "arrow")
+        cast = self.post_file(bad_type)
+        not_parquet = self.client.post(
+            "/api/catalog/amazon/import", query_string={"format": "parquet"},
+            data=b"asin,title\n", headers=self.headers)
+
+        self.assertEqual(missing.status_code, 422)
+        self.assertIn("twister", missing.json["message"])
+        self.assertEqual(null.status_code, 422)
+        self.assertIn("Row 1: the title is missing.", null.json["message"])
+        self.assertEqual(cast.status_code, 422)
+        self.assertEqual(not_parquet.status_code, 422)
+        self.assertEqual(
+            db.session.execute(db.select(db.func.count(ProductModel.id)))
+            .scalar(), 2)
+
+    def test_import_too_long_strings(self):
+        """Test the strings longer than their column are refused."""
+        import pyarrow as pa
+        from app.utils.columnar import SCHEMA
+
+        member = {"type": "color_name", "name": "Red", "asin": "NEWASIN0"}
+        rows = [{"asin": f"NEWASIN{index}", "url": "https://test.com",
+                 "title": f"New Product {index}", "images": [],
+                 "twister": [member, member]} for index in range(3)]
+        long_asin = [*rows[:1], dict(rows[1], asin="A" * 21), rows[2]]
+        long_member = [*rows[:2], dict(rows[2], twister=[
+            member, dict(member, name="N" * 101)])]
+
+        asin = self.post_file(pa.Table.from_pylist(long_asin, schema=SCHEMA))
+        twister = self.post_file(
+            pa.Table.from_pylist(long_member, schema=SCHEMA), "arrow")
+
+        self.assertEqual(asin.status_code, 422)
+        self.assertIn("Row 1: the asin is longer than 20 characters.",
+                      asin.json["message"])
+        self.assertEqual(twister.status_code, 422)
+        self.assertIn("Row 2: the twister name is longer than 100 "
+                      "characters.", twister.json["message"])
+        self.assertEqual(
+            db.session.execute(db.select(db.func.count(ProductModel.id)))
+            .scalar(), 2)
+
+    def test_import_stops_at_invalid_batch(self):
+        """Test an invalid batch stops the import after the batches
+        committed before it."""
+        import pyarrow as pa
+        from app.utils.columnar import SCHEMA, import_batches
+
+        rows = [{"asin": f"NEWASIN{index}", "url": "https://test.com",
+                 "title": f"New Product {index}", "images": [],
+                 "twister": []} for index in range(3)]
+        rows[2]["url"] = None
+        batches = pa.Table.from_pylist(rows, schema=SCHEMA).to_batches(
+            max_chunksize=2)
+
+        with self.assertRaisesRegex(ValueError, "Row 2: the url is missing. "
+                                    "The 2 rows before it were imported"):
+            import_batches("amazon", batches)
+        self.assertEqual(self.client.get(
+            "/api/product/amazon/NEWASIN1").status_code, 200)
+        self.assertEqual(self.client.get(
+            "/api/product/amazon/NEWASIN2").status_code, 404)
+
+    def test_catalog_requires_admin(self):
+        """Test the catalog endpoints are for admins of known marketplaces."""
+        no_token = self.client.get("/api/catalog/amazon/export")
+        unknown = self.client.get(
+            "/api/catalog/ebay/export", headers=self.headers)
+        bad_format = self.client.post(
+            "/api/catalog/amazon/import", query_string={"format": "csv"},
+            headers=self.headers)
+
+        self.assertEqual(no_token.status_code, 401)
+        self.assertEqual(unknown.status_code, 404)
+        self.assertEqual(bad_format.status_code, 422)
+        self.assertEqual(
+            db.session.execute(db.select(db.func.count(ProductModel.id)))
+            .scalar(), 2)
@@ -0,0 +1,125 @@
+import datetime
+import time
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models.change import ChangeModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+
+
+class TestChanges(BaseTest):
+    """Test case for the change feed."""
+
+    def setUp(self):
+        """Set up an admin user and its token."""
+        super().setUp()
+        self.product = {
+            "asin": "TESTASIN123",
+            "price": 100,
+            "url": "https://test.com",
+            "images": [{"url": "https://test.com/image.jpg"}],
+            "title": "Test Product",
+            "brand": "TEST",
+        }
+
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+    def get_changes(self, **query):
+        return self.client.get(
+            "/api/changes", query_string=query, headers=self.headers)
+
+    def test_get_changes(self):
+        """Test the product writes are recorded in order."""
+        self.client.post(
+            "/api/product/amazon", json=self.product, headers=self.headers)
+        self.client.put(
+            "/api/products/amazon",
+            json=[dict(self.product, price=50)], headers=self.headers)
+        # An unchanged product is not recorded again.
+        self.client.put(
+            "/api/products/amazon",
+            json=[dict(self.product, price=50)], headers=self.headers)
+        self.client.delete(
+            "/api/product/amazon/TESTASIN123", headers=self.headers)
+
+        response = self.get_changes()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json, {
+            "changes": [
+                {"seq": 1, "marketplace": "amazon", "asin": "TESTASIN123", "op": "upsert"},
+                {"seq": 2, "marketplace": "amazon", "asin": "TESTASIN123", "op": "upsert"},
+                {"seq": 3, "marketplace": "amazon", "asin": "TESTASIN123", "op": "delete"},
+            ],
+            "last_seq": 3,
+            "has_more": False,
+        })
+
+        response = self.get_changes(since=1, limit=1)
+
+        self.assertEqual(response.json["changes"][0]["seq"], 2)
+        self.assertEqual(response.json["last_seq"], 2)
+        self.assertTrue(response.json["has_more"])
+
+    def test_get_changes_wait(self):
+        """Test a long poll without changes returns once `wait` passed."""
+        start = time.monotonic()
+        response = self.get_changes(since=0, wait=0.2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertDictEqual(response.json, {
+            "changes": [], "last_seq": 0, "has_more": False})
+
+    def test_get_changes_without_token(self):
+        """Test the change feed requires a token."""
+        response = self.client.get("/api/changes")
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_purge_changes(self):
+        """Test the purge deletes the old changes but the last one."""
+        self.client.post(
+            "/api/product/amazon", json=self.product, headers=self.headers)
+        for price in (10, 20, 30):
+            self.client.put(
+                "/api/product/amazon/TESTASIN123",
+                json=dict(self.product, price=price), headers=self.headers)
+        old = (datetime.datetime.now(datetime.timezone.utc)
+               - datetime.timedelta(days=10))
+        runner = self.app.test_cli_runner()
+
+        db.session.execute(db.update(ChangeModel).filter(
+            ChangeModel.seq <= 2).values(created_at=old))
+        db.session.commit()
+        purge = runner.invoke(args=[
+            "changes", "purge", "--older-than", "7", "--batch-size", "1"])
+
+        db.session.execute(db.update(ChangeModel).values(created_at=old))
+        db.session.commit()
+        last = runner.invoke(args=["changes", "purge", "--older-than", "7"])
+
+        self.assertIn("2 changes deleted.", purge.output)
+        self.assertIn("1 changes deleted.", last.output)
+        self.assertEqual(self.get_changes().json["changes"], [
+            {"seq": 4, "marketplace": "amazon", "asin": "TESTASIN123",
+             "op": "upsert"}])
@@ -0,0 +1,128 @@
+import gzip
+import json
+
+import brotli
+import zstandard
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import ProductModel, ProductImage
+from app.utils.compression import negotiate
+
+
+class TestCompression(BaseTest):
+    """Test case for the response compression."""
+
+    def setUp(self):
+        """Add enough products for the listing to be compressed."""
+        super().setUp()
+        for index in range(10):
+            db.session.add(ProductModel(
+                asin=f"TESTASIN{index}",
+                price=100 + index,
+                url="https://test.com",
+                title=f"Test Product {index}",
+                brand="TEST",
+                images=[ProductImage(url=f"https://test.com/{index}.jpg")],
+            ))
+        db.session.commit()
+        self.app.extensions["compressor"].cache._entries.clear()
+
+    def test_negotiate(self):
+        """Test the encoding negotiation."""
+        encodings = ["zstd", "br", "gzip"]
+
+        self.assertEqual(negotiate("gzip, deflate, br", encodings), "br")
+        self.assertEqual(negotiate("gzip;q=1.0, br;q=0.5", encodings), "gzip")
+        self.assertEqual(negotiate("*", encodings), "zstd")
+        self.assertIsNone(negotiate("gzip;q=0, deflate", encodings))
+        self.assertIsNone(negotiate("", encodings))
+
+    def test_compressed_listing(self):
+        """Test the listing is compressed with each encoding."""
+        plain = self.client.get("/api/products/amazon")
+        decompress = {
+            "gzip": gzip.decompress,
+            "br": brotli.decompress,
+            "zstd": zstandard.ZstdDecompressor().decompressobj().decompress,
+        }
+
+        for encoding, function in decompress.items():
+            response = self.client.get(
+                "/api/products/amazon",
+                headers={"Accept-Encoding": encoding})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["Content-Encoding"], encoding)
+            self.assertIn("Accept-Encoding", response.headers["Vary"])
+            self.assertLess(len(response.data), len(plain.data))
+            self.assertEqual(
+                json.loads(function(response.data)), plain.json)
+
+    def test_small_response_not_compressed(self):
+        """Test a body under the minimum size is sent as it is."""
+        response = self.client.get(
+            "/api/product/amazon/MISSING",
+            headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_cached_compressed_body(self):
+        """Test a repeated response reuses the compressed body."""
+        cache = self.app.extensions["compressor"].cache
+        headers = {"Accept-Encoding": "gzip"}
+
+        first = self.client.get("/api/products/amazon", headers=headers)
+        self.assertEqual(len(cache._entries), 1)
+
+        second = self.client.get("/api/products/amazon", headers=headers)
+        self.assertEqual(len(cache._entries), 1)
+        self.assertEqual(first.data, second.data)
+
+    def test_large_response_streamed(self):
+        """Test a body over the stream size is compressed as a stream."""
+        compressor = self.app.extensions["compressor"]
+        stream_size = compressor.stream_size
+        compressor.stream_size = 1000
+        try:
+            response = self.client.get(
+                "/api/products/amazon",
+                headers={"Accept-Encoding": "gzip"})
+        finally:
+            compressor.stream_size = stream_size
+
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(
+            json.loads(gzip.decompress(response.data))["total"], 10)
+
+    def test_compressed_etag_is_weak(self):
+        """Test a compressed response sends its ETag weak, and both forms
+        are accepted by If-None-Match."""
+        compressor = self.app.extensions["compressor"]
+        min_size = compressor.min_size
+        compressor.min_size = 0
+        try:
+            plain = self.client.get("/api/product/amazon/TESTASIN1")
+            compressed = self.client.get(
+                "/api/product/amazon/TESTASIN1",
+                headers={"Accept-Encoding": "gzip"})
+            not_modified = [self.client.get(
+                "/api/product/amazon/TESTASIN1",
+                headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+                for tag in (plain.headers["ETag"],
+                            compressed.headers["ETag"])]
+            modified = self.client.get(
+                "/api/product/amazon/TESTASIN1",
+                headers={"If-None-Match": '"2"'})
+        finally:
+            compressor.min_size = min_size
+
+        self.assertEqual(plain.headers["ETag"], '"1"')
+        self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+        self.assertEqual(compressed.headers["ETag"], 'W/"1"')
+        self.assertEqual(
+            [response.status_code for response in not_modified], [304, 304])
+        self.assertEqual(not_modified[0].data, b"")
+        self.assertEqual(modified.status_code, 200)
@@ -0,0 +1,200 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import event
+
+from test.base_test import BaseTest
+from test.system import test_asgi
+from app.asgi import create_asgi_app
+from app.extensions import db
+from app.models import ProductModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+
+
+class TestConcurrency(BaseTest):
+    """Test case for the optimistic concurrency control of the updates."""
+
+    def setUp(self):
+        """Add two products and an admin token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+        self.products = [{
+            "asin": f"TESTASIN{index}",
+            "price": 100,
+            "url": "https://test.com",
+            "title": f"Test Product {index}",
+        } for index in (1, 2)]
+        self.client.post(
+            "/api/products/amazon", json=self.products, headers=self.headers)
+
+    def put(self, product, **headers):
+        return self.client.put(
+            f"/api/product/amazon/{product['asin']}", json=product,
+            headers=dict(self.headers, **headers))
+
+    def version(self, asin):
+        return db.session.execute(
+            db.select(ProductModel.version).filter(
+                ProductModel.asin == asin)).scalar()
+
+    def test_put_bumps_version(self):
+        """Test an update bumps the version, shown as the ETag."""
+        response = self.put(dict(self.products[0], price=90))
+        detail = self.client.get("/api/product/amazon/TESTASIN1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["version"], 2)
+        self.assertEqual(response.headers["ETag"], '"2"')
+        self.assertEqual(detail.headers["ETag"], '"2"')
+        self.assertEqual(detail.json["version"], 2)
+
+    def test_put_if_match(self):
+        """Test a PUT whose If-Match is not the version is refused."""
+        stale = self.put(dict(self.products[0], price=90), **{
+            "If-Match": '"2"'})
+        current = self.put(dict(self.products[0], price=80), **{
+            "If-Match": 'W/"1"'})
+
+        self.assertEqual(stale.status_code, 412)
+        self.assertEqual(stale.headers["ETag"], '"1"')
+        self.assertEqual(current.status_code, 200)
+        self.assertEqual(
+            db.session.get(ProductModel, 1).price, 80)
+
+    def test_put_stale_version(self):
+        """Test a PUT based on a replaced version is a conflict."""
+        self.put(dict(self.products[0], price=90, version=1))
+        response = self.put(dict(self.products[0], price=80, version=1))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.version("TESTASIN1"), 2)
+
+    def test_put_products_conflicts(self):
+        """Test the bulk PUT updates the products of the current version
+        and lists the others as conflicts."""
+        self.put(dict(self.products[0], price=90))
+
+        response = self.client.put("/api/products/amazon", json=[
+            dict(self.products[0], price=70, version=1),
+            dict(self.products[1], price=70, version=1),
+        ], headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["updated"], 1)
+        self.assertEqual(response.json["conflicts"], ["TESTASIN1"])
+        self.assertEqual(self.version("TESTASIN1"), 2)
+        self.assertEqual(self.version("TESTASIN2"), 2)
+
+    def test_put_products_concurrent_update(self):
+        """Test a product updated after the bulk PUT read it is a
+        conflict, not overwritten."""
+        updates = []
+
+        # Another request updates TESTASIN1 once its version was read.
+        def update(conn, cursor, statement, parameters, context, many):
+            if statement.startswith("UPDATE products SET version") \
+                    and not updates:
+                updates.append(statement)
+                cursor.execute(
+                    "UPDATE products SET price = 60, version = version + 1 "
+                    "WHERE asin = 'TESTASIN1'")
+
+        event.listen(db.engine, "before_cursor_execute", update)
+        try:
+            response = self.client.put("/api/products/amazon", json=[
+                dict(product, price=70) for product in self.products
+            ], headers=self.headers)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", update)
+
+        self.assertEqual(response.json["updated"], 1)
+        self.assertEqual(response.json["conflicts"], ["TESTASIN1"])
+        self.assertEqual(db.session.execute(
+            db.select(ProductModel.price).order_by(ProductModel.asin)
+        ).scalars().all(), [60, 70])
+
+
+class TestAsgiConcurrency(unittest.TestCase):
+    """Test case for the ETags of the async product detail.
+
+    The async engine cannot see the transaction of BaseTest, so these
+    tests use a committed SQLite file, like the ASGI tests.
+    """
+
+    def setUp(self):
+        """Create the apps on a temporary database with a product."""
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.asgi = create_asgi_app(db_url=f"sqlite:///{self.db_path}")
+
+        with self.asgi.flask_app.app_context():
+            db.create_all()
+            db.session.add(ProductModel(
+                marketplace="amazon", asin="TESTASIN1", price=100,
+                url="https://test.com", title="Test Product 1", version=3))
+            db.session.commit()
+
+    def tearDown(self):
+        """Remove the temporary database."""
+        asyncio.run(self.asgi.engine.dispose())
+        with self.asgi.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(self.db_path)
+
+    def get(self, **headers):
+        return test_asgi.asgi_get(
+            self.asgi, "/api/product/amazon/TESTASIN1", headers=headers)
+
+    def test_get_product_etag(self):
+        """Test the async detail sends the ETag of the version, weak when
+        compressed, and a 304 when If-None-Match lists it."""
+        compressor = self.asgi.compressor
+        min_size = compressor.min_size
+        compressor.min_size = 0
+        try:
+            plain = self.get()
+            compressed = self.get(**{"Accept-Encoding": "gzip"})
+            not_modified = [
+                self.get(**{"Accept-Encoding": "gzip", "If-None-Match": tag})
+                for tag in (plain[1]["etag"], compressed[1]["etag"])]
+            modified = self.get(**{"If-None-Match": '"2"'})
+        finally:
+            compressor.min_size = min_size
+
+        self.assertEqual(plain[0], 200)
+        self.assertEqual(plain[1]["etag"], '"3"')
+        self.assertEqual(json.loads(plain[2])["version"], 3)
+        self.assertEqual(compressed[1]["content-encoding"], "gzip")
+        self.assertEqual(compressed[1]["etag"], 'W/"3"')
+        self.assertEqual(json.loads(gzip.decompress(compressed[2])),
+                         json.loads(plain[2]))
+        self.assertEqual(
+            [(status, body) for status, _, body in not_modified],
+            [(304, b""), (304, b"")])
+        self.assertEqual(not_modified[0][1]["etag"], '"3"')
+        self.assertEqual(modified[0], 200)
@@ -0,0 +1,168 @@
+from sqlalchemy import event
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models.product import (
+    Image, ProductModel, ProductImage, intern_images)
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+
+
+class TestImages(BaseTest):
+    """Test case for the interned product images."""
+
+    def setUp(self):
+        """Add two variants sharing their images and an admin token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+        self.urls = [f"https://test.com/{number}.jpg" for number in range(3)]
+        self.products = [{
+            "asin": f"TESTASIN{index}",
+            "price": 100,
+            "url": "https://test.com",
+            "title": f"Test Product {index}",
+            "images": [{"url": url} for url in self.urls],
+        } for index in (1, 2)]
+        response = self.client.post(
+            "/api/products/amazon", json=self.products, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+    def links(self, asin):
+        """Return the image URLs of `asin`, in order."""
+        product = self.client.get(f"/api/product/amazon/{asin}").json
+        return product.get("images")
+
+    def test_images_are_shared(self):
+        """Test the URLs shown by several products are stored once."""
+        self.assertEqual(db.session.execute(
+            db.select(db.func.count(Image.id))).scalar(), 3)
+        self.assertEqual(db.session.execute(
+            db.select(db.func.count()).select_from(ProductImage)).scalar(), 6)
+        self.assertEqual(self.links("TESTASIN1"), self.urls)
+        self.assertEqual(self.links("TESTASIN2"), self.urls)
+
+    def test_put_writes_changed_images(self):
+        """Test a PUT inserts only the new URLs and rewrites only the
+        positions whose URL changed."""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, many):
+            statements.append((statement, parameters))
+
+        images = [{"url": self.urls[0]}, {"url": "https://test.com/new.jpg"}]
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = self.client.put(
+                "/api/product/amazon/TESTASIN1",
+                json=dict(self.products[0], images=images),
+                headers=self.headers)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.links("TESTASIN1"), [self.urls[0], "https://test.com/new.jpg"])
+        self.assertEqual(self.links("TESTASIN2"), self.urls)
+        self.assertEqual(db.session.execute(
+            db.select(db.func.count(Image.id))).scalar(), 4)
+
+        writes = [statement for statement, _ in statements
+                  if statement.startswith(("INSERT", "UPDATE", "DELETE"))
+                  and "product_images" in statement]
+        # Position 1 repointed, position 2 deleted, position 0 untouched.
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(writes[0].startswith("UPDATE product_images"))
+        self.assertTrue(writes[1].startswith("DELETE FROM product_images"))
+
+    def test_intern_images(self):
+        """Test interning returns the stored ids and inserts the others."""
+        stored = db.session.execute(
+            db.select(Image.id).filter(
+                Image.url_hash == Image.hash_for(self.urls[0]))).scalar()
+
+        image_ids = intern_images(
+            db.session, [self.urls[0], "https://test.com/new.jpg"])
+
+        self.assertEqual(image_ids[self.urls[0]], stored)
+        self.assertEqual(db.session.get(
+            Image, image_ids["https://test.com/new.jpg"]).url,
+            "https://test.com/new.jpg")
+
+    def test_twister_without_images(self):
+        """Test a variation without images is shown without an image."""
+        response = self.client.post("/api/products/amazon", json=[
+            {"asin": "TESTASIN3", "price": 10, "url": "https://test.com",
+             "title": "Test Product 3"},
+            {"asin": "TESTASIN4", "price": 10, "url": "https://test.com",
+             "title": "Test Product 4", "twister": [
+                 {"type": "size_name", "name": "S", "asin": "TESTASIN3"}]},
+        ], headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        product = self.client.get("/api/product/amazon/TESTASIN4").json
+
+        self.assertIsNone(
+            product["twister"]["size_name"]["product_TESTASIN3"]["image"])
+
+    def test_primary_image_url(self):
+        """Test the primary image URL follows the first image, and the
+        listings read it without the images."""
+        response = self.client.put(
+            "/api/products/amazon",
+            json=[dict(self.products[0], images=[{"url": self.urls[2]}])],
+            headers=self.headers)
+        self.assertEqual(response.json["updated"], 1)
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            listing = self.client.get("/api/products/amazon", query_string={
+                "fields": "asin,primary_image_url", "sort_by": "asin"})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        detail = self.client.get("/api/product/amazon/TESTASIN1").json
+
+        self.assertListEqual(listing.json["products"], [
+            {"asin": "TESTASIN1", "primary_image_url": self.urls[2]},
+            {"asin": "TESTASIN2", "primary_image_url": self.urls[0]},
+        ])
+        self.assertFalse(any(
+            "product_images" in statement for statement in statements))
+        self.assertNotIn("primary_image_url", detail)
+
+    def test_recompute_primary_images(self):
+        """Test `flask catalog recompute` fixes stale primary images."""
+        db.session.execute(db.update(ProductModel).values(
+            primary_image_url=None))
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(
+            args=["catalog", "recompute"])
+
+        self.assertIn("2 primary image URLs changed.", result.output)
+        self.assertEqual(db.session.execute(
+            db.select(ProductModel.primary_image_url)).scalars().all(),
+            [self.urls[0]] * 2)
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import jwt
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from app.utils.keys import KeySet, generate_private_key, write_private_key
+
+
+class TestSigningKeys(unittest.TestCase):
+    """Test case for the asymmetric JWT signing and the JWKS."""
+
+    def create_app(self, **env):
+        with mock.patch.dict(os.environ, env):
+            app = create_app(db_url="sqlite://")
+        app.config["RATELIMIT_ENABLED"] = False
+        return app
+
+    def admin_token(self, app):
+        with app.app_context():
+            return create_access_token(
+                identity="1", additional_claims={"role": "admin"})
+
+    def test_signing_algorithms(self):
+        """Test the tokens verify with the public key of the JWKS."""
+        for algorithm in ("RS256", "EdDSA"):
+            with self.subTest(algorithm=algorithm):
+                app = self.create_app(JWT_ALGORITHM=algorithm)
+                client = app.test_client()
+                token = self.admin_token(app)
+
+                response = client.get("/.well-known/jwks.json")
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("max-age", response.headers["Cache-Control"])
+                [jwk] = response.json["keys"]
+
+                # As another service would, from the JWKS only.
+                header = jwt.get_unverified_header(token)
+                self.assertEqual(header["kid"], jwk["kid"])
+                claims = jwt.decode(
+                    token, jwt.PyJWK(jwk).key, algorithms=[algorithm])
+                self.assertEqual(claims["role"], "admin")
+
+                response = client.get(
+                    "/api/products/amazon/id",
+                    headers={"Authorization": f"Bearer {token}"})
+                self.assertEqual(response.status_code, 200)
+
+    def test_key_rotation(self):
+        """Test the tokens of a retired key verify until it is removed."""
+        keys_dir = tempfile.mkdtemp()
+        for kid in ("20260101-old", "20260601-new"):
+            write_private_key(
+                generate_private_key("EdDSA"),
+                os.path.join(keys_dir, f"{kid}.pem"))
+
+        old_app = self.create_app(
+            JWT_ALGORITHM="EdDSA", JWT_KEYS_DIR=keys_dir,
+            JWT_ACTIVE_KID="20260101-old")
+        old_token = self.admin_token(old_app)
+
+        app = self.create_app(JWT_ALGORITHM="EdDSA", JWT_KEYS_DIR=keys_dir)
+        client = app.test_client()
+
+        self.assertEqual(app.extensions["jwt_keys"].active_kid, "20260601-new")
+        self.assertEqual(
+            [key["kid"] for key in client.get("/.well-known/jwks.json").json["keys"]],
+            ["20260101-old", "20260601-new"])
+
+        response = client.get(
+            "/api/products/amazon/id",
+            headers={"Authorization": f"Bearer {old_token}"})
+        self.assertEqual(response.status_code, 200)
+
+        os.remove(os.path.join(keys_dir, "20260101-old.pem"))
+        app = self.create_app(JWT_ALGORITHM="EdDSA", JWT_KEYS_DIR=keys_dir)
+
+        response = app.test_client().get(
+            "/api/products/amazon/id",
+            headers={"Authorization": f"Bearer {old_token}"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_hmac_jwks(self):
+        """Test the JWKS is empty with a shared secret."""
+        app = self.create_app(JWT_ALGORITHM="HS256")
+
+        response = app.test_client().get("/.well-known/jwks.json")
+
+        self.assertEqual(response.json, {"keys": []})
+        self.assertNotIn("jwt_keys", app.extensions)
+
+    def test_unknown_active_kid(self):
+        """Test a key set refuses an active kid it does not hold."""
+        with self.assertRaises(ValueError):
+            KeySet("RS256", {"a": generate_private_key("RS256")}, "b")
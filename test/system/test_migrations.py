@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import sqlalchemy as sa
+
+from app.utils.online_migrations import online_migrations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+class TestMigrations(unittest.TestCase):
+    """Test case for the revisions, run with `flask db` on a SQLite file.
+
+    The command runs in a process of its own, since the logging
+    configuration of Alembic replaces the one of the tests.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_url = f"sqlite:///{self.directory.name}/migrations.db"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def flask_db(self, *args):
+        environ = dict(
+            os.environ, DATABASE_URL=self.db_url, FLASK_APP="app",
+            DB_CREATE_ALL="false")
+        result = subprocess.run(
+            [sys.executable, "-m", "flask", "db", *args], cwd=ROOT,
+            env=environ, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_upgrade_from_0005(self):
+        """Test an upgrade from 0005 to the head in one run builds the
+        brand index queued by 0006 and leaves nothing pending."""
+        self.flask_db("upgrade", "0005")
+        self.flask_db("upgrade")
+        self.flask_db("check")
+
+        engine = sa.create_engine(self.db_url)
+        try:
+            with engine.connect() as connection:
+                statuses = connection.execute(
+                    sa.select(online_migrations.c.name,
+                              online_migrations.c.status)).all()
+            indexes = sa.inspect(engine).get_indexes("products")
+        finally:
+            engine.dispose()
+
+        self.assertIn(("0006_products_brand_index", "done"), statuses)
+        self.assertEqual({status for name, status in statuses}, {"done"})
+        self.assertIn("ix_products_brand",
+                      [index["name"] for index in indexes])
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import sqlalchemy as sa
+
+from app.utils.online_migrations import (
+    Checkpoint, online_migrations, run_pending)
+
+
+class TestOnlineMigrations(unittest.TestCase):
+    """Test case for the online index builds and backfills.
+
+    The operations open transactions of their own, so they run on a
+    SQLite file instead of the transaction of BaseTest.
+    """
+
+    def setUp(self):
+        """Create a table of 25 rows to migrate."""
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.engine = sa.create_engine(f"sqlite:///{self.db_path}")
+
+        metadata = sa.MetaData()
+        self.items = sa.Table(
+            "items", metadata,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(20)),
+            sa.Column("slug", sa.String(20)))
+        online_migrations.to_metadata(metadata)
+        metadata.create_all(self.engine)
+
+        with self.engine.begin() as connection:
+            connection.execute(self.items.insert(), [
+                {"id": index, "name": f"Item {index}"}
+                for index in range(1, 26)
+            ])
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def enqueue(self, name, **operation):
+        with self.engine.begin() as connection:
+            connection.execute(online_migrations.insert().values(
+                name=name, operation=operation, status="pending", rows=0,
+                updated_at=sa.func.now()))
+
+    def progress(self, name):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                sa.select(online_migrations)
+                .where(online_migrations.c.name == name)).one()
+
+    def test_concurrent_index(self):
+        """Test an index build runs once and is marked as done."""
+        self.enqueue(
+            "0001_items_name", kind="concurrent_index",
+            index_name="ix_items_name", table="items", columns=["name"])
+
+        self.assertEqual(run_pending(self.engine), 1)
+        self.assertEqual(run_pending(self.engine), 0)
+
+        indexes = sa.inspect(self.engine).get_indexes("items")
+        self.assertEqual([index["name"] for index in indexes],
+                         ["ix_items_name"])
+        self.assertEqual(self.progress("0001_items_name").status, "done")
+
+    def test_backfill(self):
+        """Test a backfill updates the rows in batches."""
+        self.enqueue(
+            "0001_items_slug", kind="backfill", table="items",
+            values={"slug": "lower(replace(name, ' ', '-'))"},
+            where="slug IS NULL", batch_size=10, pause=0)
+
+        self.assertEqual(run_pending(self.engine), 1)
+
+        progress = self.progress("0001_items_slug")
+        self.assertEqual(progress.status, "done")
+        self.assertEqual(progress.last_key, 25)
+        self.assertEqual(progress.rows, 25)
+        with self.engine.connect() as connection:
+            slugs = connection.execute(
+                sa.select(self.items.c.slug).order_by(self.items.c.id)
+            ).scalars().all()
+        self.assertEqual(slugs[0], "item-1")
+        self.assertNotIn(None, slugs)
+
+    def test_backfill_resumes(self):
+        """Test an interrupted backfill resumes after its last batch."""
+        self.enqueue(
+            "0001_items_slug", kind="backfill", table="items",
+            values={"slug": "'done'"}, batch_size=10, pause=0)
+
+        save = Checkpoint.save
+
+        def interrupted(checkpoint, connection, last_key, rows):
+            save(checkpoint, connection, last_key, rows)
+            if last_key == 20:
+                raise KeyboardInterrupt
+
+        with mock.patch.object(Checkpoint, "save", interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                run_pending(self.engine)
+
+        # The second batch is rolled back with its checkpoint.
+        progress = self.progress("0001_items_slug")
+        self.assertEqual(progress.status, "pending")
+        self.assertEqual((progress.last_key, progress.rows), (10, 10))
+
+        with self.engine.begin() as connection:
+            # The rows of the committed batch are not updated again.
+            connection.execute(self.items.update().values(slug="kept")
+                               .where(self.items.c.id <= 10))
+        self.assertEqual(run_pending(self.engine), 1)
+
+        progress = self.progress("0001_items_slug")
+        self.assertEqual(progress.status, "done")
+        self.assertEqual((progress.last_key, progress.rows), (25, 25))
+        with self.engine.connect() as connection:
+            slugs = connection.execute(
+                sa.select(self.items.c.slug).order_by(self.items.c.id)
+            ).scalars().all()
+        self.assertEqual(slugs, ["kept"] * 10 + ["done"] * 15)
@@ -0,0 +1,87 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app
+
+
+class TestOpenApi(unittest.TestCase):
+    """Test case for the OpenAPI spec of the production startup, built
+    on the first request."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_url = f"sqlite:///{self.directory.name}/startup.db"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_app(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            app = create_app(db_url=self.db_url)
+        app.config["TESTING"] = True
+        return app
+
+    def test_lazy_spec_equals_eager_spec(self):
+        """Test the spec documented on first request is the one built
+        at startup."""
+        eager = self.create_app(APP_ENV="development")
+        lazy = self.create_app(APP_ENV="production", JWT_SECRET="secret")
+
+        self.assertFalse(eager.config["OPENAPI_LAZY"])
+        self.assertTrue(lazy.config["OPENAPI_LAZY"])
+        api = lazy.extensions["flask-smorest"]["blp_name_to_api"]["products"]
+        self.assertTrue(api._pending_docs)
+
+        eager_spec = eager.test_client().get("/openapi.json")
+        lazy_spec = lazy.test_client().get("/openapi.json")
+
+        self.assertEqual(lazy_spec.status_code, 200)
+        self.assertFalse(api._pending_docs)
+        self.assertEqual(lazy_spec.json, eager_spec.json)
+        self.assertIn("/api/product/{marketplace}/{asin}",
+                      lazy_spec.json["paths"])
+
+    def test_cache_file(self):
+        """Test the spec file is served only while it documents the
+        views of the app."""
+        cache_path = os.path.join(self.directory.name, "openapi.json")
+        app = self.create_app(APP_ENV="development")
+        result = app.test_cli_runner().invoke(
+            args=["openapi", "write", cache_path])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(cache_path, encoding="utf-8") as cache_file:
+            written = json.load(cache_file)
+
+        spec = copy.deepcopy(written)
+        spec["info"]["description"] = "From the file."
+        self.write_spec(cache_path, spec)
+        current = self.create_app(
+            APP_ENV="development", OPENAPI_CACHE_PATH=cache_path)
+        self.assertEqual(
+            current.test_client().get("/openapi.json").json, spec)
+
+        # A view added since the file was written.
+        del spec["paths"]["/api/changes"]
+        self.write_spec(cache_path, spec)
+        stale = self.create_app(
+            APP_ENV="development", OPENAPI_CACHE_PATH=cache_path)
+        served = stale.test_client().get("/openapi.json").json
+        self.assertIn("/api/changes", served["paths"])
+        self.assertNotIn("description", served["info"])
+
+        spec = copy.deepcopy(written)
+        spec["info"].update(description="From the file.", version="v0")
+        self.write_spec(cache_path, spec)
+        old_version = self.create_app(
+            APP_ENV="development", OPENAPI_CACHE_PATH=cache_path)
+        self.assertEqual(
+            old_version.test_client().get("/openapi.json").json, written)
+
+    @staticmethod
+    def write_spec(path, spec):
+        with open(path, "w", encoding="utf-8") as cache_file:
+            json.dump(spec, cache_file)
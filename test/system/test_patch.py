@@ -0,0 +1,188 @@
+from sqlalchemy import event
+
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import AlertModel, ProductModel
+from app.models.change import ChangeModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+
+
+class TestPatch(BaseTest):
+    """Test case for the PATCH endpoints of the products."""
+
+    def setUp(self):
+        """Add three products and an admin token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+        self.products = [{
+            "asin": f"TESTASIN{index}",
+            "price": 100,
+            "basis_price": 120,
+            "url": "https://test.com",
+            "title": f"Test Product {index}",
+            "brand": "TEST",
+            "images": [{"url": f"https://test.com/{index}.jpg"}],
+        } for index in (1, 2, 3)]
+        self.client.post(
+            "/api/products/amazon", json=self.products, headers=self.headers)
+
+    def product(self, asin):
+        return db.session.execute(
+            db.select(ProductModel).filter(ProductModel.asin == asin)
+        ).scalar_one()
+
+    def test_patch_product(self):
+        """Test a PATCH updates the fields sent only."""
+        response = self.client.patch(
+            "/api/product/amazon/TESTASIN1",
+            json={"asin": "TESTASIN1", "title": "New title", "brand": None},
+            headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["ETag"], '"2"')
+        self.assertEqual(response.json["title"], "New title")
+        self.assertEqual(response.json["price"], 100)
+        self.assertEqual(response.json["images"], ["https://test.com/1.jpg"])
+        self.assertNotIn("brand", response.json)
+        self.assertIsNone(self.product("TESTASIN1").content_hash)
+
+        again = self.client.patch(
+            "/api/product/amazon/TESTASIN1",
+            json={"asin": "TESTASIN1", "title": "New title", "version": 2},
+            headers=self.headers)
+        stale = self.client.patch(
+            "/api/product/amazon/TESTASIN1",
+            json={"asin": "TESTASIN1", "title": "Other title"},
+            headers=dict(self.headers, **{"If-Match": '"1"'}))
+
+        self.assertEqual(again.json["version"], 2)
+        self.assertEqual(stale.status_code, 412)
+
+    def test_patch_product_without_asin(self):
+        """Test a PATCH of the price only takes the ASIN of the URL."""
+        response = self.client.patch(
+            "/api/product/amazon/TESTASIN1", json={"price": 90},
+            headers=self.headers)
+        other = self.client.patch(
+            "/api/product/amazon/TESTASIN1",
+            json={"asin": "TESTASIN2", "price": 80}, headers=self.headers)
+        bulk = self.client.patch(
+            "/api/products/amazon", json=[{"price": 80}],
+            headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["price"], 90)
+        self.assertEqual(response.json["title"], "Test Product 1")
+        self.assertEqual(other.status_code, 422)
+        self.assertEqual(bulk.status_code, 422)
+        self.assertEqual(self.product("TESTASIN1").price, 90)
+        self.assertEqual(self.product("TESTASIN2").price, 100)
+
+    def test_patch_products_prices(self):
+        """Test the price-only payloads are applied with one UPDATE."""
+        self.client.post(
+            "/api/watchlist",
+            json={"asin": "TESTASIN1", "target_price": 80},
+            headers=self.headers)
+        self.client.patch(
+            "/api/product/amazon/TESTASIN3",
+            json={"asin": "TESTASIN3", "price": 90}, headers=self.headers)
+        statements = []
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            response = self.client.patch("/api/products/amazon", json=[
+                {"asin": "TESTASIN1", "price": 75},
+                {"asin": "TESTASIN2", "price": 100},
+                {"asin": "TESTASIN3", "price": 70, "version": 1},
+                {"asin": "UNKNOWN", "price": 10},
+            ], headers=self.headers)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json, {
+            "message": "1 products updated successfully.",
+            "updated": 1,
+            "unchanged": 1,
+            "to_create": ["UNKNOWN"],
+            "conflicts": ["TESTASIN3"],
+        })
+        updates = [statement for statement in statements
+                   if statement.startswith(("UPDATE products", "WITH"))]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("RETURNING", updates[0])
+
+        product = self.product("TESTASIN1")
+        self.assertEqual(product.price, 75)
+        self.assertEqual(product.basis_price, 120)
+        self.assertEqual(product.title, "Test Product 1")
+        self.assertEqual(product.version, 2)
+        self.assertEqual(AlertModel.query.one().price, 75)
+        self.assertEqual(db.session.execute(
+            db.select(ChangeModel.asin).order_by(ChangeModel.seq.desc())
+        ).scalars().first(), "TESTASIN1")
+
+    def test_patch_products(self):
+        """Test the other payloads update the fields sent only."""
+        response = self.client.patch("/api/products/amazon", json=[
+            {"asin": "TESTASIN1", "title": "New title 1"},
+            {"asin": "TESTASIN2",
+             "images": [{"url": "https://test.com/new.jpg"}]},
+            {"asin": "TESTASIN3", "title": "Test Product 3"},
+        ], headers=self.headers)
+
+        self.assertEqual(response.json["updated"], 2)
+        self.assertEqual(response.json["unchanged"], 1)
+        first = self.client.get("/api/product/amazon/TESTASIN1").json
+        second = self.client.get("/api/product/amazon/TESTASIN2").json
+        self.assertEqual(first["title"], "New title 1")
+        self.assertEqual(first["brand"], "TEST")
+        self.assertEqual(first["images"], ["https://test.com/1.jpg"])
+        self.assertEqual(second["title"], "Test Product 2")
+        self.assertEqual(second["images"], ["https://test.com/new.jpg"])
+        self.assertEqual(self.product("TESTASIN3").version, 1)
+
+    def test_patch_images_records_change(self):
+        """Test a PATCH of the images only writes a change of the product,
+        though the product row is not modified."""
+        def patch_images(*urls):
+            return self.client.patch(
+                "/api/product/amazon/TESTASIN2",
+                json={"asin": "TESTASIN2",
+                      "images": [{"url": url} for url in urls]},
+                headers=self.headers)
+
+        patch_images("https://test.com/2.jpg", "https://test.com/2b.jpg")
+        changes = db.select(db.func.count(ChangeModel.seq)).filter(
+            ChangeModel.asin == "TESTASIN2")
+        before = db.session.execute(changes).scalar()
+
+        response = patch_images(
+            "https://test.com/2.jpg", "https://test.com/2c.jpg")
+
+        self.assertEqual(response.json["version"], 3)
+        self.assertEqual(db.session.execute(changes).scalar(), before + 1)
@@ -0,0 +1,90 @@
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import AlertModel, ProductModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+
+
+class TestPrices(BaseTest):
+    """Test case for the compact price update endpoint."""
+
+    def setUp(self):
+        """Add two products, a watch and an admin token."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+        self.client.post("/api/products/amazon", json=[{
+            "asin": f"TESTASIN{index}",
+            "price": 100,
+            "basis_price": 120,
+            "saving_percentage": 16,
+            "url": "https://test.com",
+            "title": f"Test Product {index}",
+        } for index in (1, 2)], headers=self.headers)
+        self.client.post(
+            "/api/watchlist",
+            json={"asin": "TESTASIN1", "target_price": 80},
+            headers=self.headers)
+
+    def put_prices(self, prices):
+        return self.client.put(
+            "/api/products/amazon/prices", json=prices, headers=self.headers)
+
+    def test_put_prices(self):
+        """Test the changed prices are written, the others reported."""
+        response = self.put_prices([
+            ["TESTASIN1", 79.5, 120, None],
+            ["TESTASIN2", 100, 120, 16],
+            ["UNKNOWN", 10, None, None],
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json, {
+            "message": "1 products updated successfully.",
+            "updated": 1,
+            "unchanged": 1,
+            "to_create": ["UNKNOWN"],
+            "conflicts": [],
+        })
+        product = db.session.execute(db.select(ProductModel).filter(
+            ProductModel.asin == "TESTASIN1")).scalar_one()
+        self.assertEqual(product.price, 79.5)
+        self.assertIsNone(product.saving_percentage)
+        self.assertEqual(product.title, "Test Product 1")
+        self.assertEqual(product.version, 2)
+        self.assertEqual(AlertModel.query.one().price, 79.5)
+
+    def test_put_prices_invalid(self):
+        """Test the invalid arrays are all reported and none applied."""
+        response = self.put_prices([
+            ["TESTASIN1", 50, None, None],
+            ["TESTASIN2", "50", None, None],
+            ["TESTASIN2", 50, None],
+            ["TESTASIN2", 50, None, 150],
+        ])
+        not_array = self.put_prices({"asin": "TESTASIN1"})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(
+            sorted(response.json["errors"]["json"]), ["1", "2", "3"])
+        self.assertEqual(not_array.status_code, 422)
+        self.assertEqual(db.session.execute(
+            db.select(ProductModel.price)).scalars().all(), [100, 100])
@@ -1,5 +1,6 @@
 from test.base_test import BaseTest
 from app.extensions import db
+from sqlalchemy import event
 from app.models.user import RoleModel
 from app.schemas import UserRegisterSchema
 
@@ -61,7 +62,8 @@ class TestProducts(BaseTest):
                     "ranking": 1,
                     "images": [
                         "https://test.com/image.jpg"],
-                    "id": 1
+                    "id": 1,
+                    "version": 1
         }
 
         for role_data in roles:
@@ -162,7 +164,7 @@ class TestProducts(BaseTest):
         self.assertEqual(response.json["pages"], 1)
         self.assertEqual(response.json["per_page"], 10)
         self.assertEqual(response.json["total"], 2)
-        self.assertListEqual(response.json["brands"], ["TEST_2", "TEST"])
+        self.assertCountEqual(response.json["brands"], ["TEST_2", "TEST"])
 
     def test_get_products_query(self):
         """Test for getting products with query parameters."""
@@ -200,7 +202,7 @@ class TestProducts(BaseTest):
         self.assertEqual(response.json["pages"], 2)
         self.assertEqual(response.json["per_page"], 1)
         self.assertEqual(response.json["total"], 2)
-        self.assertListEqual(response.json["brands"], ["TEST_2", "TEST"])
+        self.assertCountEqual(response.json["brands"], ["TEST_2", "TEST"])
 
     def test_put_product(self):
         """Test for updating a product."""
@@ -266,7 +268,8 @@ class TestProducts(BaseTest):
                         "title": "Test Product",
                         "url": "https://test.com"
                     }}},
-            "url": "https://test_updated.com.mx"
+            "url": "https://test_updated.com.mx",
+            "version": 2
         }
 
         self.client.post(
@@ -369,7 +372,8 @@ class TestProducts(BaseTest):
                         "title": "Test Second Product Update",
                         "url": "https://test_second_updated.com",
                     }}},
-            "url": "https://test_updated.com.mx"
+            "url": "https://test_updated.com.mx",
+            "version": 2
         }
 
         self.client.post(
@@ -398,6 +402,60 @@ class TestProducts(BaseTest):
         self.assertEqual(response.status_code, 200)
         self.assertDictEqual(expected, response.json)
 
+    def test_put_products_unchanged(self):
+        """Test unchanged products are skipped by the bulk update."""
+        self.client.post(
+            "/api/products/amazon",
+            json=[self.first_test_product, self.second_test_product],
+            headers={
+                "Authorization": f"Bearer {self.access_token}"})
+
+        updated_products = [
+            dict(self.first_test_product, price=50),
+            self.second_test_product,
+        ]
+
+        response = self.client.put(
+            "/api/products/amazon",
+            json=updated_products,
+            headers={
+                "Authorization": f"Bearer {self.access_token}"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["updated"], 2)
+        self.assertEqual(response.json["unchanged"], 0)
+
+        statements = []
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            updated_products[0] = dict(self.first_test_product, price=60)
+            response = self.client.put(
+                "/api/products/amazon",
+                json=updated_products,
+                headers={
+                    "Authorization": f"Bearer {self.access_token}"})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["updated"], 1)
+        self.assertEqual(response.json["unchanged"], 1)
+        self.assertEqual(response.json["to_create"], [])
+        self.assertEqual(
+            len([statement for statement in statements
+                 if statement.startswith("UPDATE products")
+                 and not statement.startswith("UPDATE products SET version")
+                 ]), 1)
+
+        response = self.client.get(
+            f"/api/product/amazon/{self.first_test_product["asin"]}")
+
+        self.assertEqual(response.json["price"], 60)
+
     def test_delete_product(self):
         """Test for deleting a product."""
         self.client.post(
@@ -474,6 +532,130 @@ class TestProducts(BaseTest):
         )
 
         self.assertEqual(response.status_code, 200)
-        self.assertListEqual(
+        self.assertCountEqual(
             response.json["brands"],
             [ product["brand"] for product in products[::-1]])
+
+    def test_get_products_fields(self):
+        """Test getting products with a sparse fieldset."""
+        products = [self.first_test_product, self.second_test_product]
+        self.client.post(
+            "/api/products/amazon",
+            json=products,
+            headers={
+                "Authorization": f"Bearer {self.access_token}"})
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get(
+                "/api/products/amazon",
+                query_string={"fields": "asin,title,price", "sort_by": "price"}
+            )
+        finally:
+            event.remove(
+                db.engine, "before_cursor_execute", before_cursor_execute)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["total"], 2)
+        self.assertListEqual(response.json["products"], [
+            {"asin": "TESTASIN1234", "title": "Test Product", "price": 1.0},
+            {"asin": "TESTASIN123", "title": "Test Product", "price": 100.0},
+        ])
+
+        products_select = next(
+            statement for statement in statements
+            if "LIMIT" in statement and "FROM products" in statement)
+        self.assertIn("products.title", products_select)
+        self.assertNotIn("products.custumers_opinion", products_select)
+        self.assertFalse(any(
+            "product_images" in statement or "twister" in statement
+            for statement in statements))
+
+    def test_get_products_invalid_fields(self):
+        """Test getting products with an unknown field."""
+
+        response = self.client.get(
+            "/api/products/amazon",
+            query_string={"fields": "asin,password"}
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertIn("fields", response.json["errors"]["query"])
+
+    def test_lookup_products(self):
+        """Test getting several products by their ASINs."""
+        products = [self.first_test_product, self.second_test_product]
+        self.client.post(
+            "/api/products/amazon",
+            json=products,
+            headers={
+                "Authorization": f"Bearer {self.access_token}"})
+
+        response = self.client.post(
+            "/api/products/amazon/lookup",
+            json={"asins": ["TESTASIN123", "MISSING", "TESTASIN123"]}
+        )
+        detail = self.client.get(
+            f"/api/product/amazon/{self.first_test_product["asin"]}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json["products"], {"TESTASIN123": detail.json})
+        self.assertListEqual(response.json["missing"], ["MISSING"])
+
+    def test_lookup_too_many_products(self):
+        """Test the ASINs limit of the products lookup."""
+
+        response = self.client.post(
+            "/api/products/amazon/lookup",
+            json={"asins": [f"ASIN{index}" for index in range(101)]}
+        )
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_marketplaces(self):
+        """Test the products of each marketplace are kept apart."""
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        marketplaces = self.app.config["MARKETPLACES"]
+        self.app.config["MARKETPLACES"] = ["amazon", "mercadolibre"]
+        try:
+            self.client.post(
+                "/api/products/amazon",
+                json=[self.first_test_product, self.second_test_product],
+                headers=headers)
+            response = self.client.post(
+                "/api/products/mercadolibre",
+                json=[dict(self.first_test_product, price=90, brand="MELI")],
+                headers=headers)
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json["repeated_products"], 0)
+
+            amazon = self.client.get(
+                "/api/product/amazon/TESTASIN123").json
+            mercadolibre = self.client.get(
+                "/api/product/mercadolibre/TESTASIN123").json
+            listing = self.client.get("/api/products/mercadolibre").json
+            put = self.client.put(
+                "/api/product/mercadolibre/TESTASIN123",
+                json=dict(self.first_test_product, price=80),
+                headers=headers).json
+            unknown = self.client.get("/api/products/ebay")
+        finally:
+            self.app.config["MARKETPLACES"] = marketplaces
+
+        self.assertEqual(amazon["price"], 100)
+        self.assertIn("twister", amazon)
+        self.assertEqual(mercadolibre["price"], 90)
+        # The variation is not sold on mercadolibre.
+        self.assertNotIn("twister", mercadolibre)
+        self.assertEqual(put["price"], 80)
+        self.assertNotIn("twister", put)
+        self.assertEqual(listing["total"], 1)
+        self.assertListEqual(listing["brands"], ["MELI"])
+        self.assertEqual(unknown.status_code, 404)
@@ -0,0 +1,98 @@
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+from app.utils.ratelimit import MemoryStore, parse_rules
+
+
+class TestRateLimit(BaseTest):
+    """Test case for the rate limiting."""
+
+    def setUp(self):
+        """Enable the limiter with a store on a fake clock."""
+        super().setUp()
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+        self.access_token = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }).json["access_token"]
+
+        self.now = 0.0
+        self.limiter = self.app.extensions["rate_limiter"]
+        self.rules = self.limiter.rules
+        self.store = self.limiter.store
+        self.limiter.rules = parse_rules({
+            "products.ProductsList": {"limit": "60/minute", "burst": 2},
+            "users.UserLogin": {"methods": ["POST"], "limit": "1/minute", "burst": 1},
+        })
+        self.limiter.store = MemoryStore(clock=lambda: self.now)
+        self.app.config["RATELIMIT_ENABLED"] = True
+
+    def tearDown(self):
+        """Restore the limiter."""
+        self.app.config["RATELIMIT_ENABLED"] = False
+        self.limiter.rules = self.rules
+        self.limiter.store = self.store
+        super().tearDown()
+
+    def test_rate_limit(self):
+        """Test the requests over the burst get a 429 until a refill."""
+        for _ in range(2):
+            response = self.client.get("/api/products/amazon")
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/api/products/amazon")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(response.json["message"], "Too many requests.")
+
+        self.now += 1
+        response = self.client.get("/api/products/amazon")
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_rate_limit_keyed_on_ip(self):
+        """Test each client IP has its own bucket."""
+        self.client.post("/api/login", json={})
+        response = self.client.post("/api/login", json={})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "60")
+
+        response = self.client.post(
+            "/api/login", json={},
+            environ_base={"REMOTE_ADDR": "10.0.0.2"})
+
+        self.assertNotEqual(response.status_code, 429)
+
+    def test_admin_exempt(self):
+        """Test the admin tokens are not limited."""
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        for _ in range(5):
+            response = self.client.get("/api/products/amazon", headers=headers)
+            self.assertEqual(response.status_code, 200)
+
+    def test_memory_store(self):
+        """Test the token bucket refill and the key eviction."""
+        store = MemoryStore(max_keys=2, clock=lambda: self.now)
+
+        self.assertEqual(store.consume("a", rate=0.5, burst=1), 0)
+        self.assertEqual(store.consume("a", rate=0.5, burst=1), 2)
+        self.now += 1
+        self.assertEqual(store.consume("a", rate=0.5, burst=1), 1)
+
+        store.consume("b", rate=0.5, burst=1)
+        store.consume("c", rate=0.5, burst=1)
+        self.assertEqual(list(store._buckets), ["b", "c"])
@@ -0,0 +1,52 @@
+import gc
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app, db
+from app.utils.warmup import warm_up_master, warm_up_worker
+
+
+class TestWarmup(unittest.TestCase):
+    """Test case for the gunicorn warm-up hooks."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_url = f"sqlite:///{self.directory.name}/startup.db"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_app(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            app = create_app(db_url=self.db_url)
+        app.config["TESTING"] = True
+        return app
+
+    def test_warm_up_hooks(self):
+        """Test the master hook leaves no connection open to be inherited
+        by the workers, and the worker hook opens its own."""
+        app = self.create_app(APP_ENV="development")
+        with app.app_context():
+            # Opened by db.create_all().
+            self.assertGreater(db.engine.pool.checkedin(), 0)
+        try:
+            warm_up_master(app)
+        finally:
+            gc.unfreeze()
+
+        with app.app_context():
+            pool = db.engine.pool
+            self.assertEqual(pool.checkedin(), 0)
+            self.assertEqual(pool.checkedout(), 0)
+        self.assertTrue(app.extensions["warmed_up"])
+
+        app.config["DB_WARMUP_CONNECTIONS"] = 2
+        warm_up_worker(app)
+
+        with app.app_context():
+            self.assertIsNot(db.engine.pool, pool)
+            self.assertEqual(db.engine.pool.checkedin(), 2)
+            self.assertEqual(db.engine.pool.checkedout(), 0)
+            db.engine.dispose()
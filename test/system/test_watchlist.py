@@ -0,0 +1,131 @@
+from test.base_test import BaseTest
+from app.extensions import db
+from app.models import AlertModel
+from app.models.watch import WatchModel
+from app.models.user import RoleModel
+from app.schemas import UserRegisterSchema
+from app.utils.alerts import crossed_watches, drain_outbox
+
+
+class TestWatchlist(BaseTest):
+    """Test case for the watchlist and the price alerts."""
+
+    def setUp(self):
+        """Set up a product and a user token."""
+        super().setUp()
+        self.product = {
+            "asin": "TESTASIN123",
+            "price": 100,
+            "url": "https://test.com",
+            "title": "Test Product",
+            "brand": "TEST",
+        }
+
+        db.session.add_all([
+            RoleModel(id=1, name="admin"),
+            RoleModel(id=2, name="user"),
+        ])
+        db.session.add(UserRegisterSchema().load({
+            "first_name": "Admin_name",
+            "last_name": "Admin_lastname",
+            "birth_date": "1985-05-05",
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        }))
+        db.session.commit()
+
+        login_response = self.client.post("/api/login", json={
+            "email": "test_admin@mail.com",
+            "password": "admin123",
+        })
+        self.headers = {
+            "Authorization": f"Bearer {login_response.json['access_token']}"}
+
+        self.client.post(
+            "/api/product/amazon", json=self.product, headers=self.headers)
+
+    def put_price(self, price):
+        return self.client.put(
+            "/api/products/amazon",
+            json=[dict(self.product, price=price)], headers=self.headers)
+
+    def test_watchlist(self):
+        """Test adding, listing and removing a watch."""
+        response = self.client.post(
+            "/api/watchlist",
+            json={"asin": "TESTASIN123", "target_price": 80},
+            headers=self.headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json["target_price"], 80)
+
+        response = self.client.post(
+            "/api/watchlist",
+            json={"asin": "TESTASIN123", "target_price": 70},
+            headers=self.headers)
+
+        self.assertEqual(response.status_code, 409)
+
+        response = self.client.post(
+            "/api/watchlist",
+            json={"asin": "MISSING", "target_price": 70},
+            headers=self.headers)
+
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get("/api/watchlist", headers=self.headers)
+
+        self.assertEqual(
+            [watch["asin"] for watch in response.json], ["TESTASIN123"])
+
+        response = self.client.delete(
+            "/api/watchlist/TESTASIN123", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.get("/api/watchlist", headers=self.headers).json, [])
+
+    def test_price_drop_alert(self):
+        """Test an alert is queued once the price drops to the target."""
+        self.client.post(
+            "/api/watchlist",
+            json={"asin": "TESTASIN123", "target_price": 80},
+            headers=self.headers)
+
+        self.put_price(90)
+        self.assertEqual(AlertModel.query.count(), 0)
+
+        self.put_price(75)
+        alert = AlertModel.query.one()
+        self.assertEqual((alert.asin, alert.price, alert.target_price),
+                         ("TESTASIN123", 75, 80))
+
+        # Dropping further under the target does not alert again.
+        self.put_price(70)
+        self.assertEqual(AlertModel.query.count(), 1)
+
+        delivered = []
+        self.assertEqual(drain_outbox(deliver=delivered.append), 1)
+        self.assertEqual(delivered, [alert])
+        self.assertIsNotNone(alert.sent_at)
+        self.assertEqual(drain_outbox(deliver=delivered.append), 0)
+
+    def test_crossed_watches(self):
+        """Test the watches crossed by price changes are selected in SQL."""
+        db.session.add_all([
+            WatchModel(id=index, user_id=index, asin="A", target_price=price)
+            for index, price in ((1, 10.0), (2, 20.0), (3, 30.0))
+        ] + [WatchModel(id=4, user_id=1, marketplace="other", asin="B",
+                        target_price=10.0)])
+        db.session.flush()
+
+        self.assertEqual(crossed_watches("amazon", {"A": (25, 15)}),
+                         [("A", 2, 2, 20.0)])
+        self.assertEqual(
+            crossed_watches("amazon", {"A": (35, 10), "B": (15, 5)}),
+            [("A", 1, 1, 10.0), ("A", 2, 2, 20.0), ("A", 3, 3, 30.0)])
+        self.assertEqual(crossed_watches("amazon", {"A": (None, 25)}),
+                         [("A", 3, 3, 30.0)])
+        self.assertEqual(crossed_watches("amazon", {"A": (15, 25)}), [])
+        self.assertEqual(crossed_watches("other", {"B": (15, 5)}),
+                         [("B", 4, 1, 10.0)])
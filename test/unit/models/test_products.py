@@ -1,6 +1,8 @@
 """Unit tests for the ProductModel and its serialization/deserialization."""
 
-from app.models import ProductModel
+from sqlalchemy import event
+
+from app.models import ProductModel, VariantGroup, VariantGroupMember
 from app.extensions import db
 from test.base_test import BaseTest
 from app.schemas import ProductInputSchema, ProductOutputSchema
@@ -79,7 +81,8 @@ class ProductTest(BaseTest):
                                 'price': 1.0,
                                 'image': 'https://test.com/image.jpg',
                                 'url': 'https://test.com', 'color': 'Test Color'}}},
-                    'id': 1
+                    'id': 1,
+                    'version': 1
         }
 
         new_product = self.schema_in.load(self.second_test_product)
@@ -118,3 +121,64 @@ class ProductTest(BaseTest):
 
         deleted_product = ProductModel.query.first()
         self.assertIsNone(deleted_product)
+
+    def test_shared_variant_group(self):
+        """Test products with the same variations share one variant group."""
+
+        twister = [{"type": "color_name", "asin": "TESTASIN1234", "name": "Test Color"}]
+        second_product = self.schema_in.load(dict(self.second_test_product, twister=twister))
+        db.session.add(second_product)
+        db.session.commit()
+
+        self.assertEqual(second_product.variant_group_id, self.new_product.variant_group_id)
+        self.assertEqual(VariantGroup.query.count(), 1)
+        self.assertEqual(VariantGroupMember.query.count(), 1)
+
+        second_product.twister = [{"type": "size_name", "asin": "TESTASIN1234", "name": "128 GB"}]
+        db.session.commit()
+
+        self.assertNotEqual(second_product.variant_group_id, self.new_product.variant_group_id)
+        self.assertEqual(second_product.twister[0].name, "128 GB")
+        self.assertEqual(VariantGroup.query.count(), 2)
+
+        second_product.twister = []
+        self.new_product.twister = []
+        db.session.commit()
+
+        self.assertIsNone(second_product.variant_group_id)
+        self.assertEqual(VariantGroup.query.count(), 0)
+        self.assertEqual(VariantGroupMember.query.count(), 0)
+
+    def test_variant_group_inserted_concurrently(self):
+        """Test a variant group inserted by another transaction between
+        the lookup and the insert is reused, not a unique key error."""
+
+        key = VariantGroup.key_for(
+            "amazon", [("size_name", "256 GB", "TESTASIN1234")])
+        inserts = []
+
+        def insert_group(conn, cursor, statement, *args):
+            if statement.startswith("INSERT INTO variant_groups") \
+                    and not inserts:
+                inserts.append(statement)
+                cursor.execute(
+                    "INSERT INTO variant_groups (id, key) VALUES (100, ?)",
+                    (key,))
+                cursor.execute(
+                    "INSERT INTO variant_group_members (group_id, position,"
+                    " marketplace, type, name, asin) VALUES (100, 0,"
+                    " 'amazon', 'size_name', '256 GB', 'TESTASIN1234')")
+
+        self.new_product.twister = [
+            {"type": "size_name", "asin": "TESTASIN1234", "name": "256 GB"}]
+        event.listen(db.engine, "before_cursor_execute", insert_group)
+        try:
+            db.session.commit()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", insert_group)
+
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.new_product.variant_group_id, 100)
+        self.assertEqual(self.new_product.twister[0].name, "256 GB")
+        self.assertEqual(VariantGroupMember.query.filter_by(
+            group_id=100).count(), 1)